@@ -2,6 +2,8 @@ import os
 
 from HorusAPI import PluginBlock, PluginVariable, VariableTypes
 
+from utils import instrumented
+
 # Define the variables for the parse_multiple_chains block
 input_parsed_chains = PluginVariable(
     id="output_parsed_chains",
@@ -39,9 +41,11 @@ output_selected_chains = PluginVariable(
 
 
 # Function to run the assign_fixed_chains.py script
+@instrumented("assign_chains")
 def run_passign_chains(block: PluginBlock):
     """
-    Executes the assign_fixed_chains.py script with the provided arguments.
+    Builds the assigned chains dictionary, natively or with the
+    assign_fixed_chains.py script.
     """
     input_path = block.inputs[input_parsed_chains.id]
 
@@ -56,30 +60,36 @@ def run_passign_chains(block: PluginBlock):
 
     print(f"Selected chains: {chains}")
 
-    script_plugin_path = os.path.join(
-        block.pluginDir,
-        "Include",
-        "ProteinMPNN",
-        "helper_scripts",
-        "assign_fixed_chains.py",
-    )
-
-    # Build the command to run
-    cmd = [
-        "python",
-        script_plugin_path,
-        f"--input_path={input_path}",
-        f"--output_path={output_path}",
-        "--chain_list",
-        f'"{" ".join(chains)}"',
-    ]
-
-    # Run the command
-    from utils import execute_in_environment
-
-    out = execute_in_environment(block, " ".join(cmd))
-
-    print(out)
+    from Config.config import use_helper_scripts
+
+    if block.config[use_helper_scripts.id]:
+        script_plugin_path = os.path.join(
+            block.pluginDir,
+            "Include",
+            "ProteinMPNN",
+            "helper_scripts",
+            "assign_fixed_chains.py",
+        )
+
+        # Build the command to run
+        cmd = [
+            "python",
+            script_plugin_path,
+            f"--input_path={input_path}",
+            f"--output_path={output_path}",
+            "--chain_list",
+            f'"{" ".join(chains)}"',
+        ]
+
+        # Run the command
+        from utils import execute_in_environment
+
+        execute_in_environment(block, " ".join(cmd))
+    else:
+        from Helpers.dicts import assign_fixed_chains, write_dict
+        from Helpers.jsonl import ParsedChains
+
+        write_dict(output_path, assign_fixed_chains(ParsedChains(input_path), chains))
 
     block.setOutput(output_fixed_chains.id, output_path)
 
@@ -2,6 +2,8 @@ import os
 
 from HorusAPI import PluginBlock, PluginVariable, VariableTypes
 
+from utils import instrumented
+
 # Define the variables for the make_bias block
 AA_list = PluginVariable(
     id="AA_list",
@@ -31,9 +33,10 @@ output_path_for_bias_pdbs = PluginVariable(
 
 
 # Function to run the assign_fixed_chains.py script
+@instrumented("make_bias")
 def run_make_bias(block: PluginBlock):
     """
-    Executes the make_tied_positions.py script with the provided arguments.
+    Builds the AA bias dictionary, natively or with the make_bias_AA.py script.
     """
 
     output_path = "bias_pdbs.jsonl"
@@ -41,31 +44,39 @@ def run_make_bias(block: PluginBlock):
     if os.path.exists(output_path):
         os.remove(output_path)
 
-    script_plugin_path = os.path.join(
-        block.pluginDir,
-        "Include",
-        "ProteinMPNN",
-        "helper_scripts",
-        "make_bias_AA.py",
-    )
-
     aa_list_value = block.variables[AA_list.id]
     bias_list_value = block.variables[bias_list.id]
 
-    # Build the command to run
-    cmd = [
-        "python",
-        script_plugin_path,
-        f"--output_path={output_path}",
-        f"--AA_list='{aa_list_value}'",
-        f"--bias_list='{bias_list_value}'",
-    ]
-    # Run the command
-    from utils import execute_in_environment
-
-    out = execute_in_environment(block, " ".join(cmd))
-
-    print(out)
+    from Config.config import use_helper_scripts
+
+    if block.config[use_helper_scripts.id]:
+        script_plugin_path = os.path.join(
+            block.pluginDir,
+            "Include",
+            "ProteinMPNN",
+            "helper_scripts",
+            "make_bias_AA.py",
+        )
+
+        # Build the command to run
+        cmd = [
+            "python",
+            script_plugin_path,
+            f"--output_path={output_path}",
+            f"--AA_list='{aa_list_value}'",
+            f"--bias_list='{bias_list_value}'",
+        ]
+        # Run the command
+        from utils import execute_in_environment
+
+        execute_in_environment(block, " ".join(cmd))
+    else:
+        from Helpers.dicts import make_bias_AA, write_dict
+
+        write_dict(
+            output_path,
+            make_bias_AA(aa_list_value.split(), bias_list_value.split()),
+        )
 
     block.setOutput(output_path_for_bias_pdbs.id, output_path)
 
@@ -0,0 +1,98 @@
+import os
+
+from HorusAPI import PluginBlock, PluginVariable, VariableTypes
+
+from utils import instrumented
+
+# Define the variables for the make_bias_by_res block
+input_parsed_chains = PluginVariable(
+    id="output_parsed_chains",
+    name="Parsed Chains JSONL",
+    description="The JSONL file containing the parsed chains.",
+    type=VariableTypes.CUSTOM,
+    allowedValues=["parsed_pdbs_jsonl"],
+)
+
+chain_list = PluginVariable(
+    id="chain_list",
+    name="Chain list",
+    description="Chains the bias applies to. Leave empty for all the chains. The other chains get a zero matrix, as ProteinMPNN needs one for every designed chain.",
+    type=VariableTypes.CHAIN,
+)
+
+bias_table = PluginVariable(
+    id="bias_table",
+    name="Bias table",
+    description="CSV/TSV with chain, residue, aa and bias columns (e.g. 'A,52,W,2.0'; residue '*' for the whole chain), or with chain, residue and one column per amino acid (ACDEFGHIKLMNPQRSTVWYX). An optional name column restricts a row to one structure. Residues use the PDB numbering.",
+    type=VariableTypes.FILE,
+    allowedValues=["csv", "tsv"],
+)
+
+bias_arrays = PluginVariable(
+    id="bias_arrays",
+    name="Bias arrays",
+    description="NPZ with one L x 21 array per chain, keyed '<chain>' for every structure or '<name>/<chain>' for one structure. Added to the bias table.",
+    type=VariableTypes.FILE,
+    allowedValues=["npz"],
+)
+
+# Output
+output_path_for_bias_by_res = PluginVariable(
+    id="output_path_for_bias_by_res",
+    name="Bias by Residue JSONL",
+    description="The JSONL file containing the per residue bias.",
+    type=VariableTypes.CUSTOM,
+    allowedValues=["bias_by_res_jsonl"],
+)
+
+
+@instrumented("make_bias_by_res")
+def run_make_bias_by_res(block: PluginBlock):
+    """
+    Builds the per residue bias dictionary of every parsed structure.
+    """
+
+    output_path = "bias_by_res.jsonl"
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    input_path = block.inputs[input_parsed_chains.id]
+
+    chain_list_value = block.inputs[chain_list.id]
+    chains = [c["chainID"] for c in chain_list_value] if chain_list_value else []
+
+    bias_table_value = block.variables[bias_table.id]
+    bias_arrays_value = block.variables[bias_arrays.id]
+
+    if not bias_table_value and not bias_arrays_value:
+        raise Exception("Provide a bias table, bias arrays or both.")
+
+    from Helpers.bias import BiasRules, build_bias_by_res_dict
+    from Helpers.jsonl import ParsedChains
+
+    rules = BiasRules.from_table(bias_table_value) if bias_table_value else None
+
+    structures = build_bias_by_res_dict(
+        ParsedChains(input_path),
+        output_path,
+        rules=rules,
+        arrays_path=bias_arrays_value,
+        chain_list=chains,
+    )
+
+    print(f"Per residue bias of {structures} structures written to {output_path}")
+
+    block.setOutput(output_path_for_bias_by_res.id, output_path)
+
+
+# Instantiate the block
+make_bias_by_res = PluginBlock(
+    id="make_bias_by_res",
+    name="Make Bias by Residue",
+    description="This block builds the per residue bias dictionary (bias_by_res_jsonl) of every parsed structure from a table or NumPy arrays.",
+    inputs=[input_parsed_chains, chain_list],
+    variables=[bias_table, bias_arrays],
+    outputs=[output_path_for_bias_by_res],
+    action=run_make_bias_by_res,
+)
@@ -2,9 +2,10 @@ import os
 
 from HorusAPI import PluginBlock, PluginVariable, VariableTypes, VariableList
 
-import json
 from Bio.PDB.Polypeptide import standard_aa_names
-from Bio.Data.PDBData import protein_letters_3to1, protein_letters_1to3
+from Bio.Data.PDBData import protein_letters_3to1
+
+from utils import instrumented
 
 # Define the variables for the make_fixed_positions block
 input_parsed_chains = PluginVariable(
@@ -33,10 +34,18 @@ chain_list = PluginVariable(
 fixed_residue = PluginVariable(
     id="fixed_residue",
     name="Fixed Residue",
-    description="Residue ID that should be fixed for each chain. The order must be consistent with the selected chains.",
+    description="PDB residue number that should be fixed for each chain. The order must be consistent with the selected chains.",
     type=VariableTypes.NUMBER,
 )
 
+fixed_residue_label = PluginVariable(
+    id="fixed_residue_label",
+    name="Fixed Residue ID",
+    description="PDB residue ID with an insertion code (e.g. 52A). Used instead of the residue number when set.",
+    type=VariableTypes.STRING,
+    placeholder="52A",
+)
+
 chain_residue_variable = PluginVariable(
     id="chain_residue_variable",
     name="Chain",
@@ -57,7 +66,21 @@ fixed_positions_mutations = VariableList(
     id="fixed_positions",
     name="Fixed Positions and mutations",
     description="Residues that should remain fixed for each chain.",
-    prototypes=[fixed_residue, chain_residue_variable, mutate_variable],
+    prototypes=[
+        fixed_residue,
+        fixed_residue_label,
+        chain_residue_variable,
+        mutate_variable,
+    ],
+)
+
+
+mutation_sets = PluginVariable(
+    id="mutation_sets",
+    name="Mutation sets",
+    description="Optional CSV/TSV table with 'variant' and 'mutations' columns (e.g. 'v1,A:45:W A:46:LEU'). Every structure produces one mutated record per variant, named <structure>_<variant>, on top of the mutations above. The mutated positions are fixed.",
+    type=VariableTypes.FILE,
+    allowedValues=["csv", "tsv"],
 )
 
 
@@ -80,9 +103,11 @@ output_parsed_chains = PluginVariable(
 
 
 # Function to run the make_fixed_positions_dict.py script
+@instrumented("make_fixed_positions")
 def run_make_fixed_positions(block: PluginBlock):
     """
-    Executes the make_fixed_positions_dict.py script with the provided arguments.
+    Applies the mutations and builds the fixed positions dictionary, natively
+    or with the make_fixed_positions_dict.py script.
     """
     input_path = block.inputs[input_parsed_chains.id]
     specify_non_fixed_value = block.variables[specify_non_fixed.id]
@@ -97,85 +122,128 @@ def run_make_fixed_positions(block: PluginBlock):
     # Apply the mutations to the original fixed_positions.jsonl file.
     mutated_json = os.path.basename(input_path).split(".")[0] + "_mutated.jsonl"
 
-    if not specify_non_fixed_value:
-        original_seqs_chains = None
-        with open(input_path, "r") as input_file:
-            original_seqs_chains = json.load(input_file)
+    from Helpers.numbering import first_label
 
     chains_pos = {}
-    has_mutations = False
+    mutations = []
     for r in fixed_positions_value:
         chain = r[chain_residue_variable.id]
-        pos = r[fixed_residue.id]
+        pos = first_label(r.get(fixed_residue_label.id), r.get(fixed_residue.id))
         mutation = r[mutate_variable.id]
 
         if not chain in chains_pos:
             chains_pos[chain] = []
 
-        chains_pos[chain].append(str(pos))
-
-        if not specify_non_fixed_value:
-            if mutation in standard_aa_names:
-                has_mutations = True
-                pos_index = pos - 1  # Indeces in python start with 0!
-                print(
-                    f"- Mutating {original_seqs_chains['seq'][pos_index]} ({protein_letters_1to3[original_seqs_chains['seq'][pos_index]]}) to {protein_letters_3to1[mutation]} ({mutation}) at {pos} in chain {chain}"
-                )
-                # Get the original sequence string
-                seq = original_seqs_chains["seq"]
-                seq_chain = original_seqs_chains[f"seq_chain_{chain}"]
-
-                # Modify the sequence by creating a new string
-                original_seqs_chains["seq"] = (
-                    seq[:pos_index]
-                    + protein_letters_3to1[mutation]
-                    + seq[pos_index + 1 :]
-                )
-                original_seqs_chains[f"seq_chain_{chain}"] = (
-                    seq_chain[:pos_index]
-                    + protein_letters_3to1[mutation]
-                    + seq_chain[pos_index + 1 :]
-                )
-
-    # Store the new JSONL file
-    if has_mutations:
-        with open(mutated_json, "w") as output_file:
-            json.dump(original_seqs_chains, output_file)
+        chains_pos[chain].append(pos)
 
-    chains_argument = " ".join(chains_pos.keys())
-    positions_argument = ",".join([" ".join(chains_pos[c]) for c in chains_pos.keys()])
+        if not specify_non_fixed_value and mutation in standard_aa_names:
+            mutations.append((chain, pos, mutation))
 
-    print(f"- Fixed positions: {positions_argument}")
+    mutation_sets_path = block.variables.get(mutation_sets.id)
+    variant_sets = None
+    if mutation_sets_path and not specify_non_fixed_value:
+        from Helpers.mutations import read_mutation_sets
 
-    script_plugin_path = os.path.join(
-        block.pluginDir,
-        "Include",
-        "ProteinMPNN",
-        "helper_scripts",
-        "make_fixed_positions_dict.py",
-    )
+        variant_sets = read_mutation_sets(mutation_sets_path)
+        print(f"- {len(variant_sets)} mutation sets read from {mutation_sets_path}")
 
-    # Build the command to run
-    cmd = [
-        "python",
-        script_plugin_path,
-        f"--input_path={input_path}",
-        f"--output_path={output_path}",
-        "--chain_list",
-        f'"{chains_argument}"',
-        "--position_list",
-        f'"{positions_argument}"',
-    ]
+    # Store the new JSONL file, streaming every structure of the input
+    variants = None
+    if mutations or variant_sets:
+        from Helpers.jsonl import ParsedChains
+        from Helpers.mutations import mutate_structures
 
-    if specify_non_fixed_value:
-        cmd.append("--specify_non_fixed")
+        variants = mutate_structures(
+            ParsedChains(input_path),
+            [(c, p, protein_letters_3to1[m]) for c, p, m in mutations],
+            mutated_json,
+            mutation_sets=variant_sets,
+        )
+        print(
+            f"- Wrote {sum(len(v) for v in variants.values())} mutated records "
+            f"for {len(variants)} structures to {mutated_json}"
+        )
 
-    # Run the command
-    from utils import execute_in_environment
+    # The variants are new structures, their positions come from the mutated file
+    positions_input = mutated_json if variant_sets else input_path
 
-    out = execute_in_environment(block, " ".join(cmd))
+    chains_argument = " ".join(chains_pos.keys())
+    positions_argument = ",".join([" ".join(chains_pos[c]) for c in chains_pos.keys()])
+
+    print(f"- Fixed positions: {positions_argument}")
 
-    print(out)
+    from Config.config import use_helper_scripts
+
+    use_helper = block.config[use_helper_scripts.id]
+    if use_helper:
+        from Helpers.jsonl import ParsedChains
+        from Helpers.numbering import shared_positions
+
+        # The helper script takes 1-based positions, the same for every
+        # structure, and cannot read residue IDs such as 52A
+        positions = shared_positions(
+            ParsedChains(positions_input),
+            list(chains_pos.keys()),
+            list(chains_pos.values()),
+        )
+        if positions is None:
+            print(
+                "- The residue IDs do not resolve to the same positions in every "
+                "structure, using the native implementation"
+            )
+            use_helper = False
+        else:
+            positions_argument = ",".join(
+                " ".join(str(p) for p in chain_positions)
+                for chain_positions in positions
+            )
+
+    if use_helper:
+        script_plugin_path = os.path.join(
+            block.pluginDir,
+            "Include",
+            "ProteinMPNN",
+            "helper_scripts",
+            "make_fixed_positions_dict.py",
+        )
+
+        # Build the command to run
+        cmd = [
+            "python",
+            script_plugin_path,
+            f"--input_path={positions_input}",
+            f"--output_path={output_path}",
+            "--chain_list",
+            f'"{chains_argument}"',
+            "--position_list",
+            f'"{positions_argument}"',
+        ]
+
+        if specify_non_fixed_value:
+            cmd.append("--specify_non_fixed")
+
+        # Run the command
+        from utils import execute_in_environment
+
+        execute_in_environment(block, " ".join(cmd))
+    else:
+        from Helpers.dicts import make_fixed_positions_dict, write_dict
+        from Helpers.jsonl import ParsedChains
+
+        write_dict(
+            output_path,
+            make_fixed_positions_dict(
+                ParsedChains(positions_input),
+                list(chains_pos.keys()),
+                list(chains_pos.values()),
+                specify_non_fixed=specify_non_fixed_value,
+            ),
+        )
+
+    if variant_sets:
+        from Helpers.mutations import fix_mutated_positions
+
+        fix_mutated_positions(output_path, variants)
 
     block.setOutput(output_fixed_positions.id, output_path)
     block.setOutput(output_parsed_chains.id, mutated_json)
@@ -187,7 +255,7 @@ make_fixed_positions_block = PluginBlock(
     name="Make Fixed Positions and Mutations",
     description="This block executes the make_fixed_positions_dict.py script to define fixed positions for a protein structure. Furthermore, it allows to define mutations on the fixed positions.",
     inputs=[input_parsed_chains, chain_list],
-    variables=[specify_non_fixed, fixed_positions_mutations],
+    variables=[specify_non_fixed, fixed_positions_mutations, mutation_sets],
     outputs=[output_fixed_positions, output_parsed_chains],
     action=run_make_fixed_positions,
 )
@@ -2,6 +2,8 @@ import os
 
 from HorusAPI import PluginBlock, PluginVariable, VariableTypes
 
+from utils import instrumented
+
 # Define the variables for the make_bias block
 input_parsed_chains = PluginVariable(
     id="output_parsed_chains",
@@ -20,6 +22,32 @@ pssm_input_path = PluginVariable(
 )
 
 
+pssm_format = PluginVariable(
+    id="pssm_format",
+    name="Output format",
+    description="'json' writes the arrays into pssm.jsonl like make_pssm_input_dict.py. 'sidecar' stores them as float16 in a binary pssm.npz next to it, which is much smaller and faster to load (ProteinMPNN then runs through the plugin engine).",
+    type=VariableTypes.RADIO,
+    defaultValue="json",
+    allowedValues=["json", "sidecar"],
+)
+
+num_workers = PluginVariable(
+    id="num_workers",
+    name="Number of workers",
+    description="Number of processes used to load the PSSMs. Use 0 to use all the available cores.",
+    type=VariableTypes.INTEGER,
+    defaultValue=1,
+)
+
+use_cache = PluginVariable(
+    id="use_cache",
+    name="Use cache",
+    description="Reuse the PSSMs processed in previous runs when the npz files did not change.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=True,
+)
+
+
 # Output
 output_path_for_pssm_dict = PluginVariable(
     id="output_path_for_pssm_dict",
@@ -31,9 +59,11 @@ output_path_for_pssm_dict = PluginVariable(
 
 
 # Function to run the assign_fixed_chains.py script
+@instrumented("make_pssm")
 def run_make_pssm(block: PluginBlock):
     """
-    Executes the make_pssm_input_dict.py script with the provided arguments.
+    Builds the PSSM dictionary, natively or with the make_pssm_input_dict.py
+    script.
     """
 
     output_path = "pssm.jsonl"
@@ -41,31 +71,57 @@ def run_make_pssm(block: PluginBlock):
     if os.path.exists(output_path):
         os.remove(output_path)
 
-    script_plugin_path = os.path.join(
-        block.pluginDir,
-        "Include",
-        "ProteinMPNN",
-        "helper_scripts",
-        "make_pssm_input_dict.py",
-    )
-
     input_parsed_chains_value = block.inputs[input_parsed_chains.id]
     pssm_input_path_value = block.inputs[pssm_input_path.id]
 
-    # Build the command to run
-    cmd = [
-        "python",
-        script_plugin_path,
-        f"--output_path={output_path}",
-        f"--PSSM_input_path={pssm_input_path_value}",
-        f"--jsonl_input_path={input_parsed_chains_value}",
-    ]
-    # Run the command
-    from utils import execute_in_environment
-
-    out = execute_in_environment(block, " ".join(cmd))
-
-    print(out)
+    from Config.config import use_helper_scripts
+
+    if block.config[use_helper_scripts.id]:
+        script_plugin_path = os.path.join(
+            block.pluginDir,
+            "Include",
+            "ProteinMPNN",
+            "helper_scripts",
+            "make_pssm_input_dict.py",
+        )
+
+        # Build the command to run
+        cmd = [
+            "python",
+            script_plugin_path,
+            f"--output_path={output_path}",
+            f"--PSSM_input_path={pssm_input_path_value}",
+            f"--jsonl_input_path={input_parsed_chains_value}",
+        ]
+        # Run the command
+        from utils import execute_in_environment
+
+        execute_in_environment(block, " ".join(cmd))
+    else:
+        from Helpers.jsonl import ParsedChains
+        from Helpers.pssm import build_pssm_dict
+        from utils import get_cache
+
+        cache = None
+        if block.variables[use_cache.id]:
+            cache = get_cache(block, "pssm")
+
+        summary = build_pssm_dict(
+            ParsedChains(input_parsed_chains_value),
+            pssm_input_path_value,
+            output_path,
+            sidecar=block.variables[pssm_format.id] == "sidecar",
+            num_workers=block.variables[num_workers.id],
+            cache=cache,
+        )
+
+        print(f"PSSMs of {summary['structures']} structures written to {output_path}")
+
+        if cache is not None:
+            print(
+                f"Cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses, "
+                f"{summary['cache_evicted']} evicted"
+            )
 
     block.setOutput(output_path_for_pssm_dict.id, output_path)
 
@@ -76,6 +132,7 @@ make_pssm = PluginBlock(
     name="Make PSSM dictionary",
     description="This block executes the make_pssm_input_dict.py script to make the PSSM dictionary.",
     inputs=[input_parsed_chains, pssm_input_path],
+    variables=[pssm_format, num_workers, use_cache],
     outputs=[output_path_for_pssm_dict],
     action=run_make_pssm,
 )
@@ -2,6 +2,8 @@ import os
 
 from HorusAPI import PluginBlock, PluginVariable, VariableTypes
 
+from utils import instrumented
+
 # Define the variables for the parse_multiple_chains block
 input_parsed_chains = PluginVariable(
     id="output_parsed_chains",
@@ -25,7 +27,7 @@ chain_list = PluginVariable(
 tied_positions = PluginVariable(
     id="tied_positions",
     name="Tied positions",
-    description="Residue positions to be tied. Lists must match in length.",
+    description="Residue IDs to be tied, one list per chain (e.g. '10 11 12A'). Lists must match in length. PDB numbering and insertion codes are resolved through the parsed structures.",
     type=VariableTypes.LIST,
 )
 
@@ -36,6 +38,22 @@ homooligomer = PluginVariable(
     type=VariableTypes.BOOLEAN,
 )
 
+detect_symmetry = PluginVariable(
+    id="detect_symmetry",
+    name="Detect symmetry",
+    description="Tie the equivalent positions of identical or near-identical chains automatically, one group per subunit type. Overrides the tied positions and homooligomer options.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+symmetry_identity = PluginVariable(
+    id="symmetry_identity",
+    name="Symmetry identity",
+    description="Minimum sequence identity (0-1) for two chains to be treated as copies of the same subunit.",
+    type=VariableTypes.FLOAT,
+    defaultValue=0.9,
+)
+
 # Output
 output_path_for_tied_positions = PluginVariable(
     id="output_path_for_tied_positions",
@@ -46,10 +64,37 @@ output_path_for_tied_positions = PluginVariable(
 )
 
 
+def helper_positions(input_path: str, chains: list, tied_positions_value) -> str:
+    """
+    Returns the position list argument of make_tied_positions_dict.py, with
+    the residue IDs resolved to the 1-based positions it takes. Returns None
+    when they do not resolve to the same positions in every structure.
+    """
+    if not tied_positions_value:
+        return ""
+
+    from Helpers.jsonl import ParsedChains
+    from Helpers.numbering import shared_positions
+
+    positions = shared_positions(
+        ParsedChains(input_path), chains, [p.split() for p in tied_positions_value]
+    )
+    if positions is None:
+        print(
+            "- The residue IDs do not resolve to the same positions in every "
+            "structure, using the native implementation"
+        )
+        return None
+
+    return ",".join(" ".join(str(p) for p in chain) for chain in positions)
+
+
 # Function to run the assign_fixed_chains.py script
+@instrumented("make_tied_positions")
 def run_tied_positions(block: PluginBlock):
     """
-    Executes the make_tied_positions.py script with the provided arguments.
+    Builds the tied positions dictionary, natively or with the
+    make_tied_positions_dict.py script.
     """
     input_path = block.inputs[input_parsed_chains.id]
 
@@ -58,48 +103,85 @@ def run_tied_positions(block: PluginBlock):
     if os.path.exists(output_path):
         os.remove(output_path)
 
-    script_plugin_path = os.path.join(
-        block.pluginDir,
-        "Include",
-        "ProteinMPNN",
-        "helper_scripts",
-        "make_tied_positions_dict.py",
-    )
-
-    # Build the command to run
-    cmd = [
-        "python",
-        script_plugin_path,
-        f"--input_path={input_path}",
-        f"--output_path={output_path}",
-    ]
-
     chain_list_value = block.inputs[chain_list.id]
-    if chain_list_value:
-        chains = [c["chainID"] for c in chain_list_value]
-        cmd += [
-            "--chain_list",
-            f'"{" ".join(chains)}"',
-        ]
+    chains = [c["chainID"] for c in chain_list_value] if chain_list_value else []
 
     tied_positions_value = block.variables[tied_positions.id]
     if tied_positions_value:
         print("Tied positions: ", "\n".join(tied_positions_value))
-        cmd += ["--position_list", f'"{",".join(tied_positions_value)}"']
 
     homooligomer_value = block.variables[homooligomer.id]
-    if homooligomer_value:
-        cmd += [
-            "--homooligomer",
-            "1",
-        ]
 
-    # Run the command
-    from utils import execute_in_environment
-
-    out = execute_in_environment(block, " ".join(cmd))
+    from Config.config import use_helper_scripts
+
+    # Position list argument of the helper script, None to run natively
+    helper_argument = None
+    if block.config[use_helper_scripts.id] and not block.variables[detect_symmetry.id]:
+        helper_argument = helper_positions(input_path, chains, tied_positions_value)
+
+    if block.variables[detect_symmetry.id]:
+        from Helpers.dicts import write_dict
+        from Helpers.jsonl import ParsedChains
+        from Helpers.symmetry import make_symmetric_tied_positions_dict
+
+        tied_dict = make_symmetric_tied_positions_dict(
+            ParsedChains(input_path),
+            chains,
+            min_identity=block.variables[symmetry_identity.id] or 0.9,
+        )
+        write_dict(output_path, tied_dict)
+
+        for name, tied in tied_dict.items():
+            print(f"- {name}: {len(tied)} tied positions")
+    elif helper_argument is not None:
+        script_plugin_path = os.path.join(
+            block.pluginDir,
+            "Include",
+            "ProteinMPNN",
+            "helper_scripts",
+            "make_tied_positions_dict.py",
+        )
+
+        # Build the command to run
+        cmd = [
+            "python",
+            script_plugin_path,
+            f"--input_path={input_path}",
+            f"--output_path={output_path}",
+        ]
 
-    print(out)
+        if chains:
+            cmd += [
+                "--chain_list",
+                f'"{" ".join(chains)}"',
+            ]
+
+        if helper_argument:
+            cmd += ["--position_list", f'"{helper_argument}"']
+
+        if homooligomer_value:
+            cmd += [
+                "--homooligomer",
+                "1",
+            ]
+
+        # Run the command
+        from utils import execute_in_environment
+
+        execute_in_environment(block, " ".join(cmd))
+    else:
+        from Helpers.dicts import make_tied_positions_dict, write_dict
+        from Helpers.jsonl import ParsedChains
+
+        write_dict(
+            output_path,
+            make_tied_positions_dict(
+                ParsedChains(input_path),
+                chains,
+                [p.split() for p in tied_positions_value or []],
+                homooligomer=homooligomer_value,
+            ),
+        )
 
     block.setOutput(output_path_for_tied_positions.id, output_path)
 
@@ -110,7 +192,7 @@ make_tied_positions = PluginBlock(
     name="Make Tied Positions",
     description="This block executes the make_tied_positions.py script to make tied positions for a protein structure.",
     inputs=[input_parsed_chains, chain_list],
-    variables=[tied_positions, homooligomer],
+    variables=[tied_positions, homooligomer, detect_symmetry, symmetry_identity],
     outputs=[output_path_for_tied_positions],
     action=run_tied_positions,
 )
@@ -3,6 +3,8 @@ import shutil
 
 from HorusAPI import PluginBlock, PluginVariable, VariableTypes, VariableGroup
 
+from utils import instrumented
+
 # Define the variables for the parse_multiple_chains block
 pdb_input = VariableGroup(
     id="pdb_input",
@@ -41,6 +43,22 @@ ca_only = PluginVariable(
     defaultValue=False,
 )
 
+num_workers = PluginVariable(
+    id="num_workers",
+    name="Number of workers",
+    description="Number of processes used to parse the PDBs. Use 0 to use all the available cores.",
+    type=VariableTypes.INTEGER,
+    defaultValue=1,
+)
+
+use_cache = PluginVariable(
+    id="use_cache",
+    name="Use cache",
+    description="Reuse the structures parsed in previous runs when the PDB files did not change.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=True,
+)
+
 # Output
 output_parsed_chains = PluginVariable(
     id="output_parsed_chains",
@@ -52,9 +70,11 @@ output_parsed_chains = PluginVariable(
 
 
 # Function to run the parse_multiple_chains.py script
+@instrumented("parse")
 def run_parse_multiple_chains(block: PluginBlock):
     """
-    Executes the parse_multiple_chains.py script with the provided arguments.
+    Parses the input PDBs into a JSONL file, natively or with the
+    parse_multiple_chains.py script.
     """
 
     # Get the files from each group
@@ -84,31 +104,58 @@ def run_parse_multiple_chains(block: PluginBlock):
 
     ca_only_value = block.variables[ca_only.id]
 
-    script_plugin_path = os.path.join(
-        block.pluginDir,
-        "Include",
-        "ProteinMPNN",
-        "helper_scripts",
-        "parse_multiple_chains.py",
-    )
+    from Config.config import use_helper_scripts
 
-    # Build the command to run
-    cmd = [
-        "python",
-        script_plugin_path,
-        f"--input_path={input_path}",
-        f"--output_path={output_path}",
-    ]
+    if block.config[use_helper_scripts.id]:
+        script_plugin_path = os.path.join(
+            block.pluginDir,
+            "Include",
+            "ProteinMPNN",
+            "helper_scripts",
+            "parse_multiple_chains.py",
+        )
+
+        # Build the command to run
+        cmd = [
+            "python",
+            script_plugin_path,
+            f"--input_path={input_path}",
+            f"--output_path={output_path}",
+        ]
+
+        if ca_only_value:
+            cmd.append("--ca_only")
 
-    if ca_only_value:
-        cmd.append("--ca_only")
+        # Run the command
+        from utils import execute_in_environment
+
+        execute_in_environment(block, " ".join(cmd))
+    else:
+        from Helpers.parse_pdbs import parse_multiple_chains
+        from utils import get_cache
+
+        cache = None
+        if block.variables[use_cache.id]:
+            cache = get_cache(block, "parsed_pdbs")
+
+        summary = parse_multiple_chains(
+            input_path,
+            output_path,
+            ca_only=ca_only_value,
+            num_workers=block.variables[num_workers.id],
+            cache=cache,
+        )
 
-    # Run the command
-    from utils import execute_in_environment
+        print(f"Parsed {summary['parsed']} structures")
 
-    out = execute_in_environment(block, " ".join(cmd))
+        for path, error in summary["failed"]:
+            print(f"- Skipped {os.path.basename(path)}: {error}")
 
-    print(out)
+        if cache is not None:
+            print(
+                f"Cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses, "
+                f"{summary['cache_evicted']} evicted"
+            )
 
     block.setOutput(output_parsed_chains.id, output_path)
 
@@ -119,7 +166,7 @@ parse_multiple_chains_block = PluginBlock(
     name="Parse Multiple Chains",
     description="This block executes the parse_multiple_chains.py script to process PDBs.",
     inputGroups=[pdb_input, pdb_folder],
-    variables=[ca_only],
+    variables=[ca_only, num_workers, use_cache],
     outputs=[output_parsed_chains],
     action=run_parse_multiple_chains,
 )
@@ -1,10 +1,12 @@
 import os
-import csv
-import re
+import shlex
 import shutil
+import time
 
 from HorusAPI import SlurmBlock, PluginVariable, VariableTypes, Extensions
 
+from utils import block_metrics, instrumented
+
 # Inputs
 jsonl_path_variable = PluginVariable(
     id="jsonl_path",
@@ -262,6 +264,198 @@ pssm_bias_flag_variable = PluginVariable(
     defaultValue=False,
 )
 
+num_shards_variable = PluginVariable(
+    id="num_shards",
+    name="Number of Shards",
+    description="Split the structures into this many shards and run them as a Slurm job array. Use 1 to run everything in a single job.",
+    type=VariableTypes.INTEGER,
+    defaultValue=1,
+)
+
+slurm_array_options_variable = PluginVariable(
+    id="slurm_array_options",
+    name="Slurm Array Options",
+    description="Extra sbatch options for the sharded job array.",
+    type=VariableTypes.STRING,
+    placeholder="--partition=cpu --time=01:00:00 --cpus-per-task=4",
+)
+
+bucket_batch_sizes_variable = PluginVariable(
+    id="bucket_batch_sizes",
+    name="Batch Size per Length",
+    description="Batch size per length bucket as min_length:batch_size pairs, e.g. '0:8 300:4 800:1'. The batch size is lowered to a divisor of the number of sequences per target.",
+    type=VariableTypes.STRING,
+    placeholder="0:8 300:4 800:1",
+)
+
+auto_tune_variable = PluginVariable(
+    id="auto_tune",
+    name="Auto-tune Batch Size",
+    description="Time a few batch sizes and thread counts on each target and use the fastest one. The result is cached per length bucket and node type.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+memory_budget_variable = PluginVariable(
+    id="memory_budget",
+    name="Memory Budget (MB)",
+    description="Largest estimated memory the auto-tuned batch size may use. Use 0 for no limit.",
+    type=VariableTypes.INTEGER,
+    defaultValue=0,
+)
+
+sweep_models_variable = PluginVariable(
+    id="sweep_models",
+    name="Sweep Models",
+    description="Design every structure with each of these models in the same run, e.g. 'v_48_002 v_48_020 soluble:v_48_020'. The soluble: prefix selects the soluble weights. Temperatures are swept with the sampling temperatures.",
+    type=VariableTypes.STRING,
+    placeholder="v_48_002 v_48_020 soluble:v_48_020",
+)
+
+sweep_noise_variable = PluginVariable(
+    id="sweep_noise",
+    name="Sweep Backbone Noise",
+    description="Design every structure with each of these backbone noise levels (in Angstroms) in the same run.",
+    type=VariableTypes.STRING,
+    placeholder="0.0 0.02 0.1",
+)
+
+feature_cache_variable = PluginVariable(
+    id="feature_cache",
+    name="Cache Backbone Features",
+    description="Compute the edge features of every backbone once and keep them in the plugin cache, so repeated runs and mutants of the same structures skip them. Not used with backbone noise.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+reuse_encoder_variable = PluginVariable(
+    id="reuse_encoder",
+    name="Reuse Encoder Output",
+    description="Run the encoder once per structure and model, and reuse its output for scoring and every sampled batch. Not used with backbone noise.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+constraint_variants_variable = PluginVariable(
+    id="constraint_variants",
+    name="Constraint Variants",
+    description="JSONL file with one constraint set per line, e.g. {\"name\": \"core\", \"fixed_positions_jsonl\": \"fixed_core.jsonl\"}. Every structure is designed with each of them from a single encoder pass. A variant may set fixed_positions_jsonl, bias_AA_jsonl, bias_by_res_jsonl, omit_AA_jsonl, tied_positions_jsonl and omit_AAs.",
+    type=VariableTypes.FILE,
+    allowedValues=["jsonl"],
+)
+
+num_workers_variable = PluginVariable(
+    id="num_workers",
+    name="Parallel Processes",
+    description="Run the structures in this many processes, each pinned to its own slice of the cores. Use 0 or 1 for a single process.",
+    type=VariableTypes.INTEGER,
+    defaultValue=0,
+)
+
+threads_per_worker_variable = PluginVariable(
+    id="threads_per_worker",
+    name="Threads per Process",
+    description="Torch threads of every parallel process. Use 0 to split the available cores evenly.",
+    type=VariableTypes.INTEGER,
+    defaultValue=0,
+)
+
+precision_variable = PluginVariable(
+    id="precision",
+    name="Precision",
+    description="Numeric precision of the linear layers on CPU: fp32 (default), bf16 or dynamic int8. Reduced precision models are converted once and kept in the plugin cache, and the run fails if they drift from fp32 beyond the tolerance.",
+    type=VariableTypes.RADIO,
+    defaultValue="fp32",
+    allowedValues=["fp32", "bf16", "int8"],
+)
+
+precision_tolerance_variable = PluginVariable(
+    id="precision_tolerance",
+    name="Precision Tolerance",
+    description="Largest mean absolute difference of the native log-probabilities per designed position, against fp32, allowed for bf16 and int8. Use 0 for the default of the precision: 0.05 for bf16 and 0.2 for int8.",
+    type=VariableTypes.FLOAT,
+    defaultValue=0,
+)
+
+backend_variable = PluginVariable(
+    id="backend",
+    name="Backend",
+    description="Run the encoder and decoder layers eagerly or as TorchScript graphs, traced once per model and kept in the plugin cache. Both give the same sequences for the same seed.",
+    type=VariableTypes.RADIO,
+    defaultValue="eager",
+    allowedValues=["eager", "torchscript"],
+)
+
+# Variables of the block, the ProteinMPNN Pipeline block shares them
+VARIABLES = [
+    suppress_print_variable,
+    ca_only_variable,
+    path_to_model_weights_variable,
+    model_name_variable,
+    use_soluble_model_variable,
+    seed_variable,
+    save_score_variable,
+    save_probs_variable,
+    score_only_variable,
+    path_to_fasta_variable,
+    conditional_probs_only_variable,
+    conditional_probs_only_backbone_variable,
+    unconditional_probs_only_variable,
+    backbone_noise_variable,
+    num_seq_per_target_variable,
+    batch_size_variable,
+    max_length_variable,
+    sampling_temp_variable,
+    omit_aas_variable,
+    pssm_multi_variable,
+    pssm_threshold_variable,
+    pssm_log_odds_flag_variable,
+    pssm_bias_flag_variable,
+    num_shards_variable,
+    slurm_array_options_variable,
+    bucket_batch_sizes_variable,
+    auto_tune_variable,
+    memory_budget_variable,
+    sweep_models_variable,
+    sweep_noise_variable,
+    feature_cache_variable,
+    reuse_encoder_variable,
+    constraint_variants_variable,
+    num_workers_variable,
+    threads_per_worker_variable,
+    precision_variable,
+    precision_tolerance_variable,
+    backend_variable,
+]
+
+# Variables that only drive the plugin and are not passed to protein_mpnn_run.py
+PLUGIN_VARIABLES = [num_shards_variable.id, slurm_array_options_variable.id]
+
+# Variables implemented by Scripts/mpnn_engine.py. When any of them is set,
+# the run goes through the engine instead of protein_mpnn_run.py
+ENGINE_VARIABLES = [
+    bucket_batch_sizes_variable.id,
+    auto_tune_variable.id,
+    memory_budget_variable.id,
+    sweep_models_variable.id,
+    sweep_noise_variable.id,
+    feature_cache_variable.id,
+    reuse_encoder_variable.id,
+    constraint_variants_variable.id,
+    num_workers_variable.id,
+    threads_per_worker_variable.id,
+    precision_variable.id,
+    precision_tolerance_variable.id,
+    backend_variable.id,
+]
+
+# Engine variable values that run the same as protein_mpnn_run.py
+ENGINE_DEFAULTS = {
+    precision_variable.id: precision_variable.defaultValue,
+    precision_tolerance_variable.id: precision_tolerance_variable.defaultValue,
+    backend_variable.id: backend_variable.defaultValue,
+}
+
 # Outputs
 out_folder_variable = PluginVariable(
     id="out_folder",
@@ -270,145 +464,379 @@ out_folder_variable = PluginVariable(
     type=VariableTypes.FOLDER,
 )
 
+results_table_variable = PluginVariable(
+    id="results_table",
+    name="Results Table",
+    description="Typed columnar results (compressed NPZ). Read it with Helpers.results.ResultsTable.",
+    type=VariableTypes.FILE,
+    allowedValues=["npz"],
+)
 
-def run_protein_mpnn(block: SlurmBlock):
+
+def build_parameters(inputs: dict, variables: dict) -> str:
     """
-    Executes the script
+    Builds the protein_mpnn_run.py command line arguments.
     """
 
     parameters = ""
-    for k, v in block.inputs.items():
-        if v is not None:
+    for k, v in inputs.items():
+        parameters += f" --{k} '{v}'"
+
+    for k, v in variables.items():
+        if k in ENGINE_VARIABLES:
+            continue
+        if isinstance(v, bool):
+            if v:
+                parameters += f" --{k}"
+        else:
             parameters += f" --{k} '{v}'"
 
-    for k, v in block.variables.items():
-        if v is not None:
-            if isinstance(v, bool):
-                if v:
-                    parameters += f" --{k}"
-            else:
-                parameters += f" --{k} '{v}'"
+    return parameters
 
-    out_folder_value = "mpnn_output"
 
-    if os.path.exists(out_folder_value):
-        shutil.rmtree(out_folder_value)
+def uses_engine(variables: dict, inputs: dict = None) -> bool:
+    """
+    The engine is needed for the plugin extensions and for PSSM sidecars,
+    which protein_mpnn_run.py cannot read.
+    """
+    if any(
+        variables.get(k) and variables.get(k) != ENGINE_DEFAULTS.get(k)
+        for k in ENGINE_VARIABLES
+    ):
+        return True
 
-    os.makedirs(out_folder_value, exist_ok=True)
+    from Helpers.pssm import read_sidecar_reference
 
-    block.extraData["out_folder_value"] = out_folder_value
+    return bool(read_sidecar_reference((inputs or {}).get(pssm_jsonl_variable.id)))
+
+
+def with_plugin_cache(block: SlurmBlock, params: dict) -> dict:
+    """
+    Adds the plugin cache folder and size to the parameters of runs that cache
+    the backbone features, reduced precision models or TorchScript graphs.
+    """
+    if (
+        not params.get(feature_cache_variable.id)
+        and params.get(precision_variable.id) in (None, "fp32")
+        and params.get(backend_variable.id) in (None, "eager")
+    ):
+        return params
+
+    from Config.config import cache_dir, cache_size
+
+    directory = block.config[cache_dir.id]
+
+    return {
+        **params,
+        "plugin_cache_dir": os.path.expanduser(directory) if directory else "",
+        "plugin_cache_size": block.config[cache_size.id],
+    }
+
+
+def engine_command(block: SlurmBlock, params: dict, params_file: str) -> str:
+    """
+    Writes the run parameters and returns the command that runs them with
+    Scripts/mpnn_engine.py.
+    """
+    import json
+
+    with open(params_file, "w") as f:
+        json.dump(params, f)
 
     script_plugin_path = os.path.join(
-        block.pluginDir, "Include", "ProteinMPNN", "protein_mpnn_run.py"
+        block.pluginDir, "Include", "Scripts", "mpnn_engine.py"
     )
 
-    script = (
-        f"python3 {script_plugin_path} --out_folder {out_folder_value} {parameters}"
+    return f"python3 {shlex.quote(script_plugin_path)} {shlex.quote(params_file)}"
+
+
+def run_sharded(block: SlurmBlock, inputs: dict, variables: dict):
+    """
+    Splits the structures into shards and runs the pending ones as a Slurm
+    job array. Finished shards are kept, so a rerun only retries the failed
+    ones.
+    """
+    from Config.config import conda_environment, conda_run_config
+    from Helpers.shards import (
+        array_script,
+        is_done,
+        parameters_hash,
+        prepare_shards,
+        shard_inputs,
+        shard_name,
+    )
+
+    num_shards = block.variables[num_shards_variable.id]
+    shards_folder = os.path.abspath("mpnn_shards")
+
+    # The array tasks run from the shard folders
+    inputs = {
+        k: os.path.abspath(v) if os.path.exists(str(v)) else v
+        for k, v in inputs.items()
+    }
+    variables = {
+        k: os.path.abspath(v) if isinstance(v, str) and os.path.exists(v) else v
+        for k, v in variables.items()
+    }
+
+    folders = prepare_shards(
+        shards_folder, inputs, num_shards, parameters_hash({**inputs, **variables})
     )
+    block.extraData["shard_folders"] = folders
+
+    pending = [i for i, folder in enumerate(folders) if not is_done(folder)]
+    if not pending:
+        print(f"All {num_shards} shards already finished")
+        return
 
-    from utils import execute_in_environment
+    env: str = block.config[conda_environment.id]
+    conda_run: str = block.config[conda_run_config.id]
+    script_plugin_path = os.path.join(
+        block.pluginDir, "Include", "ProteinMPNN", "protein_mpnn_run.py"
+    )
 
-    out = execute_in_environment(block, script)
+    commands = []
+    for folder in folders:
+        if uses_engine(variables, inputs):
+            params = {**shard_inputs(folder, inputs), **variables}
+            params["out_folder"] = "mpnn_output"
+            params = with_plugin_cache(block, params)
+            command = engine_command(
+                block, params, os.path.join(folder, "mpnn_params.json")
+            )
+        else:
+            command = (
+                f"python3 {shlex.quote(script_plugin_path)} --out_folder mpnn_output"
+                + build_parameters(shard_inputs(folder, inputs), variables)
+            )
+        commands.append(f"{conda_run} {env} {command}")
+
+    script_path = os.path.join(shards_folder, "array.sh")
+    with open(script_path, "w") as f:
+        f.write(array_script(folders, commands))
+
+    print(f"Submitting {len(pending)} of {num_shards} shards as a Slurm job array")
+
+    options = block.variables[slurm_array_options_variable.id] or ""
+    array = ",".join(str(i) for i in pending)
+    out = block.remote.command(
+        f"sbatch --wait --array={array} {options} {shlex.quote(script_path)}"
+    )
 
     print(out)
 
+    failed = [shard_name(i) for i, folder in enumerate(folders) if not is_done(folder)]
+    if failed:
+        raise Exception(
+            f"Shards {', '.join(failed)} failed (see {shards_folder}). "
+            "Run the block again to retry only these shards."
+        )
 
-def parse_results(block: SlurmBlock):
+
+def collect_engine_metrics(block: SlurmBlock, out_folder: str, started_at: float):
     """
-    Parse the results of the ProteinMPNN block.
+    Adds the stages measured by Scripts/mpnn_engine.py to the block metrics.
+    For one-shot runs, the time between the command start and the engine start
+    is the environment activation.
     """
+    import json
+
+    engine_metrics = os.path.join(out_folder, "engine_metrics.json")
+    if not os.path.exists(engine_metrics):
+        return
+
+    with open(engine_metrics, "r") as f:
+        data = json.load(f)["engine"]
+
+    metrics = block_metrics(block)
+    if "import" in data["stages"]:
+        activation_s = round(data["started_at"] - started_at, 4)
+        metrics.add_stages({"environment_activation": {"wall_s": activation_s}})
+    metrics.add_stages(data["stages"], prefix="engine.")
+    metrics.add(
+        structures=data["structures"],
+        sequences=data["sequences"],
+        seqs_per_second=data["seqs_per_second"],
+    )
 
-    # Read the output file and create a CSV to be loaded with Horus
-    out_folder_value = os.path.join(block.extraData["out_folder_value"], "seqs")
 
-    def parse_fasta(file_path: str):
-
-        model_name = os.path.basename(file_path).split(".")[0]
-
-        with open(file_path, "r") as f:
-            entries = []
-            current_entry = {}
-
-            for index, line in enumerate(f):
-                line = line.strip()
-                if line.startswith(">"):
-                    # Store previous entry if it exists
-                    if current_entry:
-                        entries.append(current_entry)
-
-                    # Parse the new header
-                    current_entry = {}
-                    current_entry["model"] = model_name
-
-                    if index == 0:
-                        current_entry["sample"] = "-"
-                        current_entry["T"] = "-"
-                        current_entry["sample"] = "-"
-                        current_entry["seq_recovery"] = "-"
-
-                    fields = re.findall(r"(\w+)=([^,]+)", line)
-
-                    for key, value in fields:
-                        current_entry[key] = value
-                else:
-                    current_entry["sequence"] = line
-
-            # Append last entry
-            if current_entry:
-                entries.append(current_entry)
-
-        return entries
-
-    def write_csv(output_file, data):
-        if not data:
-            print("No data to write.")
-            return
-
-        # Collect all possible column names
-        all_keys = set()
-        for entry in data:
-            all_keys.update(entry.keys())
-
-        fieldnames = [
-            "sequence",
-            "model",
-            "score",
-            "global_score",
-            "seq_recovery",
-            "sample",
-        ] + sorted(
-            k
-            for k in all_keys
-            if k
-            not in {
-                "sequence",
-                "model",
-                "score",
-                "global_score",
-                "seq_recovery",
-                "sample",
-            }
+def prepare_resume(block: SlurmBlock, params: dict, out_folder: str):
+    """
+    Checks the checkpoint of a previous run in out_folder and returns the
+    parameters restricted to the structures that still have to run, or None
+    when all of them are finished.
+    """
+    from Helpers.checkpoint import prepare_resume as checkpoint_resume
+    from Helpers.checkpoint import write_pending_jsonl
+    from Helpers.jsonl import ParsedChains
+    from Helpers.shards import parameters_hash
+
+    jsonl_path = params[jsonl_path_variable.id]
+
+    # The structures are tracked one by one, so adding structures to the
+    # input does not invalidate the finished ones
+    params_hash = parameters_hash(
+        {k: v for k, v in params.items() if k != jsonl_path_variable.id}
+    )
+    pending = checkpoint_resume(out_folder, jsonl_path, params, params_hash)
+
+    block.extraData["resumed_targets"] = pending
+
+    total = len(ParsedChains(jsonl_path))
+    if not pending:
+        print(f"All {total} structures already finished in {out_folder}")
+        return None
+
+    if len(pending) < total:
+        print(f"Resuming: {total - len(pending)} of {total} structures already done")
+
+    pending_jsonl = os.path.abspath("mpnn_pending.jsonl")
+    write_pending_jsonl(jsonl_path, pending, pending_jsonl)
+
+    return {**params, jsonl_path_variable.id: pending_jsonl}
+
+
+@instrumented("run")
+def run_protein_mpnn(block: SlurmBlock):
+    """
+    Executes the script
+    """
+
+    inputs = {k: v for k, v in block.inputs.items() if v is not None}
+    variables = {
+        k: v
+        for k, v in block.variables.items()
+        if v is not None and k not in PLUGIN_VARIABLES
+    }
+
+    out_folder_value = "mpnn_output"
+
+    block.extraData["out_folder_value"] = out_folder_value
+    block.extraData["shard_folders"] = None
+    block.extraData["resumed_targets"] = None
+
+    if (block.variables[num_shards_variable.id] or 1) > 1:
+        # The shards keep their own DONE markers and are merged again
+        if os.path.exists(out_folder_value):
+            shutil.rmtree(out_folder_value)
+        os.makedirs(out_folder_value, exist_ok=True)
+
+        run_sharded(block, inputs, variables)
+        return
+
+    params = prepare_resume(block, {**inputs, **variables}, out_folder_value)
+    if params is None:
+        return
+
+    inputs = {k: params[k] for k in inputs}
+    params["out_folder"] = out_folder_value
+
+    # Lets mpnn_engine mark every structure as done as soon as it finishes
+    params["checkpoint"] = True
+    params = with_plugin_cache(block, params)
+
+    if uses_engine(variables, inputs):
+        script = engine_command(block, params, os.path.abspath("mpnn_params.json"))
+    else:
+        script_plugin_path = os.path.join(
+            block.pluginDir, "Include", "ProteinMPNN", "protein_mpnn_run.py"
+        )
+
+        parameters = build_parameters(inputs, variables)
+
+        script = (
+            f"python3 {script_plugin_path} --out_folder {out_folder_value} {parameters}"
+        )
+
+    from utils import execute_in_environment, execute_in_worker
+
+    started_at = time.time()
+
+    out = execute_in_worker(block, params)
+
+    if out is None:
+        execute_in_environment(block, script)
+    else:
+        print(out)
+
+    collect_engine_metrics(block, out_folder_value, started_at)
+
+    from Helpers.checkpoint import finish
+
+    missing = finish(out_folder_value, params)
+    if missing:
+        print(
+            f"{len(missing)} structures have no complete output "
+            f"(e.g. longer than max_length): {', '.join(missing[:10])}"
         )
 
-        with open(output_file, "w", newline="") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
 
-    all_entries = []
-    for file in os.listdir(out_folder_value):
-        if file.endswith(".fa"):
-            file_path = os.path.join(out_folder_value, file)
-            all_entries.extend(parse_fasta(file_path))
+@instrumented("parse_results", reset=False)
+def parse_results(block: SlurmBlock):
+    """
+    Parse the results of the ProteinMPNN block. The outputs of structures
+    finished by previous runs are read together with the new ones.
+    """
+
+    shard_folders = block.extraData.get("shard_folders")
+    if shard_folders:
+        from Helpers.shards import merge_shards
+
+        merged = merge_shards(shard_folders, block.extraData["out_folder_value"])
+        print(f"Merged {merged} files from {len(shard_folders)} shards")
+
+    # Read the output file and create a CSV to be loaded with Horus
+    out_folder_value = os.path.join(block.extraData["out_folder_value"], "seqs")
+
+    from Helpers.results import (
+        ColumnarResultsWriter,
+        iter_results,
+        write_results_csv,
+    )
 
     results_file = "protein_mpnn_results.csv"
-    print(f"Writing results to {results_file}")
+    table_file = "protein_mpnn_results.npz"
+    print(f"Writing results to {results_file} and {table_file}")
 
-    write_csv(results_file, all_entries)
+    columnar = ColumnarResultsWriter(table_file)
+    rows = write_results_csv(
+        results_file, columnar.tee(iter_results(out_folder_value))
+    )
+    columnar.close()
+
+    if not rows:
+        print("No data to write.")
+
+    metrics = block_metrics(block)
+    if "seqs_per_second" not in metrics.data:
+        from Helpers.results import iter_fasta_entries, list_fasta_files
+
+        fasta_files = list_fasta_files(out_folder_value)
+        resumed = block.extraData.get("resumed_targets")
+
+        # The first entry of every FASTA file is the native sequence
+        if resumed is None:
+            sequences = rows - len(fasta_files)
+        else:
+            # Only the structures run this time count towards the rate
+            resumed = set(resumed)
+            fasta_files = [
+                p for p in fasta_files if os.path.basename(p)[: -len(".fa")] in resumed
+            ]
+            sequences = sum(
+                1 for p in fasta_files for _ in iter_fasta_entries(p)
+            ) - len(fasta_files)
+        stages = metrics.data["stages"]
+        run_s = stages.get("environment", stages.get("worker", {})).get("wall_s")
+        metrics.add(
+            sequences=sequences,
+            seqs_per_second=round(sequences / run_s, 3) if run_s else None,
+        )
 
     Extensions().loadCSV(results_file, title="ProteinMPNN Results")
 
     block.setOutput(out_folder_variable.id, out_folder_value)
+    block.setOutput(results_table_variable.id, table_file)
 
 
 protein_mpnn_block = SlurmBlock(
@@ -425,32 +853,8 @@ protein_mpnn_block = SlurmBlock(
         pssm_jsonl_variable,
         tied_positions_jsonl_variable,
     ],
-    variables=[
-        suppress_print_variable,
-        ca_only_variable,
-        path_to_model_weights_variable,
-        model_name_variable,
-        use_soluble_model_variable,
-        seed_variable,
-        save_score_variable,
-        save_probs_variable,
-        score_only_variable,
-        path_to_fasta_variable,
-        conditional_probs_only_variable,
-        conditional_probs_only_backbone_variable,
-        unconditional_probs_only_variable,
-        backbone_noise_variable,
-        num_seq_per_target_variable,
-        batch_size_variable,
-        max_length_variable,
-        sampling_temp_variable,
-        omit_aas_variable,
-        pssm_multi_variable,
-        pssm_threshold_variable,
-        pssm_log_odds_flag_variable,
-        pssm_bias_flag_variable,
-    ],
+    variables=VARIABLES,
     initialAction=run_protein_mpnn,
     finalAction=parse_results,
-    outputs=[out_folder_variable],
+    outputs=[out_folder_variable, results_table_variable],
 )
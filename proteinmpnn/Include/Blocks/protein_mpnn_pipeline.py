@@ -0,0 +1,385 @@
+import os
+import shutil
+import time
+
+from HorusAPI import (
+    SlurmBlock,
+    PluginVariable,
+    VariableGroup,
+    VariableList,
+    VariableTypes,
+)
+from Bio.PDB.Polypeptide import standard_aa_names
+
+from Blocks import protein_mpnn
+from utils import instrumented
+
+# Inputs
+pdb_input = VariableGroup(
+    id="pdb_input",
+    name="PDB file",
+    description="Select a file containing the structure of interest",
+    variables=[
+        PluginVariable(
+            id="pdb_input",
+            name="PDB File",
+            description="Select a file containing the structure of interest.",
+            type=VariableTypes.FILE,
+            allowedValues=["pdb"],
+        )
+    ],
+)
+
+pdb_folder = VariableGroup(
+    id="input_pdbs_folder",
+    name="PDB folder",
+    description="Select a folder containing PDB files",
+    variables=[
+        PluginVariable(
+            id="input_pdbs_folder",
+            name="PDB Folder",
+            description="The folder containing the PDBs to design.",
+            type=VariableTypes.FOLDER,
+        )
+    ],
+)
+
+# Variables
+designed_chains_variable = PluginVariable(
+    id="designed_chains",
+    name="Designed chains",
+    description="Chains to design. The other chains are fixed. Leave empty to design every chain.",
+    type=VariableTypes.CHAIN,
+)
+
+parse_workers_variable = PluginVariable(
+    id="parse_workers",
+    name="Parsing workers",
+    description="Number of processes used to parse the PDBs and load the PSSMs. Use 0 to use all the available cores.",
+    type=VariableTypes.INTEGER,
+    defaultValue=1,
+)
+
+use_cache_variable = PluginVariable(
+    id="use_cache",
+    name="Use cache",
+    description="Reuse the structures and PSSMs processed in previous runs when their files did not change.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=True,
+)
+
+specify_non_fixed_variable = PluginVariable(
+    id="specify_non_fixed",
+    name="Specify Non Fixed",
+    description="If true, only the specified residues will be designed. The mutations are not applied in this mode.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+fixed_residue = PluginVariable(
+    id="fixed_residue",
+    name="Fixed Residue",
+    description="PDB residue number that should be fixed.",
+    type=VariableTypes.NUMBER,
+)
+
+fixed_residue_label = PluginVariable(
+    id="fixed_residue_label",
+    name="Fixed Residue ID",
+    description="PDB residue ID with an insertion code (e.g. 52A). Used instead of the residue number when set.",
+    type=VariableTypes.STRING,
+    placeholder="52A",
+)
+
+chain_residue_variable = PluginVariable(
+    id="chain_residue_variable",
+    name="Chain",
+    description="Chain",
+    type=VariableTypes.STRING,
+    placeholder="A",
+)
+
+mutate_variable = PluginVariable(
+    id="mutate_variable",
+    name="Mutate variable",
+    description="Amino acid the fixed residue is mutated to, '-' to keep it.",
+    type=VariableTypes.STRING_LIST,
+    allowedValues=["-"] + list(standard_aa_names),
+)
+
+fixed_positions_variable = VariableList(
+    id="fixed_positions",
+    name="Fixed Positions and mutations",
+    description="Residues that should remain fixed for each chain.",
+    prototypes=[
+        fixed_residue,
+        fixed_residue_label,
+        chain_residue_variable,
+        mutate_variable,
+    ],
+)
+
+mutation_sets_variable = PluginVariable(
+    id="mutation_sets",
+    name="Mutation sets",
+    description="Optional CSV/TSV table with 'variant' and 'mutations' columns (e.g. 'v1,A:45:W A:46:LEU'). Every structure produces one mutated record per variant, named <structure>_<variant>. The mutated positions are fixed.",
+    type=VariableTypes.FILE,
+    allowedValues=["csv", "tsv"],
+)
+
+tied_chains_variable = PluginVariable(
+    id="tied_chains",
+    name="Tied chains",
+    description="Chains of the tied positions, in the order of the tied position lists.",
+    type=VariableTypes.CHAIN,
+)
+
+tied_positions_variable = PluginVariable(
+    id="tied_positions",
+    name="Tied positions",
+    description="Residue IDs to be tied, one list per tied chain (e.g. '10 11 12A'). Lists must match in length.",
+    type=VariableTypes.LIST,
+)
+
+homooligomer_variable = PluginVariable(
+    id="homooligomer",
+    name="Homooligomer",
+    description="Tie every position of all the chains.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+detect_symmetry_variable = PluginVariable(
+    id="detect_symmetry",
+    name="Detect symmetry",
+    description="Tie the equivalent positions of identical or near-identical chains automatically. Overrides the tied positions and homooligomer options.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+symmetry_identity_variable = PluginVariable(
+    id="symmetry_identity",
+    name="Symmetry identity",
+    description="Minimum sequence identity (0-1) for two chains to be treated as copies of the same subunit.",
+    type=VariableTypes.FLOAT,
+    defaultValue=0.9,
+)
+
+aa_list_variable = PluginVariable(
+    id="AA_list",
+    name="AA list",
+    description="List of amino acids to bias.",
+    type=VariableTypes.STRING,
+    placeholder="D E H K N Q R S T W Y",
+)
+
+bias_list_variable = PluginVariable(
+    id="bias_list",
+    name="Bias list",
+    description="Bias of every amino acid of the AA list.",
+    type=VariableTypes.STRING,
+    placeholder="1.39 1.39 1.39 1.39 1.39 1.39 1.39 1.39 1.39 1.39 1.39",
+)
+
+bias_table_variable = PluginVariable(
+    id="bias_table",
+    name="Bias table",
+    description="Per residue bias as a CSV/TSV rule or matrix table (see the Make Bias by Residue block). Applied to the designed chains.",
+    type=VariableTypes.FILE,
+    allowedValues=["csv", "tsv"],
+)
+
+bias_arrays_variable = PluginVariable(
+    id="bias_arrays",
+    name="Bias arrays",
+    description="NPZ with one L x 21 per residue bias array per chain, keyed '<chain>' or '<name>/<chain>'. Added to the bias table.",
+    type=VariableTypes.FILE,
+    allowedValues=["npz"],
+)
+
+pssm_folder_variable = PluginVariable(
+    id="pssm_input_path",
+    name="PSSMs",
+    description="Folder with the PSSM of every structure as <name>.npz.",
+    type=VariableTypes.FOLDER,
+)
+
+dump_intermediate_variable = PluginVariable(
+    id="dump_intermediate",
+    name="Dump intermediate JSONLs",
+    description="Also write the parsed chains and the dictionaries built in memory as the JSONL files of the helper blocks, to pipeline_inputs/.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+PIPELINE_VARIABLES = [
+    designed_chains_variable,
+    parse_workers_variable,
+    use_cache_variable,
+    specify_non_fixed_variable,
+    fixed_positions_variable,
+    mutation_sets_variable,
+    tied_chains_variable,
+    tied_positions_variable,
+    homooligomer_variable,
+    detect_symmetry_variable,
+    symmetry_identity_variable,
+    aa_list_variable,
+    bias_list_variable,
+    bias_table_variable,
+    bias_arrays_variable,
+    pssm_folder_variable,
+    dump_intermediate_variable,
+]
+
+# Design options of the ProteinMPNN block, without the Slurm array ones
+DESIGN_VARIABLES = [
+    v for v in protein_mpnn.VARIABLES if v.id not in protein_mpnn.PLUGIN_VARIABLES
+]
+
+
+def input_folder(block: SlurmBlock) -> str:
+    """
+    Returns the folder with the input PDBs. A single PDB is copied to a
+    folder of its own.
+    """
+    if block.selectedInputGroup == pdb_folder.id:
+        return os.path.abspath(block.inputs[pdb_folder.id])
+
+    input_path = block.inputs[pdb_input.id]
+
+    block_dirname = block.id + "_" + str(block._placedID) + "_input_pdbs"
+    if os.path.exists(block_dirname):
+        shutil.rmtree(block_dirname)
+    os.makedirs(block_dirname, exist_ok=True)
+    shutil.copyfile(
+        input_path, os.path.join(block_dirname, os.path.basename(input_path))
+    )
+
+    return os.path.abspath(block_dirname)
+
+
+def selected_chains(value) -> list:
+    return [c["chainID"] for c in value] if value else []
+
+
+def absolute(path):
+    return os.path.abspath(path) if path else None
+
+
+def build_spec(block: SlurmBlock) -> dict:
+    """
+    Builds the input pipeline of the run (Helpers/pipeline.py) from the
+    variables, the same way the helper blocks read them.
+    """
+    from Helpers.mutations import to_one_letter
+    from Helpers.numbering import first_label
+
+    variables = block.variables
+    specify_non_fixed = bool(variables[specify_non_fixed_variable.id])
+
+    fixed_positions = {}
+    mutations = []
+    for r in variables[fixed_positions_variable.id] or []:
+        chain = r[chain_residue_variable.id]
+        pos = first_label(r.get(fixed_residue_label.id), r.get(fixed_residue.id))
+        fixed_positions.setdefault(chain, []).append(pos)
+        mutation = r[mutate_variable.id]
+        if not specify_non_fixed and mutation in standard_aa_names:
+            mutations.append([chain, pos, to_one_letter(mutation)])
+
+    aa_list = (variables[aa_list_variable.id] or "").split()
+    bias_list = (variables[bias_list_variable.id] or "").split()
+    if len(aa_list) != len(bias_list):
+        raise Exception("The AA list and the bias list must have the same length.")
+
+    mutation_sets = None
+    if not specify_non_fixed:
+        mutation_sets = absolute(variables[mutation_sets_variable.id])
+
+    tied_positions = variables[tied_positions_variable.id] or []
+
+    dump_folder = None
+    if variables[dump_intermediate_variable.id]:
+        dump_folder = os.path.abspath("pipeline_inputs")
+
+    return {
+        "pdb_path": input_folder(block),
+        "parse_workers": variables[parse_workers_variable.id],
+        "pssm_workers": variables[parse_workers_variable.id],
+        "use_cache": bool(variables[use_cache_variable.id]),
+        "designed_chains": selected_chains(variables[designed_chains_variable.id]),
+        "fixed_positions": fixed_positions,
+        "specify_non_fixed": specify_non_fixed,
+        "mutations": mutations,
+        "mutation_sets": mutation_sets,
+        "tied_chains": selected_chains(variables[tied_chains_variable.id]),
+        "tied_positions": [p.split() for p in tied_positions],
+        "homooligomer": bool(variables[homooligomer_variable.id]),
+        "detect_symmetry": bool(variables[detect_symmetry_variable.id]),
+        "symmetry_identity": variables[symmetry_identity_variable.id],
+        "AA_list": aa_list,
+        "bias_list": bias_list,
+        "bias_table": absolute(variables[bias_table_variable.id]),
+        "bias_arrays": absolute(variables[bias_arrays_variable.id]),
+        "pssm_path": absolute(variables[pssm_folder_variable.id]),
+        "dump_folder": dump_folder,
+    }
+
+
+@instrumented("run")
+def run_pipeline(block: SlurmBlock):
+    """
+    Parses the PDBs, builds the dictionaries and designs the sequences in a
+    single ProteinMPNN engine run.
+    """
+    from Config.config import cache_dir, cache_size
+
+    out_folder_value = "mpnn_output"
+
+    block.extraData["out_folder_value"] = out_folder_value
+    block.extraData["shard_folders"] = None
+    block.extraData["resumed_targets"] = None
+
+    # Every run starts from scratch, there is no parsed JSONL to resume from
+    if os.path.exists(out_folder_value):
+        shutil.rmtree(out_folder_value)
+
+    design_ids = {v.id for v in DESIGN_VARIABLES}
+    params = {
+        k: v for k, v in block.variables.items() if v is not None and k in design_ids
+    }
+    params["pipeline"] = build_spec(block)
+    params["out_folder"] = out_folder_value
+
+    directory = block.config[cache_dir.id]
+    params["plugin_cache_dir"] = os.path.expanduser(directory) if directory else ""
+    params["plugin_cache_size"] = block.config[cache_size.id]
+
+    from utils import execute_in_environment, execute_in_worker
+
+    started_at = time.time()
+
+    out = execute_in_worker(block, params)
+
+    if out is None:
+        script = protein_mpnn.engine_command(
+            block, params, os.path.abspath("mpnn_pipeline_params.json")
+        )
+        execute_in_environment(block, script)
+    else:
+        print(out)
+
+    protein_mpnn.collect_engine_metrics(block, out_folder_value, started_at)
+
+
+protein_mpnn_pipeline_block = SlurmBlock(
+    id="ProteinMPNNPipeline",
+    name="ProteinMPNN Pipeline",
+    description="Parses the PDBs, assigns the designed chains, builds the fixed and tied positions, bias and PSSM dictionaries and runs ProteinMPNN in a single process, keeping the dictionaries in memory.",
+    inputGroups=[pdb_input, pdb_folder],
+    variables=PIPELINE_VARIABLES + DESIGN_VARIABLES,
+    initialAction=run_pipeline,
+    finalAction=protein_mpnn.parse_results,
+    outputs=[protein_mpnn.out_folder_variable, protein_mpnn.results_table_variable],
+)
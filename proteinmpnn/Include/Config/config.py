@@ -18,9 +18,84 @@ conda_run_config = PluginVariable(
     defaultValue="conda run -p",
 )
 
+direct_environment = PluginVariable(
+    id="config_plugin_direct_env",
+    name="Call the environment Python directly",
+    description="Resolve the Python interpreter and activation variables of the "
+    "conda environment once per session and run the commands with them, instead "
+    "of going through the conda run command every time. The output is streamed.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=True,
+)
+
+use_helper_scripts = PluginVariable(
+    id="config_plugin_use_helper_scripts",
+    name="Use ProteinMPNN helper scripts",
+    description="Parse the PDBs and build the chains, fixed/tied positions, bias and "
+    "PSSM dictionaries by running the ProteinMPNN helper scripts in the conda environment instead of "
+    "the built-in implementation.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
 conda_environment_config = PluginConfig(
     id="config_plugin_conda_env",
     name="Conda Environment",
     description="Configuration for the plugin's conda environment.",
-    variables=[conda_environment, conda_run_config],
+    variables=[
+        conda_environment,
+        conda_run_config,
+        direct_environment,
+        use_helper_scripts,
+    ],
+)
+
+use_worker = PluginVariable(
+    id="plugin_mpnn_worker",
+    name="Use warm ProteinMPNN worker",
+    description="Run the ProteinMPNN block through a long-lived worker that keeps "
+    "the models loaded between runs. If the worker cannot be reached, the block "
+    "falls back to a one-shot execution.",
+    type=VariableTypes.BOOLEAN,
+    defaultValue=False,
+)
+
+worker_socket = PluginVariable(
+    id="plugin_mpnn_worker_socket",
+    name="Worker socket",
+    description="Path of the Unix socket where the ProteinMPNN worker listens.",
+    type=VariableTypes.STRING,
+    defaultValue="~/.proteinmpnn_horus/worker.sock",
+)
+
+worker_config = PluginConfig(
+    id="config_plugin_mpnn_worker",
+    name="ProteinMPNN Worker",
+    description="Configuration for the warm ProteinMPNN worker.",
+    variables=[use_worker, worker_socket],
+)
+
+cache_dir = PluginVariable(
+    id="plugin_cache_dir",
+    name="Cache folder",
+    description="Folder where parsed structures and other intermediate results are "
+    "cached between flow runs.",
+    type=VariableTypes.STRING,
+    defaultValue="~/.proteinmpnn_horus/cache",
+)
+
+cache_size = PluginVariable(
+    id="plugin_cache_size",
+    name="Cache size (MB)",
+    description="Maximum size of the cache. The least recently used entries are "
+    "removed when it is exceeded.",
+    type=VariableTypes.INTEGER,
+    defaultValue=4096,
+)
+
+cache_config = PluginConfig(
+    id="config_plugin_cache",
+    name="Cache",
+    description="Configuration for the plugin's on-disk cache.",
+    variables=[cache_dir, cache_size],
 )
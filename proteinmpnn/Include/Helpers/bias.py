@@ -0,0 +1,205 @@
+"""
+Per-residue bias dictionaries (bias_by_res_jsonl) for ProteinMPNN.
+
+The bias of every chain is a L x 21 matrix over ALPHABET, added to the
+logits of each position. It can be given as:
+
+- a rule table (CSV/TSV) with chain, residue, aa and bias columns, e.g.
+  'A,52,W,2.0'. residue '*' applies to every position of the chain.
+- a matrix table (CSV/TSV) with chain and residue columns plus one column per
+  amino acid of ALPHABET.
+- an NPZ with one L x 21 array per chain, keyed '<chain>' (every structure)
+  or '<name>/<chain>' (one structure).
+
+An optional 'name' column restricts a row to one structure. Residue IDs are
+resolved through the PDB numbering of every record (Helpers/numbering.py).
+The rules are grouped per chain once and applied to each structure with
+vectorized NumPy updates.
+"""
+
+import csv
+import json
+
+from Helpers.dicts import chain_ids
+from Helpers.numbering import Numbering, residue_label
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWYX"
+AA_INDEX = {aa: i for i, aa in enumerate(ALPHABET)}
+
+
+def _read_table(path: str):
+    with open(path, "r", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=",\t")
+        reader = csv.DictReader(f, dialect=dialect)
+        fieldnames = [name.strip() for name in reader.fieldnames or []]
+        reader.fieldnames = fieldnames
+        return fieldnames, list(reader)
+
+
+class BiasRules:
+    """
+    The bias rules of a table, grouped by (structure name or None, chain).
+    """
+
+    def __init__(self):
+        # (name, chain) -> [residue labels], [aa indices], [values]
+        self.sparse = {}
+        # (name, chain) -> [residue labels], [21 value rows]
+        self.rows = {}
+        # (name, chain) -> 21 values added to every position
+        self.whole_chain = {}
+
+    @classmethod
+    def from_table(cls, path: str):
+        import numpy as np
+
+        fieldnames, rows = _read_table(path)
+        rules = cls()
+
+        missing = {"chain", "residue"} - set(fieldnames)
+        if missing:
+            raise Exception(f"{path} is missing the columns {sorted(missing)}")
+
+        matrix = all(aa in fieldnames for aa in ALPHABET[:20])
+        if not matrix and not {"aa", "bias"} <= set(fieldnames):
+            raise Exception(
+                f"{path} needs either 'aa' and 'bias' columns or one column "
+                f"per amino acid ({ALPHABET})"
+            )
+
+        for row in rows:
+            name = (row.get("name") or "").strip() or None
+            key = (name, row["chain"].strip())
+            residue = residue_label(row["residue"])
+
+            if matrix:
+                values = np.array(
+                    [float(row.get(aa) or 0) for aa in ALPHABET], dtype=np.float32
+                )
+                if residue == "*":
+                    rules._add_whole_chain(key, values)
+                else:
+                    labels, vectors = rules.rows.setdefault(key, ([], []))
+                    labels.append(residue)
+                    vectors.append(values)
+                continue
+
+            aa = row["aa"].strip().upper()
+            if aa not in AA_INDEX:
+                raise Exception(f"Unknown amino acid '{aa}' in {path}")
+            value = float(row["bias"])
+
+            if residue == "*":
+                values = np.zeros(len(ALPHABET), dtype=np.float32)
+                values[AA_INDEX[aa]] = value
+                rules._add_whole_chain(key, values)
+            else:
+                labels, aas, values = rules.sparse.setdefault(key, ([], [], []))
+                labels.append(residue)
+                aas.append(AA_INDEX[aa])
+                values.append(value)
+
+        return rules
+
+    def _add_whole_chain(self, key, values):
+        if key in self.whole_chain:
+            self.whole_chain[key] = self.whole_chain[key] + values
+        else:
+            self.whole_chain[key] = values
+
+    def apply(self, matrix, numbering: Numbering, name: str, chain: str):
+        """
+        Adds the rules of a chain of a structure to its L x 21 matrix.
+        """
+        import numpy as np
+
+        for key in ((None, chain), (name, chain)):
+            if key in self.whole_chain:
+                matrix += self.whole_chain[key]
+
+            if key in self.sparse:
+                labels, aas, values = self.sparse[key]
+                positions = np.array(numbering.positions(chain, labels)) - 1
+                np.add.at(matrix, (positions, np.array(aas)), np.array(values))
+
+            if key in self.rows:
+                labels, vectors = self.rows[key]
+                positions = np.array(numbering.positions(chain, labels)) - 1
+                np.add.at(matrix, positions, np.stack(vectors))
+
+
+def bias_by_res_entries(
+    records,
+    rules: BiasRules = None,
+    arrays_path: str = None,
+    chain_list: list = None,
+    decimals: int = 4,
+):
+    """
+    Yields (name, {chain: L x 21 bias}) for every structure. Every chain gets
+    a matrix, as tied_featurize reads one for each designed chain; the rules
+    and arrays only apply to the chains in chain_list when given, the other
+    chains stay at zero.
+    """
+    import numpy as np
+
+    arrays = np.load(arrays_path) if arrays_path else None
+    rules = rules or BiasRules()
+
+    for record in records:
+        name = record["name"]
+        numbering = Numbering(record)
+
+        bias = {}
+        for chain in chain_ids(record):
+            length = len(record[f"seq_chain_{chain}"])
+            matrix = np.zeros((length, len(ALPHABET)), dtype=np.float32)
+            if chain_list and chain not in chain_list:
+                bias[chain] = matrix.tolist()
+                continue
+
+            if arrays is not None:
+                for key in (chain, f"{name}/{chain}"):
+                    if key not in arrays.files:
+                        continue
+                    array = arrays[key]
+                    if array.shape != matrix.shape:
+                        raise Exception(
+                            f"Bias array {key} has shape {array.shape}, "
+                            f"expected {matrix.shape} for {name}"
+                        )
+                    matrix += array
+
+            rules.apply(matrix, numbering, name, chain)
+            bias[chain] = np.round(matrix.astype(np.float64), decimals).tolist()
+
+        yield name, bias
+
+
+def build_bias_by_res_dict(
+    records,
+    output_path: str,
+    rules: BiasRules = None,
+    arrays_path: str = None,
+    chain_list: list = None,
+    decimals: int = 4,
+) -> int:
+    """
+    Writes the bias_by_res dictionary of every structure to output_path,
+    streaming one structure at a time. Returns the number of structures.
+    """
+    structures = 0
+    with open(output_path, "w") as f:
+        f.write("{")
+        for name, bias in bias_by_res_entries(
+            records, rules, arrays_path, chain_list, decimals
+        ):
+            if structures:
+                f.write(",")
+            f.write(json.dumps(name) + ":" + json.dumps(bias, separators=(",", ":")))
+            structures += 1
+        f.write("}\n")
+
+    return structures
@@ -0,0 +1,141 @@
+"""
+Content-addressed on-disk cache shared by the plugin blocks.
+
+Entries are stored as <directory>/<namespace>/<key[:2]>/<key>. Reads refresh
+the entry modification time, so evicting the oldest files first gives an LRU
+policy. The size cap applies to the whole directory, across namespaces.
+Writes go through a temporary file and os.replace, which keeps the cache
+consistent when several processes fill it at once.
+"""
+
+import hashlib
+import os
+import tempfile
+
+
+# Bytes read at a time when hashing a file
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _update(h, parts):
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        h.update(part)
+        h.update(b"\0")
+
+
+def hash_key(*parts) -> str:
+    """
+    Returns the sha256 hex digest of the given bytes/str parts.
+    """
+    h = hashlib.sha256()
+    _update(h, parts)
+
+    return h.hexdigest()
+
+
+def hash_file(path: str, *parts) -> str:
+    """
+    Returns the cache key of a file contents plus extra parameters, the same
+    as hash_key(contents, *parts). The file is read in chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    h.update(b"\0")
+    _update(h, parts)
+
+    return h.hexdigest()
+
+
+class DiskCache:
+    """
+    A namespace of immutable entries inside a cache directory with a size cap
+    (in bytes).
+    """
+
+    def __init__(self, directory: str, namespace: str, max_bytes: int = None):
+        self.directory = os.path.expanduser(directory)
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(self.directory, namespace), exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, self.namespace, key[:2], key)
+
+    def get(self, key: str):
+        """
+        Returns the cached bytes, or None on a miss.
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used entries until the cache fits in
+        max_bytes. Returns the number of removed entries.
+        """
+        if not self.max_bytes:
+            return 0
+
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+
+        return removed
+
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
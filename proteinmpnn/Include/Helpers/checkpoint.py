@@ -0,0 +1,221 @@
+"""
+Checkpoint manifest for resumable ProteinMPNN runs.
+
+mpnn_output/checkpoint.json records the hash of the run parameters and, for
+every structure, the hash of its parsed record:
+
+    {"params_hash": ..., "completed": {name: hash}, "pending": {name: hash}}
+
+A rerun with the same parameters keeps the outputs of the completed
+structures and only runs the missing or incomplete ones, writing into the same
+seqs/, scores/ and probs/ folders. Changing the parameters (or any input
+dictionary) starts over; changing a single structure only reruns that one.
+"""
+
+import json
+import os
+import shutil
+import zipfile
+
+from Helpers.cache import hash_key
+from Helpers.jsonl import ParsedChains
+from Helpers.sweep import point_file_name, sweep_grid
+
+CHECKPOINT = "checkpoint.json"
+
+
+def record_hashes(jsonl_path: str) -> dict:
+    """
+    Returns {name: hash of the parsed record} for the parsed chains JSONL.
+    """
+    return {
+        name: hash_key(line) for name, line in ParsedChains(jsonl_path).lines()
+    }
+
+
+def load_checkpoint(out_folder: str) -> dict:
+    try:
+        with open(os.path.join(out_folder, CHECKPOINT), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(out_folder: str, checkpoint: dict):
+    path = os.path.join(out_folder, CHECKPOINT)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def mark_done(out_folder: str, name: str):
+    """
+    Moves a structure from pending to completed. Called by mpnn_engine after
+    every structure, so an interrupted run keeps its finished targets.
+    """
+    checkpoint = load_checkpoint(out_folder)
+    if name not in checkpoint.get("pending", {}):
+        return
+
+    checkpoint["completed"][name] = checkpoint["pending"].pop(name)
+    save_checkpoint(out_folder, checkpoint)
+
+
+def _fasta_count(path: str) -> int:
+    with open(path, "r") as f:
+        return sum(1 for line in f if line.startswith(">"))
+
+
+def output_files(name: str, params: dict) -> list:
+    """
+    Returns the output files a structure has once it is finished, relative to
+    the output folder, following protein_mpnn_run.py.
+    """
+    if params.get("score_only"):
+        fasta = params.get("path_to_fasta")
+        if fasta and os.path.isfile(fasta):
+            return [f"score_only/{name}_fasta_{_fasta_count(fasta)}.npz"]
+        return [f"score_only/{name}_pdb.npz"]
+
+    if params.get("conditional_probs_only"):
+        return [f"conditional_probs_only/{name}.npz"]
+
+    if params.get("unconditional_probs_only"):
+        return [f"unconditional_probs_only/{name}.npz"]
+
+    files = []
+    for point in sweep_grid(params):
+        file_name = point_file_name(name, point)
+        files.append(f"seqs/{file_name}.fa")
+        if params.get("save_score"):
+            files.append(f"scores/{file_name}.npz")
+        if params.get("save_probs"):
+            files.append(f"probs/{file_name}.npz")
+
+    return files
+
+
+def expected_sequences(params: dict) -> int:
+    """
+    Minimum number of FASTA records of a finished design: the native sequence
+    plus the samples of every temperature.
+    """
+    num_seq = int(params.get("num_seq_per_target") or 1)
+    batch_size = int(params.get("batch_size") or 1)
+    temperatures = str(params.get("sampling_temp") or "0.1").split()
+
+    return 1 + (num_seq // batch_size) * batch_size * len(temperatures)
+
+
+def _is_complete_file(path: str, params: dict) -> bool:
+    if not os.path.isfile(path):
+        return False
+
+    if path.endswith(".npz"):
+        # np.savez writes the zip central directory last
+        return zipfile.is_zipfile(path)
+
+    with open(path, "r") as f:
+        content = f.read()
+
+    records = content.count(">")
+    return (
+        content.endswith("\n")
+        and content.count("\n") == 2 * records
+        and records >= expected_sequences(params)
+    )
+
+
+def is_complete(out_folder: str, name: str, params: dict) -> bool:
+    return all(
+        _is_complete_file(os.path.join(out_folder, file), params)
+        for file in output_files(name, params)
+    )
+
+
+def remove_outputs(out_folder: str, name: str, params: dict):
+    """
+    Removes the outputs of a structure, the exact files output_files lists
+    for it, so the outputs of structures whose names share a prefix (e.g.
+    '1abc' and '1abc.v2') are kept.
+    """
+    for file in output_files(name, params):
+        path = os.path.join(out_folder, file)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def prepare_resume(out_folder: str, jsonl_path: str, params: dict, params_hash):
+    """
+    Brings the output folder in line with the checkpoint and returns the
+    names of the structures that still have to run. The outputs of structures
+    that changed, were left incomplete or are no longer in the input are
+    removed, so the results only hold finished targets of the current input.
+    """
+    checkpoint = load_checkpoint(out_folder)
+
+    if checkpoint.get("params_hash") != params_hash:
+        if os.path.exists(out_folder):
+            shutil.rmtree(out_folder)
+        checkpoint = {}
+
+    os.makedirs(out_folder, exist_ok=True)
+
+    completed = checkpoint.get("completed", {})
+    started = checkpoint.get("pending", {})
+    hashes = record_hashes(jsonl_path)
+
+    done, pending = {}, {}
+    for name, record_hash in hashes.items():
+        if completed.get(name) == record_hash and all(
+            os.path.isfile(os.path.join(out_folder, file))
+            for file in output_files(name, params)
+        ):
+            done[name] = record_hash
+        elif started.get(name) == record_hash and is_complete(
+            out_folder, name, params
+        ):
+            # Finished by a run that could not update the checkpoint
+            done[name] = record_hash
+        else:
+            remove_outputs(out_folder, name, params)
+            pending[name] = record_hash
+
+    for name in set(completed) | set(started):
+        if name not in hashes:
+            remove_outputs(out_folder, name, params)
+
+    save_checkpoint(
+        out_folder,
+        {"params_hash": params_hash, "completed": done, "pending": pending},
+    )
+
+    return list(pending)
+
+
+def write_pending_jsonl(jsonl_path: str, pending: list, output_path: str):
+    """
+    Writes the records of the pending structures, in input order.
+    """
+    structures = ParsedChains(jsonl_path)
+    pending = set(pending)
+    structures.subset([n for n in structures.names() if n in pending], output_path)
+
+
+def finish(out_folder: str, params: dict) -> list:
+    """
+    Marks the pending structures whose outputs are complete as done. Returns
+    the names of the ones that are still missing.
+    """
+    checkpoint = load_checkpoint(out_folder)
+    missing = []
+    for name in list(checkpoint.get("pending", {})):
+        if is_complete(out_folder, name, params):
+            checkpoint["completed"][name] = checkpoint["pending"].pop(name)
+        else:
+            missing.append(name)
+
+    save_checkpoint(out_folder, checkpoint)
+
+    return missing
@@ -0,0 +1,148 @@
+"""
+Native implementations of the ProteinMPNN helper scripts that build the
+input dictionaries (assign_fixed_chains.py, make_fixed_positions_dict.py,
+make_tied_positions_dict.py and make_bias_AA.py). The PSSM dictionary is built
+by Helpers/pssm.py.
+
+They run inside the plugin process and produce the same JSONL files as the
+upstream scripts, byte for byte.
+"""
+
+import json
+
+from Helpers.numbering import Numbering
+
+
+def read_jsonl(path: str):
+    """
+    Yields the records of a JSONL file one at a time.
+    """
+    with open(path, "r") as json_file:
+        for json_str in json_file:
+            yield json.loads(json_str)
+
+
+def write_dict(output_path: str, my_dict: dict):
+    """
+    Writes a dictionary the way the helper scripts do: a single JSON line.
+    """
+    with open(output_path, "w") as f:
+        f.write(json.dumps(my_dict) + "\n")
+
+
+def chain_ids(record: dict, prefix: str = "seq_chain"):
+    """
+    Returns the chain IDs of a parsed structure (['A', 'B', 'C', ...]).
+    """
+    return [item[-1:] for item in list(record) if item[: len(prefix)] == prefix]
+
+
+def assign_fixed_chains(records, chain_list: list):
+    """
+    Port of assign_fixed_chains.py. Maps each structure name to
+    (designed chains, fixed chains).
+    """
+    global_designed_chain_list = [str(item) for item in chain_list]
+
+    my_dict = {}
+    for result in records:
+        all_chain_list = chain_ids(result)
+        if len(global_designed_chain_list) > 0:
+            designed_chain_list = global_designed_chain_list
+        else:
+            designed_chain_list = ["A"]
+        fixed_chain_list = [
+            letter for letter in all_chain_list if letter not in designed_chain_list
+        ]
+        my_dict[result["name"]] = (designed_chain_list, fixed_chain_list)
+
+    return my_dict
+
+
+def make_fixed_positions_dict(
+    records, chain_list: list, position_list: list, specify_non_fixed: bool = False
+):
+    """
+    Port of make_fixed_positions_dict.py. position_list holds one list of
+    residue IDs per chain in chain_list, resolved through the PDB numbering of
+    each record (1-based positions when the record has none).
+    """
+    fixed_list = [list(one) for one in position_list]
+    global_designed_chain_list = [str(item) for item in chain_list]
+
+    my_dict = {}
+    for result in records:
+        numbering = Numbering(result)
+        all_chain_list = chain_ids(result)
+        fixed_position_dict = {}
+
+        if not specify_non_fixed:
+            for i, chain in enumerate(global_designed_chain_list):
+                fixed_position_dict[chain] = numbering.positions(chain, fixed_list[i])
+            for chain in all_chain_list:
+                if chain not in global_designed_chain_list:
+                    fixed_position_dict[chain] = []
+        else:
+            for chain in all_chain_list:
+                seq_length = len(result[f"seq_chain_{chain}"])
+                all_residue_list = list(range(1, seq_length + 1))
+                if chain not in global_designed_chain_list:
+                    fixed_position_dict[chain] = all_residue_list
+                else:
+                    idx = global_designed_chain_list.index(chain)
+                    fixed_position_dict[chain] = list(
+                        set(all_residue_list)
+                        - set(numbering.positions(chain, fixed_list[idx]))
+                    )
+
+        my_dict[result["name"]] = fixed_position_dict
+
+    return my_dict
+
+
+def make_tied_positions_dict(
+    records, chain_list: list, position_list: list, homooligomer: bool = False
+):
+    """
+    Port of make_tied_positions_dict.py. position_list holds one list of
+    residue IDs per chain in chain_list, all of the same length, resolved
+    through the PDB numbering of each record.
+    """
+    my_dict = {}
+
+    if not homooligomer:
+        tied_list = [list(one) for one in position_list] or [[]]
+        global_designed_chain_list = [str(item) for item in chain_list]
+
+        for result in records:
+            numbering = Numbering(result)
+            tied_positions_list = []
+            for i, pos in enumerate(tied_list[0]):
+                temp_dict = {}
+                for j, chain in enumerate(global_designed_chain_list):
+                    temp_dict[chain] = [numbering.position(chain, tied_list[j][i])]
+                tied_positions_list.append(temp_dict)
+            my_dict[result["name"]] = tied_positions_list
+    else:
+        for result in records:
+            all_chain_list = sorted(chain_ids(result))
+            tied_positions_list = []
+            chain_length = len(result[f"seq_chain_{all_chain_list[0]}"])
+            for i in range(1, chain_length + 1):
+                temp_dict = {}
+                for chain in all_chain_list:
+                    temp_dict[chain] = [i]
+                tied_positions_list.append(temp_dict)
+            my_dict[result["name"]] = tied_positions_list
+
+    return my_dict
+
+
+def make_bias_AA(AA_list: list, bias_list: list):
+    """
+    Port of make_bias_AA.py.
+    """
+    bias_list = [float(item) for item in bias_list]
+    AA_list = [str(item) for item in AA_list]
+
+    return dict(zip(AA_list, bias_list))
@@ -0,0 +1,174 @@
+"""
+Random access to parsed_pdbs.jsonl files.
+
+A sidecar index (<file>.idx) maps every structure name to the byte offset and
+length of its line, so a single structure can be read from a multi-GB file
+with one seek, and the whole file can be streamed without holding more than
+one record in memory. The index is rebuilt whenever the size or modification
+time of the JSONL file changes. Structure names must be unique: the outputs
+and every dictionary are keyed by name, so a duplicated name is an error.
+
+    structures = ParsedChains("parsed_pdbs.jsonl")
+    record = structures["1abc"]
+    for record in structures:
+        ...
+"""
+
+import json
+import os
+import re
+import tempfile
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+# parse_multiple_chains writes the name as a plain string value
+NAME_FIELD = re.compile(rb'"name":\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _record_name(line: bytes) -> str:
+    match = NAME_FIELD.search(line)
+    if match:
+        return json.loads(b'"' + match.group(1) + b'"')
+
+    return json.loads(line)["name"]
+
+
+class ParsedChains:
+    """
+    Offset-indexed reader of a parsed chains JSONL file.
+    """
+
+    def __init__(self, path: str, index_path: str = None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self._offsets = None
+
+    def _stamp(self):
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if index.get("version") != INDEX_VERSION or index.get("stamp") != (
+            self._stamp()
+        ):
+            return None
+
+        return {name: (offset, length) for name, offset, length in index["records"]}
+
+    def _build_index(self):
+        stamp = self._stamp()
+        records = []
+        lines = {}
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    name = _record_name(line)
+                    if name in lines:
+                        raise ValueError(
+                            f"Duplicated structure name '{name}' in {self.path} "
+                            f"(lines {lines[name]} and {line_number})"
+                        )
+                    lines[name] = line_number
+                    records.append([name, offset, len(line)])
+                offset += len(line)
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.index_path)), suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(
+                        {"version": INDEX_VERSION, "stamp": stamp, "records": records},
+                        f,
+                    )
+                os.replace(tmp_path, self.index_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError:
+            # Read-only location, keep the index in memory only
+            pass
+
+        return {name: (offset, length) for name, offset, length in records}
+
+    @property
+    def offsets(self) -> dict:
+        """
+        {name: (byte offset, byte length)} in file order.
+        """
+        if self._offsets is None:
+            self._offsets = self._load_index()
+            if self._offsets is None:
+                self._offsets = self._build_index()
+
+        return self._offsets
+
+    def names(self):
+        return list(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, name: str):
+        return name in self.offsets
+
+    def line(self, name: str) -> bytes:
+        """
+        Returns the raw JSON line of a structure, without the newline.
+        """
+        offset, length = self.offsets[name]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length).rstrip(b"\r\n")
+
+    def __getitem__(self, name: str) -> dict:
+        return json.loads(self.line(name))
+
+    def get(self, name: str, default=None):
+        if name not in self.offsets:
+            return default
+
+        return self[name]
+
+    def lines(self, names=None):
+        """
+        Yields (name, raw line) for the given names (all by default), reading
+        the file sequentially when possible.
+        """
+        if names is None:
+            with open(self.path, "rb") as f:
+                for name, (offset, length) in self.offsets.items():
+                    f.seek(offset)
+                    yield name, f.read(length).rstrip(b"\r\n")
+            return
+
+        with open(self.path, "rb") as f:
+            for name in names:
+                offset, length = self.offsets[name]
+                f.seek(offset)
+                yield name, f.read(length).rstrip(b"\r\n")
+
+    def __iter__(self):
+        """
+        Yields the records one at a time, in file order.
+        """
+        for _, line in self.lines():
+            yield json.loads(line)
+
+    def subset(self, names, output_path: str):
+        """
+        Writes the lines of the given structures to a new JSONL file.
+        """
+        with open(output_path, "wb") as out:
+            for _, line in self.lines(names):
+                out.write(line + b"\n")
@@ -0,0 +1,119 @@
+"""
+Per-stage timing and memory instrumentation for the plugin blocks.
+
+Every stage records its wall time, the CPU time of the plugin process and of
+its finished child processes, and their memory. ru_maxrss is the peak RSS over
+the whole life of the process, so a stage records how much it raised that peak
+(peak_rss_growth_mb, 0 when the stage stayed below an earlier peak) next to
+the lifetime peak at its end (process_peak_rss_mb). The metrics of a block run
+are kept in block.extraData["metrics"] and merged into a metrics.json file in
+the flow folder, keyed by block.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_FILE = "metrics.json"
+
+
+def _usage():
+    """
+    Returns (cpu seconds of this process, cpu seconds of the finished
+    children, peak RSS of this process in MB, peak RSS of the children in MB).
+    """
+    if resource is None:
+        return time.process_time(), 0.0, 0.0, 0.0
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+
+    return (
+        self_usage.ru_utime + self_usage.ru_stime,
+        children.ru_utime + children.ru_stime,
+        self_usage.ru_maxrss / scale,
+        children.ru_maxrss / scale,
+    )
+
+
+class Metrics:
+    """
+    Collects the stages of a block run.
+    """
+
+    def __init__(self, data: dict = None):
+        self.data = data if data is not None else {"stages": {}}
+
+    @contextmanager
+    def stage(self, name: str):
+        wall = time.perf_counter()
+        cpu, cpu_children, start_rss, start_rss_children = _usage()
+        try:
+            yield
+        finally:
+            end_cpu, end_cpu_children, rss, rss_children = _usage()
+            stage = self.data["stages"].setdefault(
+                name,
+                {
+                    "wall_s": 0.0,
+                    "cpu_s": 0.0,
+                    "children_cpu_s": 0.0,
+                    "peak_rss_growth_mb": 0.0,
+                    "children_peak_rss_growth_mb": 0.0,
+                },
+            )
+            stage["wall_s"] = round(stage["wall_s"] + time.perf_counter() - wall, 4)
+            stage["cpu_s"] = round(stage["cpu_s"] + end_cpu - cpu, 4)
+            stage["children_cpu_s"] = round(
+                stage["children_cpu_s"] + end_cpu_children - cpu_children, 4
+            )
+            stage["peak_rss_growth_mb"] = round(
+                stage["peak_rss_growth_mb"] + rss - start_rss, 1
+            )
+            stage["children_peak_rss_growth_mb"] = round(
+                stage["children_peak_rss_growth_mb"]
+                + rss_children
+                - start_rss_children,
+                1,
+            )
+            stage["process_peak_rss_mb"] = round(rss, 1)
+            stage["children_peak_rss_mb"] = round(rss_children, 1)
+
+    def add(self, **values):
+        """
+        Adds run level values, e.g. the number of sequences per second.
+        """
+        self.data.update(values)
+
+    def add_stages(self, stages: dict, prefix: str = ""):
+        """
+        Adds stages measured elsewhere (e.g. inside the conda environment).
+        """
+        for name, stage in stages.items():
+            self.data["stages"][prefix + name] = stage
+
+    def save(self, key: str, path: str = METRICS_FILE):
+        """
+        Merges the metrics of this block into the metrics file.
+        """
+        all_metrics = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    all_metrics = json.load(f)
+            except ValueError:
+                all_metrics = {}
+
+        all_metrics[key] = self.data
+
+        with open(path, "w") as f:
+            json.dump(all_metrics, f, indent=2)
@@ -0,0 +1,248 @@
+"""
+Mutations of parsed structures, applied in a single streaming pass.
+
+A mutation is (chain, residue ID, one letter amino acid). Residue IDs are
+resolved through the PDB numbering of each record (Helpers/numbering.py).
+Every structure is read once, its sequences are copied into mutable buffers
+and each variant is written as a new record, so the cost does not grow with
+the number of mutations per structure.
+
+A table of mutation sets produces one record per structure and variant:
+
+    variant,mutations
+    v1,A:45:W A:46:L
+    v2,A:45:TRP;B:12:A
+
+The variant records are named <structure>_<variant>.
+"""
+
+import csv
+import json
+
+from Helpers.numbering import Numbering, residue_label
+
+
+def to_one_letter(aa: str) -> str:
+    """
+    Returns the one letter code of a one or three letter amino acid name.
+    """
+    aa = aa.strip().upper()
+    if len(aa) == 1:
+        return aa
+
+    from Bio.Data.PDBData import protein_letters_3to1
+
+    if aa not in protein_letters_3to1:
+        raise Exception(f"Unknown amino acid '{aa}'")
+
+    return protein_letters_3to1[aa]
+
+
+def parse_mutations(value: str) -> list:
+    """
+    Parses 'A:45:W B:12A:ALA' (separated by spaces, ';' or '+') into
+    [(chain, residue ID, one letter amino acid), ...].
+    """
+    mutations = []
+    for item in value.replace(";", " ").replace("+", " ").split():
+        try:
+            chain, residue, aa = item.split(":")
+            mutations.append((chain, residue_label(residue), to_one_letter(aa)))
+        except ValueError:
+            raise Exception(f"Invalid mutation '{item}', expected chain:residue:AA")
+
+    return mutations
+
+
+def read_mutation_sets(path: str) -> list:
+    """
+    Reads a CSV/TSV table with 'variant' and 'mutations' columns. Returns
+    [(variant, mutations), ...] in table order.
+    """
+    with open(path, "r", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=",\t")
+        reader = csv.DictReader(f, dialect=dialect)
+
+        if not {"variant", "mutations"} <= set(reader.fieldnames or []):
+            raise Exception(
+                f"{path} must have 'variant' and 'mutations' columns, "
+                f"found {reader.fieldnames}"
+            )
+
+        return [
+            (row["variant"].strip(), parse_mutations(row["mutations"]))
+            for row in reader
+            if row["variant"] and row["variant"].strip()
+        ]
+
+
+def chain_offsets(record: dict) -> dict:
+    """
+    Returns the offset of every chain inside record['seq'], which holds the
+    chain sequences concatenated in record order.
+    """
+    offsets = {}
+    offset = 0
+    for key, value in record.items():
+        if key.startswith("seq_chain_"):
+            offsets[key[len("seq_chain_") :]] = offset
+            offset += len(value)
+
+    return offsets
+
+
+class MutableRecord:
+    """
+    Byte buffers of the sequences of a parsed structure. Mutations are written
+    in place and the strings are rebuilt only once, when the record is saved.
+    """
+
+    def __init__(self, record: dict):
+        self.record = record
+        self.numbering = Numbering(record)
+        self.offsets = chain_offsets(record)
+        self.seq = bytearray(record["seq"], "ascii")
+        self.chains = {
+            chain: bytearray(record[f"seq_chain_{chain}"], "ascii")
+            for chain in self.offsets
+        }
+
+    def copy(self):
+        other = MutableRecord.__new__(MutableRecord)
+        other.record = self.record
+        other.numbering = self.numbering
+        other.offsets = self.offsets
+        other.seq = bytearray(self.seq)
+        other.chains = {chain: bytearray(buf) for chain, buf in self.chains.items()}
+        return other
+
+    def mutate(self, chain: str, residue, aa: str):
+        """
+        Applies one mutation. Returns the replaced amino acid and the 1-based
+        position of the residue in the chain.
+        """
+        name = self.record["name"]
+        if chain not in self.chains:
+            raise Exception(f"Chain {chain} not found in {name}")
+
+        pos = self.numbering.position(chain, residue)
+        buffer = self.chains[chain]
+        if not 1 <= pos <= len(buffer):
+            raise Exception(
+                f"Position {pos} is outside chain {chain} of {name} "
+                f"(length {len(buffer)})"
+            )
+
+        original = chr(buffer[pos - 1])
+        code = ord(aa)
+        buffer[pos - 1] = code
+        self.seq[self.offsets[chain] + pos - 1] = code
+
+        return original, pos
+
+    def to_dict(self, name: str = None) -> dict:
+        record = dict(self.record)
+        record["seq"] = self.seq.decode("ascii")
+        for chain, buffer in self.chains.items():
+            record[f"seq_chain_{chain}"] = buffer.decode("ascii")
+        if name is not None:
+            record["name"] = name
+
+        return record
+
+
+def mutated_records(records, mutations: list, mutation_sets=None, written=None):
+    """
+    Applies the mutations to every record and yields the mutated records.
+    With mutation_sets, every record produces one record per variant, with
+    the common mutations plus the ones of the variant. written is filled with
+    {record name: [(variant name, applied mutations)]}, with the residues
+    resolved to 1-based positions.
+    """
+    if written is None:
+        written = {}
+    first = True
+
+    for record in records:
+        base = MutableRecord(record)
+        applied = []
+        log = []
+        for chain, residue, aa in mutations:
+            original, pos = base.mutate(chain, residue, aa)
+            applied.append((chain, pos, aa))
+            log.append(f"{original}{residue}{aa} in chain {chain}")
+
+        if first and log:
+            print(f"- Mutating {', '.join(log)} of {record['name']}")
+
+        if not mutation_sets:
+            written[record["name"]] = [(record["name"], applied)]
+            first = False
+            yield base.to_dict()
+            continue
+
+        variants = []
+        written[record["name"]] = variants
+        for variant, variant_mutations in mutation_sets:
+            mutable = base.copy()
+            variant_applied = list(applied)
+            variant_log = []
+            for chain, residue, aa in variant_mutations:
+                original, pos = mutable.mutate(chain, residue, aa)
+                variant_applied.append((chain, pos, aa))
+                variant_log.append(f"{original}{residue}{aa} in chain {chain}")
+
+            name = f"{record['name']}_{variant}"
+            if first:
+                print(f"- Variant {name}: {', '.join(variant_log)}")
+
+            variants.append((name, variant_applied))
+            yield mutable.to_dict(name)
+
+        first = False
+
+
+def mutate_structures(records, mutations: list, output_path: str, mutation_sets=None):
+    """
+    Writes the records mutated by mutated_records to output_path. Returns
+    {record name: [(variant name, applied mutations)]} for the written
+    records.
+    """
+    written = {}
+
+    with open(output_path, "w") as output_file:
+        for record in mutated_records(records, mutations, mutation_sets, written):
+            output_file.write(json.dumps(record) + "\n")
+
+    return written
+
+
+def add_mutated_positions(fixed_positions: dict, variants: dict) -> dict:
+    """
+    Adds the mutated positions of every variant to a fixed positions
+    dictionary, so ProteinMPNN keeps the mutations when designing.
+    """
+    for record_variants in variants.values():
+        for name, mutations in record_variants:
+            chains = fixed_positions.setdefault(name, {})
+            for chain, pos, _ in mutations:
+                positions = chains.setdefault(chain, [])
+                if pos not in positions:
+                    positions.append(pos)
+
+    return fixed_positions
+
+
+def fix_mutated_positions(fixed_positions_path: str, variants: dict):
+    """
+    Adds the mutated positions of every variant to a fixed positions JSONL.
+    """
+    with open(fixed_positions_path, "r") as f:
+        fixed_positions = json.loads(f.readline())
+
+    add_mutated_positions(fixed_positions, variants)
+
+    with open(fixed_positions_path, "w") as f:
+        f.write(json.dumps(fixed_positions) + "\n")
@@ -0,0 +1,121 @@
+"""
+PDB residue numbering of parsed structures.
+
+The native parser stores, for every chain, the PDB residue number and
+insertion code of each position of seq_chain_<X> as a comma separated string
+(empty for the gaps the parser fills with '-'):
+
+    "resnums_chain_A": "1,2,3,3A,3B,4,,,7"
+
+The position blocks resolve user residue IDs (52, "52" or "52A") through it
+to the 1-based positions ProteinMPNN expects. Records without the map (e.g.
+parsed with the upstream helper script) keep the old behaviour: residue IDs
+are taken as 1-based positions. The upstream helper scripts take one list of
+1-based positions for every structure, shared_positions resolves the residue
+IDs for them.
+"""
+
+RESNUM_PREFIX = "resnums_chain_"
+
+
+def residue_label(value) -> str:
+    """
+    Normalizes a residue ID: 52 -> "52", 52.0 -> "52", " 52A " -> "52A".
+    Insertion codes are case-sensitive in PDB files, "52a" stays as is.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+
+    return str(value).strip()
+
+
+def first_label(*values) -> str:
+    """
+    Returns the first residue ID given, normalized. Lets the position blocks
+    read the residue label variable, and the residue number variable of the
+    flows saved before labels existed.
+    """
+    for value in values:
+        if value is not None and str(value).strip():
+            return residue_label(value)
+
+    raise Exception("A fixed position has no residue ID")
+
+
+def encode_numbering(labels: list) -> str:
+    return ",".join(labels)
+
+
+class Numbering:
+    """
+    Residue ID to position lookup for one parsed structure. The per-chain
+    maps are built on first use.
+    """
+
+    def __init__(self, record: dict):
+        self.record = record
+        self.name = record.get("name")
+        self._maps = {}
+
+    def has_map(self, chain: str) -> bool:
+        return RESNUM_PREFIX + chain in self.record
+
+    def _map(self, chain: str) -> dict:
+        if chain not in self._maps:
+            labels = self.record[RESNUM_PREFIX + chain].split(",")
+            self._maps[chain] = {
+                label: i + 1 for i, label in enumerate(labels) if label
+            }
+
+        return self._maps[chain]
+
+    def position(self, chain: str, residue) -> int:
+        """
+        Returns the 1-based position of a residue ID in seq_chain_<chain>.
+        """
+        if not self.has_map(chain):
+            try:
+                return int(residue)
+            except ValueError:
+                raise Exception(
+                    f"Residue {residue} of chain {chain} in {self.name} needs the "
+                    "PDB numbering, parse the structures without the helper script"
+                )
+
+        label = residue_label(residue)
+        positions = self._map(chain)
+        if label not in positions:
+            raise Exception(
+                f"Residue {label} not found in chain {chain} of {self.name}"
+            )
+
+        return positions[label]
+
+    def positions(self, chain: str, residues) -> list:
+        return [self.position(chain, residue) for residue in residues]
+
+
+def shared_positions(records, chains: list, residues: list):
+    """
+    Resolves the residue IDs of every chain (residues[i] for chains[i]) to the
+    1-based positions the upstream helper scripts take, which are the same
+    for every structure. Returns the position lists, or None when a residue
+    is not found or sits at different positions in different structures.
+    """
+    shared = None
+    for record in records:
+        numbering = Numbering(record)
+        try:
+            positions = [
+                numbering.positions(chain, chain_residues)
+                for chain, chain_residues in zip(chains, residues)
+            ]
+        except Exception:
+            return None
+
+        if shared is None:
+            shared = positions
+        elif positions != shared:
+            return None
+
+    return shared
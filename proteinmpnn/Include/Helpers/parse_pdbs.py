@@ -0,0 +1,278 @@
+"""
+Native implementation of ProteinMPNN's parse_multiple_chains.py.
+
+Each PDB is read in a single pass (the upstream script re-reads the file once
+per possible chain letter) and the structures can be parsed by a pool of
+worker processes. Records are streamed to the JSONL as soon as they are ready,
+in file name order. Besides the upstream fields, every record holds the PDB
+residue numbering of its chains (resnums_chain_<X>). Parsed records can be
+kept in a DiskCache keyed by the file contents, the ca_only flag and
+PARSER_VERSION, so unchanged files are never parsed twice.
+"""
+
+import glob
+import json
+import multiprocessing
+import os
+import string
+import zlib
+
+from Helpers.cache import DiskCache, hash_file
+from Helpers.numbering import RESNUM_PREFIX, encode_numbering
+
+# Bump when the parsed records change, to invalidate the cached entries
+PARSER_VERSION = "2"
+
+ALPHA_1 = list("ARNDCQEGHILKMFPSTWYV-")
+ALPHA_3 = [
+    "ALA",
+    "ARG",
+    "ASN",
+    "ASP",
+    "CYS",
+    "GLN",
+    "GLU",
+    "GLY",
+    "HIS",
+    "ILE",
+    "LEU",
+    "LYS",
+    "MET",
+    "PHE",
+    "PRO",
+    "SER",
+    "THR",
+    "TRP",
+    "TYR",
+    "VAL",
+    "GAP",
+]
+AA_3_N = {a: n for n, a in enumerate(ALPHA_3)}
+
+CHAIN_ALPHABET = (
+    list(string.ascii_uppercase)
+    + list(string.ascii_lowercase)
+    + [str(item) for item in range(300)]
+)
+
+CHAIN_SET = set(CHAIN_ALPHABET)
+
+NAN_XYZ = [float("nan")] * 3
+
+
+def _read_chains(path: str):
+    """
+    Collects the atoms of every chain of a PDB file in a single pass.
+    """
+    chains = {}
+
+    with open(path, "rb") as pdb_file:
+        for line in pdb_file:
+            line = line.decode("utf-8", "ignore").rstrip()
+
+            if line[:6] == "HETATM" and line[17 : 17 + 3] == "MSE":
+                line = line.replace("HETATM", "ATOM  ")
+                line = line.replace("MSE", "MET")
+
+            if line[:4] != "ATOM":
+                continue
+
+            ch = line[21:22]
+            if ch not in CHAIN_SET:
+                continue
+
+            if ch not in chains:
+                chains[ch] = {"xyz": {}, "seq": {}, "min": 1e6, "max": -1e6}
+            chain = chains[ch]
+
+            atom = line[12 : 12 + 4].strip()
+            resi = line[17 : 17 + 3]
+            resn = line[22 : 22 + 5].strip()
+            x, y, z = [float(line[i : (i + 8)]) for i in [30, 38, 46]]
+
+            if resn[-1].isalpha():
+                resa, resn = resn[-1], int(resn[:-1]) - 1
+            else:
+                resa, resn = "", int(resn) - 1
+
+            if resn < chain["min"]:
+                chain["min"] = resn
+            if resn > chain["max"]:
+                chain["max"] = resn
+
+            xyz = chain["xyz"].setdefault(resn, {}).setdefault(resa, {})
+            chain["seq"].setdefault(resn, {}).setdefault(resa, resi)
+
+            if atom not in xyz:
+                xyz[atom] = [x, y, z]
+
+    return chains
+
+
+def _chain_arrays(chain: dict, atoms: list):
+    """
+    Fills in the gaps of a chain and returns (coordinates per atom, sequence,
+    residue labels), exactly as parse_PDB_biounits does. The label of each
+    position is the PDB residue number plus insertion code, empty for gaps.
+    """
+    seq_ = []
+    labels = []
+    xyz_ = {atom: [] for atom in atoms}
+
+    for resn in range(chain["min"], chain["max"] + 1):
+        if resn in chain["seq"]:
+            for k in sorted(chain["seq"][resn]):
+                seq_.append(AA_3_N.get(chain["seq"][resn][k], 20))
+                labels.append(f"{resn + 1}{k}")
+        else:
+            seq_.append(20)
+            labels.append("")
+
+        if resn in chain["xyz"]:
+            for k in sorted(chain["xyz"][resn]):
+                for atom in atoms:
+                    xyz_[atom].append(list(chain["xyz"][resn][k].get(atom, NAN_XYZ)))
+        else:
+            for atom in atoms:
+                xyz_[atom].append(list(NAN_XYZ))
+
+    return xyz_, "".join(ALPHA_1[n] for n in seq_), labels
+
+
+def parse_pdb(path: str, ca_only: bool = False):
+    """
+    Parses a single PDB into a parse_multiple_chains.py record, plus the
+    resnums_chain_<X> numbering of every chain (see Helpers/numbering.py).
+    """
+    atoms = ["CA"] if ca_only else ["N", "CA", "C", "O"]
+    chains = _read_chains(path)
+
+    my_dict = {}
+    s = 0
+    concat_seq = ""
+    for letter in CHAIN_ALPHABET:
+        if letter not in chains:
+            continue
+
+        xyz, seq, labels = _chain_arrays(chains[letter], atoms)
+        concat_seq += seq
+        my_dict["seq_chain_" + letter] = seq
+        coords_dict_chain = {}
+        if ca_only:
+            coords_dict_chain["CA_chain_" + letter] = [[c] for c in xyz["CA"]]
+        else:
+            for atom in atoms:
+                coords_dict_chain[f"{atom}_chain_" + letter] = xyz[atom]
+        my_dict["coords_chain_" + letter] = coords_dict_chain
+        my_dict[RESNUM_PREFIX + letter] = encode_numbering(labels)
+        s += 1
+
+    my_dict["name"] = os.path.basename(path)[:-4]
+    my_dict["num_of_chains"] = s
+    my_dict["seq"] = concat_seq
+
+    return my_dict
+
+
+def _parse_job(job):
+    path, ca_only, cache = job
+    try:
+        key = None
+        if cache is not None:
+            key = hash_file(path, str(bool(ca_only)), PARSER_VERSION)
+            data = cache.get(key)
+            if data is not None:
+                return path, zlib.decompress(data).decode(), None, True
+
+        record = json.dumps(parse_pdb(path, ca_only))
+
+        if cache is not None:
+            cache.put(key, zlib.compress(record.encode(), 1))
+
+        return path, record, None, False
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}", False
+
+
+def list_pdbs(input_path: str):
+    """
+    Returns the PDB files of a folder sorted by file name.
+    """
+    return sorted(glob.glob(os.path.join(input_path, "*.pdb")), key=os.path.basename)
+
+
+def new_summary() -> dict:
+    return {"parsed": 0, "failed": [], "cache_hits": 0, "cache_misses": 0}
+
+
+def parse_structures(
+    input_path: str,
+    ca_only: bool = False,
+    num_workers: int = 1,
+    cache: DiskCache = None,
+    summary: dict = None,
+):
+    """
+    Yields the parsed record of every PDB of a folder as JSON text, in file
+    name order. Malformed files are skipped. The parsed structures, the
+    skipped files as (path, error) and the cache hits and misses are counted
+    in summary.
+    """
+    jobs = [(path, ca_only, cache) for path in list_pdbs(input_path)]
+
+    if num_workers <= 0:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, max(len(jobs), 1))
+
+    if summary is None:
+        summary = new_summary()
+
+    if num_workers == 1:
+        results = map(_parse_job, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(num_workers)
+        chunksize = max(1, min(64, len(jobs) // (num_workers * 4)))
+        results = pool.imap(_parse_job, jobs, chunksize=chunksize)
+
+    try:
+        for path, record, error, hit in results:
+            if error is not None:
+                summary["failed"].append((path, error))
+                continue
+
+            if cache is not None:
+                summary["cache_hits" if hit else "cache_misses"] += 1
+
+            summary["parsed"] += 1
+            yield record
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def parse_multiple_chains(
+    input_path: str,
+    output_path: str,
+    ca_only: bool = False,
+    num_workers: int = 1,
+    cache: DiskCache = None,
+):
+    """
+    Parses every PDB of a folder into output_path. Malformed files are skipped.
+    Returns a summary with the number of parsed structures, the skipped files
+    as (path, error) and the cache hits and misses.
+    """
+    summary = new_summary()
+    with open(output_path, "w") as f:
+        for record in parse_structures(
+            input_path, ca_only, num_workers, cache, summary
+        ):
+            f.write(record + "\n")
+            f.flush()
+
+    if cache is not None:
+        summary["cache_evicted"] = cache.evict()
+
+    return summary
@@ -0,0 +1,279 @@
+"""
+In-memory input pipeline for mpnn_engine.
+
+Builds everything the ProteinMPNN helper blocks would write to JSONL files
+(parsed chains, assigned chains, fixed and tied positions, AA bias, per
+residue bias and PSSM) inside the engine process, and hands the records and
+dictionaries straight to the model. A flow of helper blocks then costs a
+single engine run instead of one process and one JSONL round trip per block.
+
+The pipeline is described by the 'pipeline' parameter of the run:
+
+    {
+        "pdb_path": "/abs/pdbs",
+        "designed_chains": ["A"],
+        "fixed_positions": {"A": ["52", "53A"]},
+        "mutations": [["A", "52", "W"]],
+        "tied_chains": ["A", "B"],
+        "tied_positions": [["10", "11"], ["10", "11"]],
+        "AA_list": ["W"],
+        "bias_list": [1.39],
+        "pssm_path": "/abs/pssms",
+        "dump_folder": "pipeline_inputs"
+    }
+
+Every step uses the same Helpers functions as its block, so the records and
+dictionaries are the ones the blocks would write. Parsed records go through
+the same JSON encoding as the JSONL. With dump_folder, the intermediate
+JSONLs are written there too, with the file names of the blocks.
+"""
+
+import json
+import os
+
+from Helpers.cache import DiskCache
+from Helpers.dicts import (
+    assign_fixed_chains,
+    make_bias_AA,
+    make_fixed_positions_dict,
+    make_tied_positions_dict,
+    write_dict,
+)
+
+# Same alphabet as StructureDataset in protein_mpnn_utils.py
+ALPHABET = set("ACDEFGHIKLMNPQRSTVWYX-")
+
+# Dictionary name -> file written by its block
+DUMP_FILES = {
+    "structures": "parsed_pdbs.jsonl",
+    "chain_id_dict": "assigned_chains.jsonl",
+    "fixed_positions_dict": "fixed_positions.jsonl",
+    "tied_positions_dict": "tied_positions.jsonl",
+    "bias_AA_dict": "bias_pdbs.jsonl",
+    "bias_by_res_dict": "bias_by_res.jsonl",
+    "pssm_dict": "pssm.jsonl",
+}
+
+
+def _cache(spec: dict, namespace: str, cache_dir: str, cache_size: int):
+    if not spec.get("use_cache") or not cache_dir:
+        return None
+
+    max_bytes = cache_size * 1024 * 1024 if cache_size else None
+
+    return DiskCache(cache_dir, namespace, max_bytes=max_bytes)
+
+
+def _parse(spec: dict, ca_only: bool, cache, verbose: bool) -> list:
+    from Helpers.parse_pdbs import new_summary, parse_structures
+
+    summary = new_summary()
+    records = [
+        json.loads(record)
+        for record in parse_structures(
+            spec["pdb_path"],
+            ca_only=ca_only,
+            num_workers=spec.get("parse_workers", 1),
+            cache=cache,
+            summary=summary,
+        )
+    ]
+
+    if verbose:
+        print(f"Parsed {summary['parsed']} structures")
+        for path, error in summary["failed"]:
+            print(f"- Skipped {os.path.basename(path)}: {error}")
+    if cache is not None:
+        evicted = cache.evict()
+        if verbose:
+            print(
+                f"Cache: {summary['cache_hits']} hits, "
+                f"{summary['cache_misses']} misses, {evicted} evicted"
+            )
+
+    return records
+
+
+def _pssm(spec: dict, records: list, cache, verbose: bool) -> dict:
+    from Helpers.pssm import check_failed, new_summary, pssm_entries
+
+    summary = new_summary()
+    pssm_dict = {
+        name: json.loads(data)
+        for name, data in pssm_entries(
+            records,
+            spec["pssm_path"],
+            num_workers=spec.get("pssm_workers", 1),
+            cache=cache,
+            summary=summary,
+        )
+    }
+
+    check_failed(summary)
+    if cache is not None:
+        cache.evict()
+    if verbose:
+        print(f"Loaded the PSSMs of {summary['structures']} structures")
+
+    return pssm_dict
+
+
+def build_inputs(
+    spec: dict,
+    ca_only: bool = False,
+    cache_dir: str = "",
+    cache_size: int = 0,
+    verbose: bool = True,
+):
+    """
+    Runs the pipeline described by spec. Returns (records, dictionaries), with
+    the dictionaries keyed like the inputs of mpnn_engine (None when the
+    pipeline does not build them).
+    """
+    dicts = {
+        "chain_id_dict": None,
+        "fixed_positions_dict": None,
+        "pssm_dict": None,
+        "omit_AA_dict": None,
+        "bias_AA_dict": None,
+        "tied_positions_dict": None,
+        "bias_by_res_dict": None,
+    }
+
+    parsed = _parse(
+        spec, ca_only, _cache(spec, "parsed_pdbs", cache_dir, cache_size), verbose
+    )
+    records = parsed
+
+    # Mutated records replace the parsed ones, every variant is a new record
+    mutations = [tuple(m) for m in spec.get("mutations") or []]
+    mutation_sets = None
+    if spec.get("mutation_sets"):
+        from Helpers.mutations import read_mutation_sets
+
+        mutation_sets = read_mutation_sets(spec["mutation_sets"])
+        if verbose:
+            print(f"- {len(mutation_sets)} mutation sets read")
+    variants = {}
+    if mutations or mutation_sets:
+        from Helpers.mutations import mutated_records
+
+        records = list(mutated_records(parsed, mutations, mutation_sets, variants))
+        if verbose:
+            print(f"- {len(records)} mutated records for {len(parsed)} structures")
+
+    designed_chains = list(spec.get("designed_chains") or [])
+    if designed_chains:
+        dicts["chain_id_dict"] = assign_fixed_chains(records, designed_chains)
+
+    fixed_positions = spec.get("fixed_positions") or {}
+    if fixed_positions or mutation_sets:
+        dicts["fixed_positions_dict"] = make_fixed_positions_dict(
+            records,
+            list(fixed_positions),
+            list(fixed_positions.values()),
+            specify_non_fixed=bool(spec.get("specify_non_fixed")),
+        )
+        if mutation_sets:
+            from Helpers.mutations import add_mutated_positions
+
+            add_mutated_positions(dicts["fixed_positions_dict"], variants)
+
+    tied_chains = list(spec.get("tied_chains") or [])
+    if spec.get("detect_symmetry"):
+        from Helpers.symmetry import make_symmetric_tied_positions_dict
+
+        dicts["tied_positions_dict"] = make_symmetric_tied_positions_dict(
+            records,
+            tied_chains,
+            min_identity=spec.get("symmetry_identity") or 0.9,
+            chain_id_dict=dicts["chain_id_dict"],
+        )
+    elif spec.get("tied_positions") or spec.get("homooligomer"):
+        dicts["tied_positions_dict"] = make_tied_positions_dict(
+            records,
+            tied_chains,
+            spec.get("tied_positions") or [],
+            homooligomer=bool(spec.get("homooligomer")),
+        )
+
+    if spec.get("AA_list"):
+        dicts["bias_AA_dict"] = make_bias_AA(spec["AA_list"], spec["bias_list"])
+
+    if spec.get("bias_table") or spec.get("bias_arrays"):
+        from Helpers.bias import BiasRules, bias_by_res_entries
+
+        rules = None
+        if spec.get("bias_table"):
+            rules = BiasRules.from_table(spec["bias_table"])
+        dicts["bias_by_res_dict"] = dict(
+            bias_by_res_entries(
+                records,
+                rules=rules,
+                arrays_path=spec.get("bias_arrays"),
+                chain_list=designed_chains,
+            )
+        )
+
+    if spec.get("pssm_path"):
+        # Mutations keep the chain lengths, so the variants share the PSSM
+        # of the structure they come from
+        pssm_dict = _pssm(
+            spec, parsed, _cache(spec, "pssm", cache_dir, cache_size), verbose
+        )
+        for name, record_variants in variants.items():
+            for variant, _ in record_variants:
+                if name in pssm_dict:
+                    pssm_dict[variant] = pssm_dict[name]
+        dicts["pssm_dict"] = pssm_dict
+
+    return records, dicts
+
+
+def filter_structures(records: list, max_length: int, verbose: bool = False) -> list:
+    """
+    Keeps the records StructureDataset would load: sequences in the alphabet
+    and not longer than max_length.
+    """
+    structures = []
+    discard_count = {"bad_chars": 0, "too_long": 0, "bad_seq_length": 0}
+
+    for record in records:
+        bad_chars = set(record["seq"]).difference(ALPHABET)
+        if bad_chars:
+            if verbose:
+                print(record["name"], bad_chars, record["seq"])
+            discard_count["bad_chars"] += 1
+        elif len(record["seq"]) > max_length:
+            discard_count["too_long"] += 1
+        else:
+            structures.append(record)
+
+    if verbose:
+        print("discarded", discard_count)
+
+    return structures
+
+
+def dump_inputs(records: list, dicts: dict, folder: str) -> dict:
+    """
+    Writes the records and the built dictionaries as the JSONLs of the
+    helper blocks. Returns {"structures" or dictionary name: path}.
+    """
+    os.makedirs(folder, exist_ok=True)
+
+    paths = {
+        name: os.path.abspath(os.path.join(folder, file_name))
+        for name, file_name in DUMP_FILES.items()
+        if name == "structures" or dicts.get(name) is not None
+    }
+
+    with open(paths["structures"], "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+    for name, path in paths.items():
+        if name != "structures":
+            write_dict(path, dicts[name])
+
+    return paths
@@ -0,0 +1,362 @@
+"""
+Parallel PSSM dictionary builder.
+
+The <name>.npz PSSMs are loaded by a pool of worker processes. Arrays stored
+uncompressed are memory-mapped instead of read. Two output formats are
+supported:
+
+- json: the pssm.jsonl of make_pssm_input_dict.py, byte for byte.
+- sidecar: the arrays of every structure are stored as float16 in a single
+  uncompressed NPZ (<output>.npz) and pssm.jsonl only holds a reference to it:
+
+      {"__pssm_sidecar__": "/abs/path/pssm.npz", "hash": "..."}
+
+  Only mpnn_engine can read this format; it memory-maps the sidecar once and
+  reads the arrays of each structure when it is designed. The ProteinMPNN
+  block switches to the engine when it gets a sidecar.
+
+The processed PSSM of every input file is kept in a DiskCache keyed by the
+file contents, so repeated runs over the same family do not reload it.
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import zipfile
+
+from Helpers.cache import DiskCache, hash_file, hash_key
+from Helpers.dicts import chain_ids
+
+# Bump when the processed entries change, to invalidate the cached ones
+PSSM_VERSION = "1"
+
+SIDECAR_KEY = "__pssm_sidecar__"
+
+FIELDS = [("pssm_coef", "_coef"), ("pssm_bias", "_bias"), ("pssm_log_odds", "_odds")]
+
+
+def open_npz(path: str) -> dict:
+    """
+    Returns {array name: array} for a NPZ file. The file is memory-mapped
+    once and the members stored without compression are read-only views of
+    that mapping, at the data offset of their local header. The compressed
+    members are read.
+    """
+    import mmap
+
+    import numpy as np
+
+    arrays = {}
+    compressed = []
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        # A single mapping (and file descriptor) shared by every array
+        buffer = None
+        for info in zf.infolist():
+            key = info.filename[: -len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                compressed.append(key)
+                continue
+
+            # The data starts after the local file header
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject:
+                compressed.append(key)
+                continue
+
+            if buffer is None:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            count = int(np.prod(shape, dtype=np.int64))
+            array = np.frombuffer(buffer, dtype=dtype, count=count, offset=f.tell())
+            arrays[key] = array.reshape(shape, order="F" if fortran else "C")
+
+    if compressed:
+        with np.load(path) as npz:
+            for key in compressed:
+                arrays[key] = npz[key]
+
+    return arrays
+
+
+def _chain_pssm(arrays: dict, chains: list, dtype=None) -> dict:
+    pssm = {}
+    for chain in chains:
+        pssm[chain] = {}
+        for field, suffix in FIELDS:
+            array = arrays[chain + suffix]
+            pssm[chain][field] = array if dtype is None else array.astype(dtype)
+
+    return pssm
+
+
+def _serialize_arrays(pssm: dict) -> bytes:
+    import numpy as np
+
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        **{
+            f"{chain}{suffix}": pssm[chain][field]
+            for chain in pssm
+            for field, suffix in FIELDS
+        },
+    )
+    return buffer.getvalue()
+
+
+def _pssm_job(job):
+    """
+    Returns (name, data, error, cache hit). data is the JSON text of the
+    structure entry (json format) or a float16 NPZ (sidecar format).
+    """
+    name, chains, path, sidecar, cache = job
+    try:
+        key = None
+        if cache is not None:
+            key = hash_file(path, " ".join(chains), str(sidecar), PSSM_VERSION)
+            data = cache.get(key)
+            if data is not None:
+                return name, data, None, True
+
+        import numpy as np
+
+        arrays = open_npz(path)
+        if sidecar:
+            data = _serialize_arrays(_chain_pssm(arrays, chains, np.float16))
+        else:
+            pssm = _chain_pssm(arrays, chains)
+            for chain in pssm:
+                for field in pssm[chain]:
+                    pssm[chain][field] = np.asarray(pssm[chain][field]).tolist()
+            data = json.dumps(pssm).encode()
+
+        if cache is not None:
+            cache.put(key, data)
+
+        return name, data, None, False
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}", False
+
+
+def new_summary() -> dict:
+    return {"structures": 0, "failed": [], "cache_hits": 0, "cache_misses": 0}
+
+
+def check_failed(summary: dict):
+    """
+    Raises when the PSSM of any structure could not be loaded: with use_pssm,
+    protein_mpnn_run.py needs an entry for every structure it designs.
+    """
+    if summary["failed"]:
+        raise Exception(
+            "Could not load the PSSM of "
+            + ", ".join(f"{name} ({error})" for name, error in summary["failed"])
+        )
+
+
+def pssm_entries(
+    records,
+    pssm_input_path: str,
+    sidecar: bool = False,
+    num_workers: int = 1,
+    cache: DiskCache = None,
+    summary: dict = None,
+):
+    """
+    Yields (name, data) for every structure with a PSSM, where data is the
+    JSON text of its entry (or a float16 NPZ with sidecar). The structures,
+    the failed ones as (name, error) and the cache hits and misses are
+    counted in summary.
+    """
+    jobs = (
+        (
+            record["name"],
+            chain_ids(record, prefix="seq_chain_"),
+            os.path.join(pssm_input_path, record["name"] + ".npz"),
+            sidecar,
+            cache,
+        )
+        for record in records
+    )
+
+    if num_workers <= 0:
+        num_workers = os.cpu_count() or 1
+
+    if summary is None:
+        summary = new_summary()
+
+    if num_workers == 1:
+        results = map(_pssm_job, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(num_workers)
+        results = pool.imap(_pssm_job, jobs, chunksize=4)
+
+    try:
+        for name, data, error, hit in results:
+            if error is not None:
+                summary["failed"].append((name, error))
+                continue
+
+            if cache is not None:
+                summary["cache_hits" if hit else "cache_misses"] += 1
+
+            summary["structures"] += 1
+            yield name, data
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def build_pssm_dict(
+    records,
+    pssm_input_path: str,
+    output_path: str,
+    sidecar: bool = False,
+    num_workers: int = 1,
+    cache: DiskCache = None,
+):
+    """
+    Writes the PSSM dictionary of every structure to output_path. Returns a
+    summary with the number of structures and the cache hits and misses.
+    Raises, without leaving an output, when any PSSM could not be loaded.
+    """
+    summary = new_summary()
+    entries = pssm_entries(
+        records, pssm_input_path, sidecar, num_workers, cache, summary
+    )
+
+    sidecar_path = os.path.abspath(os.path.splitext(output_path)[0] + ".npz")
+    keys = []
+
+    if sidecar:
+        out = zipfile.ZipFile(sidecar_path, "w", zipfile.ZIP_STORED)
+    else:
+        out = open(output_path, "wb")
+        out.write(b"{")
+
+    try:
+        for name, data in entries:
+            if sidecar:
+                # Copy the members of the structure NPZ under <name>/
+                with zipfile.ZipFile(io.BytesIO(data)) as entry:
+                    for info in entry.infolist():
+                        out.writestr(f"{name}/{info.filename}", entry.read(info))
+                keys.append(hash_key(name, data))
+            else:
+                if summary["structures"] > 1:
+                    out.write(b", ")
+                out.write(json.dumps(name).encode() + b": " + data)
+    finally:
+        entries.close()
+
+        if sidecar:
+            out.close()
+        else:
+            out.write(b"}\n")
+            out.close()
+
+    if summary["failed"]:
+        os.remove(sidecar_path if sidecar else output_path)
+        check_failed(summary)
+
+    if sidecar:
+        with open(output_path, "w") as f:
+            f.write(
+                json.dumps({SIDECAR_KEY: sidecar_path, "hash": hash_key(*keys)})
+                + "\n"
+            )
+
+    if cache is not None:
+        summary["cache_evicted"] = cache.evict()
+
+    return summary
+
+
+def read_sidecar_reference(path: str):
+    """
+    Returns the sidecar NPZ path referenced by a pssm.jsonl, or None if the
+    file is a regular PSSM dictionary.
+    """
+    if not path or not os.path.isfile(path):
+        return None
+
+    with open(path, "rb") as f:
+        head = f.read(len(SIDECAR_KEY) + 8)
+
+    if SIDECAR_KEY.encode() not in head:
+        return None
+
+    with open(path, "r") as f:
+        return json.loads(f.readline())[SIDECAR_KEY]
+
+
+class PssmSidecar:
+    """
+    Read-only PSSM dictionary backed by a sidecar NPZ, with the layout of the
+    dictionary protein_mpnn_run.py loads from JSON:
+
+        pssm[name][chain]["pssm_coef" | "pssm_bias" | "pssm_log_odds"]
+
+    The sidecar is memory-mapped once, when first accessed, and the arrays of
+    a structure are returned as float32.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._arrays = None
+        self._names = None
+        self._last = (None, None)
+
+    def _load(self):
+        if self._arrays is None:
+            self._arrays = open_npz(self.path)
+            self._names = {}
+            for key in self._arrays:
+                name, array = key.rsplit("/", 1)
+                self._names.setdefault(name, set()).add(array[: -len("_coef")])
+
+    def __len__(self):
+        self._load()
+        return len(self._names)
+
+    def __contains__(self, name):
+        self._load()
+        return name in self._names
+
+    def __iter__(self):
+        self._load()
+        return iter(self._names)
+
+    def keys(self):
+        return list(self)
+
+    def __getitem__(self, name: str) -> dict:
+        import numpy as np
+
+        # tied_featurize reads the same structure once per batch copy
+        if self._last[0] == name:
+            return self._last[1]
+
+        self._load()
+        pssm = {}
+        for chain in sorted(self._names[name]):
+            pssm[chain] = {
+                field: np.asarray(self._arrays[f"{name}/{chain}{suffix}"], np.float32)
+                for field, suffix in FIELDS
+            }
+
+        self._last = (name, pssm)
+
+        return pssm
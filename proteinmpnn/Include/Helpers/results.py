@@ -0,0 +1,311 @@
+"""
+Streaming readers/writers for the ProteinMPNN outputs.
+
+The FASTA files in mpnn_output/seqs are read one record at a time and written
+to the results CSV with a fixed schema, so memory stays flat regardless of the
+number of designed sequences.
+"""
+
+import csv
+import os
+import re
+
+# Header fields written by protein_mpnn_run.py, in CSV column order
+FIELDNAMES = [
+    "sequence",
+    "model",
+    "score",
+    "global_score",
+    "seq_recovery",
+    "sample",
+    "T",
+    "designed_chains",
+    "fixed_chains",
+    "git_hash",
+    "model_name",
+    "seed",
+    # Sweep grid point, only in the headers written by mpnn_engine sweeps
+    "use_soluble_model",
+    "backbone_noise",
+    # Constraint variant, only in the headers written by mpnn_engine variants
+    "variant",
+]
+
+HEADER_FIELD = re.compile(r"(\w+)=(\[[^\]]*\]|[^,]+)")
+
+# The CA-only models tag the native header with CA_model_name instead
+FIELD_ALIASES = {"CA_model_name": "model_name"}
+
+
+def iter_fasta_entries(file_path: str):
+    """
+    Yields one dictionary per sequence of a ProteinMPNN FASTA file. The first
+    record is the native sequence, which has no sample, T or seq_recovery.
+    """
+    model_name = os.path.basename(file_path).split(".")[0]
+
+    with open(file_path, "r") as f:
+        current_entry = None
+
+        for index, line in enumerate(f):
+            line = line.strip()
+            if line.startswith(">"):
+                if current_entry:
+                    yield current_entry
+
+                current_entry = {"model": model_name}
+
+                if index == 0:
+                    current_entry["sample"] = "-"
+                    current_entry["T"] = "-"
+                    current_entry["seq_recovery"] = "-"
+
+                for key, value in HEADER_FIELD.findall(line):
+                    current_entry[FIELD_ALIASES.get(key, key)] = value
+            elif current_entry is not None:
+                current_entry["sequence"] = line
+
+        if current_entry:
+            yield current_entry
+
+
+def list_fasta_files(seqs_folder: str):
+    """
+    Returns the .fa files of a folder sorted by name.
+    """
+    return [
+        os.path.join(seqs_folder, file)
+        for file in sorted(os.listdir(seqs_folder))
+        if file.endswith(".fa")
+    ]
+
+
+def iter_results(seqs_folder: str):
+    """
+    Yields every entry of every FASTA file in the folder.
+    """
+    for file_path in list_fasta_files(seqs_folder):
+        yield from iter_fasta_entries(file_path)
+
+
+def write_results_csv(output_file: str, entries) -> int:
+    """
+    Writes the entries to a CSV as they come. Returns the number of rows.
+    """
+    rows = 0
+    with open(output_file, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES, extrasaction="ignore")
+        writer.writeheader()
+        for entry in entries:
+            writer.writerow(entry)
+            rows += 1
+
+    return rows
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ColumnarResultsWriter:
+    """
+    Writes the results as typed columns to a compressed NPZ file. The rows
+    are buffered and written in row groups of row_group_size rows, one array
+    per column and group (<column>/<group>), so memory stays flat regardless
+    of the number of sequences. Columns:
+
+    - sequence: bytes
+    - model, model_name, use_soluble_model: int32 codes into
+      <column>_categories
+    - score, global_score, seq_recovery, T: float32 (NaN for the native entry)
+    - backbone_noise: float32 (NaN outside sweeps)
+    - variant: int32 codes into variant_categories ('' without variants)
+    - sample: int32 (0 for the native entry)
+    - native: bool
+
+    row_groups holds the first row of every group and the number of rows.
+    """
+
+    FLOAT_COLUMNS = ["score", "global_score", "seq_recovery", "T", "backbone_noise"]
+    CATEGORY_COLUMNS = ["model", "model_name", "use_soluble_model", "variant"]
+    ROW_GROUP_SIZE = 65536
+
+    def __init__(self, output_file: str, row_group_size: int = ROW_GROUP_SIZE):
+        import zipfile
+
+        self.output_file = output_file
+        self.row_group_size = row_group_size
+        self.categories = {c: {} for c in self.CATEGORY_COLUMNS}
+        self.row_groups = [0]
+        self.zip = zipfile.ZipFile(
+            output_file, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True
+        )
+        self._new_group()
+
+    def _new_group(self):
+        from array import array
+
+        self.sequences = []
+        self.codes = {c: array("i") for c in self.CATEGORY_COLUMNS}
+        self.floats = {c: array("f") for c in self.FLOAT_COLUMNS}
+        self.samples = array("i")
+        self.native = array("b")
+
+    def _write_array(self, name: str, array):
+        import numpy as np
+
+        with self.zip.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+    def _flush(self):
+        import numpy as np
+
+        group = len(self.row_groups) - 1
+        columns = {
+            "sequence": np.array(self.sequences, dtype=bytes),
+            "sample": np.frombuffer(self.samples, dtype=np.int32),
+            "native": np.frombuffer(self.native, dtype=np.int8).astype(bool),
+        }
+        for c in self.CATEGORY_COLUMNS:
+            columns[c] = np.frombuffer(self.codes[c], dtype=np.int32)
+        for c in self.FLOAT_COLUMNS:
+            columns[c] = np.frombuffer(self.floats[c], dtype=np.float32)
+
+        for c, array in columns.items():
+            self._write_array(f"{c}/{group}", array)
+
+        self.row_groups.append(self.row_groups[-1] + len(self.samples))
+        self._new_group()
+
+    def add(self, entry: dict):
+        self.sequences.append(entry.get("sequence", "").encode())
+        for c in self.CATEGORY_COLUMNS:
+            categories = self.categories[c]
+            value = entry.get(c, "")
+            self.codes[c].append(categories.setdefault(value, len(categories)))
+        for c in self.FLOAT_COLUMNS:
+            self.floats[c].append(_to_float(entry.get(c)))
+        self.samples.append(_to_int(entry.get("sample")))
+        self.native.append(entry.get("sample") == "-")
+
+        if len(self.samples) >= self.row_group_size:
+            self._flush()
+
+    def tee(self, entries):
+        """
+        Adds the entries while passing them through, to fill the columnar file
+        in the same pass as the CSV.
+        """
+        for entry in entries:
+            self.add(entry)
+            yield entry
+
+    def close(self):
+        import numpy as np
+
+        # An empty table still gets one (empty) row group
+        if self.samples or len(self.row_groups) == 1:
+            self._flush()
+        for c in self.CATEGORY_COLUMNS:
+            categories = np.array(list(self.categories[c]), dtype=str)
+            self._write_array(c + "_categories", categories)
+        self._write_array("row_groups", np.array(self.row_groups, dtype=np.int64))
+        self.zip.close()
+
+
+class ResultsTable:
+    """
+    Reader for the NPZ written by ColumnarResultsWriter. Columns are only
+    loaded when accessed, so filtering on the scores does not read the
+    sequences. A column is read one row group at a time, or whole with
+    table[column].
+
+        table = ResultsTable("protein_mpnn_results.npz")
+        rows = table.where(score=(None, 1.0), native=False)
+        best = table.select(rows, ["model", "score", "sequence"])
+    """
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        self._npz = np.load(path, allow_pickle=False)
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return list(
+            dict.fromkeys(
+                f.split("/")[0]
+                for f in self._npz.files
+                if "/" in f and not f.endswith("_categories")
+            )
+        )
+
+    @property
+    def row_groups(self) -> int:
+        return len(self._npz["row_groups"]) - 1
+
+    def __len__(self):
+        return int(self._npz["row_groups"][-1])
+
+    def row_group(self, name: str, group: int):
+        """
+        Returns the rows of a column in one row group.
+        """
+        values = self._npz[f"{name}/{group}"]
+        if name + "_categories" in self._npz.files:
+            values = self._npz[name + "_categories"][values]
+
+        return values
+
+    def __getitem__(self, name: str):
+        if name not in self._columns:
+            import numpy as np
+
+            self._columns[name] = np.concatenate(
+                [self.row_group(name, g) for g in range(self.row_groups)]
+            )
+
+        return self._columns[name]
+
+    def where(self, **conditions):
+        """
+        Returns a boolean mask of the rows matching every condition. A
+        condition is either a value or a (min, max) range where None leaves
+        that side open.
+        """
+        import numpy as np
+
+        mask = np.ones(len(self), dtype=bool)
+        for name, condition in conditions.items():
+            values = self[name]
+            if isinstance(condition, tuple):
+                low, high = condition
+                if low is not None:
+                    mask &= values >= low
+                if high is not None:
+                    mask &= values <= high
+            else:
+                mask &= values == condition
+
+        return mask
+
+    def select(self, rows=None, columns=None):
+        """
+        Returns a dictionary of the selected columns restricted to rows.
+        """
+        columns = columns or self.columns
+        if rows is None:
+            return {c: self[c] for c in columns}
+
+        return {c: self[c][rows] for c in columns}
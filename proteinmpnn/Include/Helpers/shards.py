@@ -0,0 +1,212 @@
+"""
+Sharding of ProteinMPNN runs for Slurm job arrays.
+
+The parsed chains JSONL is split into N shards and every dictionary keyed by
+structure name is sliced accordingly, so each array task only sees its own
+structures. Each shard lives in its own folder with a DONE marker written on
+success; reruns only resubmit the shards without it.
+"""
+
+import json
+import os
+import shlex
+import shutil
+
+from Helpers.cache import hash_file, hash_key
+from Helpers.jsonl import ParsedChains
+from Helpers.pssm import read_sidecar_reference
+
+# Inputs keyed by structure name: (input id, file name, merge all lines)
+SHARDED_INPUTS = [
+    ("chain_id_jsonl", "assigned_chains.jsonl", False),
+    ("fixed_positions_jsonl", "fixed_positions.jsonl", False),
+    ("omit_AA_jsonl", "omit_AA.jsonl", False),
+    ("pssm_jsonl", "pssm.jsonl", True),
+    ("tied_positions_jsonl", "tied_positions.jsonl", False),
+    ("bias_by_res_jsonl", "bias_by_res.jsonl", False),
+]
+
+# Folders of mpnn_output that hold one file per structure
+OUTPUT_FOLDERS = [
+    "seqs",
+    "scores",
+    "probs",
+    "score_only",
+    "conditional_probs_only",
+    "unconditional_probs_only",
+]
+
+MANIFEST = "manifest.json"
+DONE = "DONE"
+
+
+def read_dict(path: str, merge: bool = False):
+    """
+    Reads a JSONL dictionary like protein_mpnn_run.py: the last line wins
+    unless merge is set.
+    """
+    result = {}
+    with open(path, "r") as json_file:
+        for json_str in json_file:
+            if merge:
+                result.update(json.loads(json_str))
+            else:
+                result = json.loads(json_str)
+
+    return result
+
+
+def shard_name(index: int) -> str:
+    return f"shard_{index:03d}"
+
+
+def assign_shards(structures: ParsedChains, num_shards: int):
+    """
+    Returns the shard index of every structure of the parsed chains JSONL. The
+    structures are balanced by residue count: longest first, each one to the
+    shard with the fewest residues so far.
+    """
+    lengths = [len(record["seq"]) for record in structures]
+
+    totals = [0] * num_shards
+    assignment = [0] * len(lengths)
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        shard = totals.index(min(totals))
+        assignment[i] = shard
+        totals[shard] += lengths[i]
+
+    return assignment
+
+
+def parameters_hash(params: dict) -> str:
+    """
+    Hashes the run parameters and the contents of every input file.
+    """
+    parts = [json.dumps(params, sort_keys=True, default=str)]
+    for value in params.values():
+        if isinstance(value, str) and os.path.isfile(value):
+            parts.append(hash_file(value))
+
+    return hash_key(*parts)
+
+
+def prepare_shards(shards_folder: str, inputs: dict, num_shards: int, params_hash):
+    """
+    Writes the shard folders with their slice of the inputs. Existing shards
+    are kept when they were created for the same parameters, so finished
+    shards are not run again. Returns the list of shard folders.
+    """
+    manifest_path = os.path.join(shards_folder, MANIFEST)
+    manifest = {"params_hash": params_hash, "num_shards": num_shards}
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            if json.load(f) == manifest:
+                return [
+                    os.path.join(shards_folder, shard_name(i))
+                    for i in range(num_shards)
+                ]
+
+    if os.path.exists(shards_folder):
+        shutil.rmtree(shards_folder)
+
+    folders = [os.path.join(shards_folder, shard_name(i)) for i in range(num_shards)]
+    for folder in folders:
+        os.makedirs(folder)
+
+    # Split the structures
+    structures = ParsedChains(inputs["jsonl_path"])
+    assignment = assign_shards(structures, num_shards)
+    names = [[] for _ in range(num_shards)]
+    for index, name in zip(assignment, structures.names()):
+        names[index].append(name)
+
+    for folder, shard_names in zip(folders, names):
+        structures.subset(shard_names, os.path.join(folder, "parsed_pdbs.jsonl"))
+
+    # Slice the dictionaries keyed by structure name
+    for input_id, file_name, merge in SHARDED_INPUTS:
+        path = inputs.get(input_id)
+        if not path or not os.path.isfile(path):
+            continue
+
+        # A PSSM sidecar is keyed by name already, every shard shares it
+        if read_sidecar_reference(path):
+            for folder in folders:
+                shutil.copyfile(path, os.path.join(folder, file_name))
+            continue
+
+        full_dict = read_dict(path, merge=merge)
+        for folder, shard_names in zip(folders, names):
+            shard_dict = {n: full_dict[n] for n in shard_names if n in full_dict}
+            with open(os.path.join(folder, file_name), "w") as f:
+                f.write(json.dumps(shard_dict) + "\n")
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+    return folders
+
+
+def shard_inputs(folder: str, inputs: dict) -> dict:
+    """
+    Returns the inputs of a shard: the sliced files replace the originals and
+    the global ones (e.g. bias_AA_jsonl) are kept.
+    """
+    shard = dict(inputs)
+    shard["jsonl_path"] = os.path.join(folder, "parsed_pdbs.jsonl")
+    for input_id, file_name, _ in SHARDED_INPUTS:
+        if input_id in shard:
+            shard[input_id] = os.path.join(folder, file_name)
+
+    return shard
+
+
+def is_done(folder: str) -> bool:
+    return os.path.exists(os.path.join(folder, DONE))
+
+
+def array_script(folders: list, commands: list, job_name="proteinmpnn") -> str:
+    """
+    Returns an sbatch script that runs commands[i] in folders[i] for array
+    task i and marks the shard as done when it succeeds. The folders are
+    quoted (flow folders can contain spaces), the commands are used as is.
+    """
+    log_path = os.path.join(os.path.dirname(folders[0]), "slurm_%A_%a.out")
+    lines = [
+        "#!/bin/bash",
+        f"#SBATCH --job-name={shlex.quote(job_name)}",
+        f"#SBATCH --output={shlex.quote(log_path)}",
+        "",
+        "case $SLURM_ARRAY_TASK_ID in",
+    ]
+    for index, (folder, command) in enumerate(zip(folders, commands)):
+        lines.append(
+            f"    {index}) cd {shlex.quote(folder)} && rm -f {DONE} && {command}"
+            f" && touch {DONE} ;;"
+        )
+    lines += ["    *) exit 1 ;;", "esac", ""]
+
+    return "\n".join(lines)
+
+
+def merge_shards(folders: list, out_folder: str):
+    """
+    Copies the per-structure outputs of every finished shard into out_folder.
+    Returns the number of merged files.
+    """
+    merged = 0
+    for folder in folders:
+        shard_output = os.path.join(folder, "mpnn_output")
+        for sub in OUTPUT_FOLDERS:
+            source = os.path.join(shard_output, sub)
+            if not os.path.isdir(source):
+                continue
+
+            target = os.path.join(out_folder, sub)
+            os.makedirs(target, exist_ok=True)
+            for file in os.listdir(source):
+                shutil.copyfile(os.path.join(source, file), os.path.join(target, file))
+                merged += 1
+
+    return merged
@@ -0,0 +1,179 @@
+"""
+Model, backbone noise and constraint sweeps for mpnn_engine.
+
+A sweep runs every structure with each (model, backbone noise, constraint
+variant) grid point in the same process: the structure is featurized once
+per variant and the models stay loaded. Temperatures are swept by
+sampling_temp itself, which already takes a space separated list. The
+sequences of each grid point go to seqs/<name>.<tag>.fa and every FASTA
+header carries the grid point, so the results table gets model_name,
+use_soluble_model, backbone_noise and variant columns.
+
+Constraint variants are read from a JSONL file with one variant per line:
+
+    {"name": "core", "fixed_positions_jsonl": "fixed_core.jsonl"}
+    {"name": "no_cys", "omit_AAs": "CX", "bias_AA_jsonl": "bias.jsonl"}
+
+Only the dictionaries used by the decoder can change between variants, so
+the encoder output of a backbone can be shared by all of them. Relative
+paths are resolved against the folder of the variants file.
+"""
+
+import json
+import os
+import re
+
+SOLUBLE_PREFIX = "soluble:"
+
+# Run parameters a constraint variant may override
+VARIANT_KEYS = [
+    "fixed_positions_jsonl",
+    "bias_AA_jsonl",
+    "bias_by_res_jsonl",
+    "omit_AA_jsonl",
+    "tied_positions_jsonl",
+    "omit_AAs",
+]
+
+VARIANT_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def parse_models(value: str, soluble_default: bool = False) -> list:
+    """
+    Parses 'v_48_002 v_48_020 soluble:v_48_020' into
+    [(model_name, use_soluble_model), ...].
+    """
+    models = []
+    for item in str(value or "").replace(",", " ").split():
+        if item.startswith(SOLUBLE_PREFIX):
+            models.append((item[len(SOLUBLE_PREFIX) :], True))
+        else:
+            models.append((item, soluble_default))
+
+    return models
+
+
+def parse_floats(value: str) -> list:
+    return [float(item) for item in str(value or "").replace(",", " ").split()]
+
+
+def load_variants(path: str) -> list:
+    """
+    Reads a constraint variants file into [{"name": ..., <overrides>}, ...].
+    """
+    if not path:
+        return []
+
+    folder = os.path.dirname(os.path.abspath(path))
+    variants = []
+    names = set()
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            variant = json.loads(line)
+            name = str(variant.get("name", ""))
+            if not VARIANT_NAME.match(name):
+                raise ValueError(
+                    f"Invalid constraint variant name '{name}': "
+                    "use letters, digits, '_' and '-'"
+                )
+            if name in names:
+                raise ValueError(f"Duplicated constraint variant '{name}'")
+            unknown = set(variant) - set(VARIANT_KEYS) - {"name"}
+            if unknown:
+                raise ValueError(
+                    f"Constraint variant '{name}' sets {', '.join(sorted(unknown))}, "
+                    f"only {', '.join(VARIANT_KEYS)} can change between variants"
+                )
+
+            for key, value in variant.items():
+                if key.endswith("_jsonl") and value:
+                    variant[key] = os.path.join(folder, os.path.expanduser(value))
+            names.add(name)
+            variants.append(variant)
+
+    return variants
+
+
+def is_sweep(params: dict) -> bool:
+    return bool(params.get("sweep_models") or params.get("sweep_noise"))
+
+
+def sweep_grid(params: dict) -> list:
+    """
+    Returns the grid points as argument overrides. A run without sweep has a
+    single empty point. Constraint variants add a 'variant' key to every
+    (model, backbone noise) point.
+    """
+    variants = [v["name"] for v in load_variants(params.get("constraint_variants"))]
+    if variants:
+        points = sweep_grid({**params, "constraint_variants": None})
+        return [{**point, "variant": name} for point in points for name in variants]
+
+    if not is_sweep(params):
+        return [{}]
+
+    soluble = bool(params.get("use_soluble_model"))
+    models = parse_models(params.get("sweep_models"), soluble) or [
+        (params.get("model_name") or "v_48_020", soluble)
+    ]
+    noises = parse_floats(params.get("sweep_noise")) or [
+        float(params.get("backbone_noise") or 0.0)
+    ]
+
+    return [
+        {"model_name": model, "use_soluble_model": soluble, "backbone_noise": noise}
+        for model, soluble in models
+        for noise in noises
+    ]
+
+
+def point_tag(point: dict) -> str:
+    """
+    File name tag of a grid point, without dots so the structure name can
+    still be read from the file name: 'v_48_020-soluble-n0p02', 'core' or
+    'v_48_020-n0-core'.
+    """
+    if not point:
+        return ""
+
+    parts = []
+    if "model_name" in point:
+        soluble = "-soluble" if point["use_soluble_model"] else ""
+        noise = f"{point['backbone_noise']:g}".replace(".", "p").replace("-", "m")
+        parts.append(f"{point['model_name']}{soluble}-n{noise}")
+    if "variant" in point:
+        parts.append(point["variant"])
+
+    return "-".join(parts)
+
+
+def point_file_name(name: str, point: dict) -> str:
+    """
+    Base output file name of a structure for a grid point.
+    """
+    tag = point_tag(point)
+
+    return f"{name}.{tag}" if tag else name
+
+
+def point_header(point: dict) -> str:
+    """
+    Extra FASTA header fields of a grid point.
+    """
+    if not point:
+        return ""
+
+    header = ""
+    if "model_name" in point:
+        header += (
+            f", model_name={point['model_name']}"
+            f", use_soluble_model={point['use_soluble_model']}"
+            f", backbone_noise={point['backbone_noise']}"
+        )
+    if "variant" in point:
+        header += f", variant={point['variant']}"
+
+    return header
@@ -0,0 +1,297 @@
+"""
+Automatic tied positions for homo-oligomers and large assemblies.
+
+The chains of a structure are grouped by a hash of their sequence, so the
+identical copies of a subunit (e.g. the 60 chains of a capsid) are found
+without comparing them. The distinct sequences are then compared with a
+banded global alignment, and near-identical ones (missing loops, point
+mutations) are merged into the same equivalence class. Every class with more
+than one chain ties the aligned positions of its chains.
+
+The longest sequence left is the reference of the next class. Sequences that
+match it without gaps, or with a single gap, skip the alignment; the others
+are aligned to it all at once, one anti-diagonal of the band at a time.
+"""
+
+import hashlib
+
+import numpy as np
+
+from Helpers.dicts import chain_ids
+
+MATCH = 2
+MISMATCH = -1
+GAP = -2
+
+# Extra diagonals explored on top of the length difference
+BAND = 16
+
+def sequence_hash(seq: str) -> str:
+    return hashlib.sha1(seq.encode()).hexdigest()
+
+
+def _codes(seq: str):
+    return np.frombuffer(seq.encode(), dtype=np.uint8)
+
+
+def ungapped_alignment(a: str, b: str):
+    """
+    Best alignment of a and b without gaps, the shorter one sliding along the
+    longer one (terminal truncations). Returns the same as banded_alignment.
+    """
+    n, m = len(a), len(b)
+    A, B = _codes(a), _codes(b)
+
+    best, best_offset = -1, 0
+    # b[j] is aligned to a[j + offset]
+    for offset in range(min(0, n - m), max(0, n - m) + 1):
+        start, stop = max(0, -offset), min(m, n - offset)
+        overlap = A[start + offset : stop + offset] == B[start:stop]
+        identical = int(np.count_nonzero(overlap))
+        if identical > best:
+            best, best_offset = identical, offset
+
+    start, stop = max(0, -best_offset), min(m, n - best_offset)
+
+    return best, {j: j + best_offset for j in range(start, stop)}
+
+
+def single_gap_alignment(a: str, b: str):
+    """
+    Best alignment of a and b with the length difference as a single gap (a
+    missing loop) and no other. Returns the same as banded_alignment.
+    """
+    if len(a) < len(b):
+        identical, mapping = single_gap_alignment(b, a)
+        return identical, {j: i for i, j in mapping.items()}
+
+    m, gap = len(b), len(a) - len(b)
+    A, B = _codes(a), _codes(b)
+
+    # b[j] is aligned to a[j] before the gap and to a[j + gap] after it
+    before = np.concatenate([[0], np.cumsum(A[:m] == B)])
+    after = np.concatenate([[0], np.cumsum(A[gap:] == B)])
+    split = int(np.argmax(before + after[-1] - after))
+    identical = int(before[split] + after[-1] - after[split])
+
+    return identical, {j: j if j < split else j + gap for j in range(m)}
+
+
+def banded_alignment(a: str, b: str, band: int = BAND):
+    """
+    Global alignment of a and b restricted to a band around the diagonal.
+    Returns (number of identical aligned residues, {position in b: position
+    in a}) with 0-based positions.
+    """
+    return banded_alignments(a, [b], band)[0]
+
+
+def banded_alignments(a: str, sequences: list, band: int = BAND) -> list:
+    """
+    banded_alignment of every sequence to a, computed together.
+
+    The band is kept in a (sequence, row, diagonal) array, where the cells of
+    an anti-diagonal are evenly spaced, so every anti-diagonal of every
+    sequence is filled at once from strided views of the two previous ones.
+    The band of every sequence covers the largest length difference of the
+    batch.
+    """
+    if not sequences:
+        return []
+
+    n = len(a)
+    lengths = np.array([len(b) for b in sequences])
+    longest = int(lengths.max())
+    width = int(np.abs(lengths - n).max()) + band
+    columns = 2 * width + 3
+    step = columns - 2
+
+    # Cell (i, j) is stored at [i + 1, j - i + width + 1]; the padding and
+    # the cells outside the matrix stay at -inf
+    score = np.full((len(sequences), n + 2, columns), -np.inf, dtype=np.float32)
+    score[:, 1, width + 1] = 0
+    flat = score.reshape(len(sequences), -1)
+
+    # Diagonal move score of every cell in the same layout, and -inf past
+    # the last column of each sequence so no path goes through there
+    i = np.arange(-1, n + 1)[:, None]
+    j = i + np.arange(columns)[None, :] - width - 1
+    A = np.append(_codes(a), 0)
+    B = np.zeros((len(sequences), longest + 1), dtype=np.uint8)
+    for row, b in enumerate(sequences):
+        B[row, : len(b)] = _codes(b)
+    rows = np.where((i >= 1) & (i <= n), i - 1, n)
+    cols = np.clip(j - 1, 0, longest)
+    pair = np.where(A[rows] == B[:, cols], MATCH, MISMATCH).astype(np.float32)
+    pair = pair.reshape(len(sequences), -1)
+    blocked = np.where(j[None] > lengths[:, None, None], -np.inf, 0)
+    blocked = blocked.astype(np.float32).reshape(len(sequences), -1)
+
+    # Move into every cell: 0 diagonal, 1 up, 2 left, preferred in that order
+    moves = np.zeros(flat.shape, dtype=np.int8)
+
+    for k in range(1, n + longest + 1):
+        low = max(0, k - longest, (k - width + 1) // 2)
+        high = min(n, k, (k + width) // 2)
+        if low > high:
+            continue
+        # Flat index of the cell in row low, and of the one past row high
+        start = low * step + columns + k + width + 1
+        stop = high * step + columns + k + width + 2
+        cells = slice(start, stop, step)
+        diagonal = flat[:, start - columns : stop - columns : step] + pair[:, cells]
+        up = flat[:, start - columns + 1 : stop - columns + 1 : step] + GAP
+        left = flat[:, start - 1 : stop - 1 : step] + GAP
+
+        best = np.maximum(diagonal, up)
+        move = (up > diagonal).astype(np.int8)
+        move[left > best] = 2
+        np.maximum(best, left, out=best)
+        flat[:, cells] = best + blocked[:, cells]
+        moves[:, cells] = move
+
+    # Trace every sequence back from its last cell at once
+    batch = np.arange(len(sequences))
+    i = np.full(len(sequences), n)
+    j = lengths.copy()
+    reached = flat[batch, (i + 1) * columns + j - i + width + 1] > -np.inf
+    active = reached & ((i > 0) | (j > 0))
+    aligned = []
+    while active.any():
+        move = moves[batch, (i + 1) * columns + j - i + width + 1]
+        diagonal = active & (move == 0)
+        aligned.append((batch[diagonal], i[diagonal] - 1, j[diagonal] - 1))
+        i = i - (active & (move != 2))
+        j = j - (active & (move != 1))
+        active &= (i > 0) | (j > 0)
+
+    # Traced from the end, reversed so the mappings are in order
+    rows, a_pos, b_pos = (
+        np.concatenate(parts)[::-1] if aligned else np.zeros(0, dtype=int)
+        for parts in zip(*aligned or [((), (), ())])
+    )
+    same = A[a_pos] == B[rows, b_pos]
+
+    results = []
+    for row in range(len(sequences)):
+        if not reached[row]:
+            results.append((0, {}))
+            continue
+        in_row = rows == row
+        mapping = dict(zip(b_pos[in_row].tolist(), a_pos[in_row].tolist()))
+        results.append((int(np.count_nonzero(same[in_row])), mapping))
+
+    return results
+
+
+def equivalence_classes(sequences: dict, min_identity: float = 0.9):
+    """
+    Groups the chains {chain: sequence} into classes of (near) identical
+    sequences. Returns a list of (reference chain, {chain: {position in chain:
+    position in reference}}) with 0-based positions; identical copies map
+    every position onto itself.
+    """
+    # Identical copies: one hash per distinct sequence
+    groups = {}
+    for chain, seq in sequences.items():
+        groups.setdefault(sequence_hash(seq), []).append(chain)
+
+    # Every distinct sequence joins the class of the first (longest)
+    # reference it matches, or becomes a reference itself
+    remaining = sorted(groups.values(), key=lambda c: -len(sequences[c[0]]))
+    references = []
+    while remaining:
+        reference = remaining[0][0]
+        ref_seq = sequences[reference]
+        identity = {i: i for i in range(len(ref_seq))}
+        members = {chain: identity for chain in remaining[0]}
+        references.append((reference, members))
+
+        def needed(chains):
+            return min_identity * max(len(sequences[chains[0]]), len(ref_seq))
+
+        unmatched = []
+        candidates = []
+        for chains in remaining[1:]:
+            seq = sequences[chains[0]]
+            if min(len(seq), len(ref_seq)) < needed(chains):
+                unmatched.append(chains)
+                continue
+            for align in (ungapped_alignment, single_gap_alignment):
+                identical, mapping = align(ref_seq, seq)
+                if identical >= needed(chains):
+                    members.update((chain, mapping) for chain in chains)
+                    break
+            else:
+                candidates.append(chains)
+
+        aligned = banded_alignments(ref_seq, [sequences[c[0]] for c in candidates])
+        for chains, (identical, mapping) in zip(candidates, aligned):
+            if identical >= needed(chains):
+                members.update((chain, mapping) for chain in chains)
+            else:
+                unmatched.append(chains)
+
+        order = {id(chains): n for n, chains in enumerate(remaining)}
+        remaining = sorted(unmatched, key=lambda chains: order[id(chains)])
+
+    return references
+
+
+def tied_positions(
+    record: dict, chain_list=None, min_identity: float = 0.9, fixed_chains=()
+):
+    """
+    Returns the tied positions list of a parsed structure: one
+    {chain: [1-based position]} entry per reference position shared by at
+    least two chains of the same class. Only the chains in chain_list are
+    tied when given, and never the fixed chains.
+    """
+    chains = [
+        c
+        for c in chain_ids(record)
+        if (not chain_list or c in chain_list) and c not in fixed_chains
+    ]
+    sequences = {c: record[f"seq_chain_{c}"] for c in chains}
+
+    tied = []
+    for reference, members in equivalence_classes(sequences, min_identity):
+        if len(members) < 2:
+            continue
+
+        # Invert the mappings: reference position -> {chain: position}
+        columns = {}
+        for chain in sorted(members):
+            for pos, ref_pos in members[chain].items():
+                columns.setdefault(ref_pos, {})[chain] = [pos + 1]
+
+        for ref_pos in sorted(columns):
+            if len(columns[ref_pos]) > 1:
+                tied.append(columns[ref_pos])
+
+    return tied
+
+
+def make_symmetric_tied_positions_dict(
+    records,
+    chain_list: list = None,
+    min_identity: float = 0.9,
+    chain_id_dict: dict = None,
+):
+    """
+    Builds the tied positions dictionary of every structure automatically.
+    With the assigned chains dictionary, an empty chain_list ties the
+    designed chains, and the fixed chains are never tied, as tied_featurize
+    expects.
+    """
+    tied_dict = {}
+    for record in records:
+        chains, fixed_chains = chain_list, ()
+        if chain_id_dict and record["name"] in chain_id_dict:
+            designed_chains, fixed_chains = chain_id_dict[record["name"]]
+            chains = chain_list or designed_chains
+        tied_dict[record["name"]] = tied_positions(
+            record, chains, min_identity, fixed_chains
+        )
+
+    return tied_dict
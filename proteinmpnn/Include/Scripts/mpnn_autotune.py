@@ -0,0 +1,251 @@
+"""
+Calibration of batch_size and torch intra-op threads for mpnn_engine.
+
+A few sampling passes are timed on the actual target: first the thread count
+at a fixed batch size, then the batch size at the best thread count. Every
+pass is run once untimed to warm up, and only decodes DECODE_STEPS residues.
+The fastest setting that fits in the memory budget is cached per
+(node type, length bucket, model flavour) in a JSON file, so later runs on
+the same kind of node skip the calibration.
+"""
+
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from argparse import Namespace
+
+import numpy as np
+import torch
+
+import mpnn_engine
+
+TUNING_CACHE = os.path.expanduser("~/.proteinmpnn_horus/autotune.json")
+
+# Bump when the calibration changes, to calibrate the cached settings again
+TUNING_VERSION = "2"
+
+# Residues decoded by a timed sampling pass
+DECODE_STEPS = 32
+
+# Rough activation memory per residue and batch copy (bytes): k neighbours
+# x hidden features x float32 x layers and intermediate buffers.
+BYTES_PER_RESIDUE = 48 * 128 * 4 * 16
+
+
+def usable_cores() -> int:
+    """
+    Number of cores this process may run on, which is a slice of the node for
+    the parallel workers of Scripts/mpnn_parallel.py.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def node_type() -> str:
+    """
+    Identifies the kind of node: CPU model and usable core count.
+    """
+    model = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+
+    return f"{model} x{usable_cores()}"
+
+
+def length_bucket(length: int) -> int:
+    """
+    Rounds the length up to the next power of two (minimum 64).
+    """
+    bucket = 64
+    while bucket < length:
+        bucket *= 2
+
+    return bucket
+
+
+def batch_candidates(num_seq_per_target: int, length: int, memory_budget: int):
+    """
+    Batch sizes that divide num_seq_per_target and fit in the memory budget
+    (in MB, 0 for no limit).
+    """
+    candidates = []
+    for batch_size in [1, 2, 4, 8, 16, 32, 64]:
+        if batch_size > num_seq_per_target or num_seq_per_target % batch_size:
+            continue
+        if memory_budget and (
+            batch_size * length * BYTES_PER_RESIDUE > memory_budget * 1024 * 1024
+        ):
+            continue
+        candidates.append(batch_size)
+
+    return candidates or [1]
+
+
+def thread_candidates():
+    cores = usable_cores()
+    candidates = [1]
+    while candidates[-1] * 2 <= cores:
+        candidates.append(candidates[-1] * 2)
+    if candidates[-1] != cores:
+        candidates.append(cores)
+
+    return candidates
+
+
+def _probe_features(f: dict, steps: int) -> dict:
+    """
+    Masks every residue past the first steps ones. The sampling loop skips
+    the decoder for masked residues, so a pass only decodes steps of them.
+    """
+    mask = f["mask"].clone()
+    mask[:, steps:] = 0
+
+    return {**f, "mask": mask}
+
+
+def _time_sample(model, protein, args: Namespace, dicts: dict, device) -> float:
+    """
+    Returns the residues decoded per second by a sampling pass of
+    DECODE_STEPS decoding steps, after an untimed warm-up pass.
+    """
+    f = _probe_features(
+        mpnn_engine.featurize(protein, args, dicts, device), DECODE_STEPS
+    )
+    X, S, chain_M = f["X"], f["S"], f["chain_M"]
+    omit_AAs_np = np.zeros(len(mpnn_engine.ALPHABET), dtype=np.float32)
+    bias_AAs_np = np.zeros(len(mpnn_engine.ALPHABET))
+
+    def sample():
+        model.sample(
+            X,
+            torch.randn(chain_M.shape, device=X.device),
+            S,
+            chain_M,
+            f["chain_encoding_all"],
+            f["residue_idx"],
+            mask=f["mask"],
+            temperature=0.1,
+            omit_AAs_np=omit_AAs_np,
+            bias_AAs_np=bias_AAs_np,
+            chain_M_pos=f["chain_M_pos"],
+            omit_AA_mask=f["omit_AA_mask"],
+            pssm_coef=f["pssm_coef"],
+            pssm_bias=f["pssm_bias"],
+            bias_by_res=f["bias_by_res_all"],
+        )
+
+    sample()
+
+    t0 = time.perf_counter()
+    sample()
+    steps = min(DECODE_STEPS, X.shape[1])
+
+    return args.batch_size * steps / (time.perf_counter() - t0)
+
+
+def _load_cache(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path: str, cache: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def autotune(model, protein, args: Namespace, dicts: dict, device) -> Namespace:
+    """
+    Returns args with the tuned batch_size and sets the torch thread count,
+    which the caller restores once done.
+    """
+    length = len(protein["seq"])
+    key = "|".join(
+        [
+            node_type(),
+            str(length_bucket(length)),
+            args.model_name,
+            "ca" if args.ca_only else "full",
+            str(args.num_seq_per_target),
+            str(args.memory_budget),
+            TUNING_VERSION,
+        ]
+    )
+
+    cache_path = args.tuning_cache or TUNING_CACHE
+    cache = _load_cache(cache_path)
+
+    if key in cache:
+        tuned = cache[key]
+        source = "cached"
+    else:
+        # Calibration must not change the sampled sequences
+        rng_state = (torch.get_rng_state(), np.random.get_state(), random.getstate())
+
+        batches = batch_candidates(
+            args.num_seq_per_target, length_bucket(length), args.memory_budget
+        )
+        probe_batch = batches[min(2, len(batches) - 1)]
+        probe = Namespace(**{**vars(args), "batch_size": probe_batch})
+
+        best_threads, best_rate = 1, 0.0
+        for threads in thread_candidates():
+            torch.set_num_threads(threads)
+            rate = _time_sample(model, protein, probe, dicts, device)
+            if rate > best_rate:
+                best_threads, best_rate = threads, rate
+
+        torch.set_num_threads(best_threads)
+        best_batch = probe.batch_size
+        for batch_size in batches:
+            if batch_size == probe.batch_size:
+                continue
+            trial = Namespace(**{**vars(args), "batch_size": batch_size})
+            rate = _time_sample(model, protein, trial, dicts, device)
+            if rate > best_rate:
+                best_batch, best_rate = batch_size, rate
+
+        torch.set_rng_state(rng_state[0])
+        np.random.set_state(rng_state[1])
+        random.setstate(rng_state[2])
+
+        tuned = {
+            "batch_size": best_batch,
+            "threads": best_threads,
+            "residues_per_second": round(best_rate, 3),
+        }
+        # Keep the settings other processes saved in the meantime
+        _save_cache(cache_path, {**_load_cache(cache_path), key: tuned})
+        source = "calibrated"
+
+    torch.set_num_threads(tuned["threads"])
+
+    print(
+        f"Auto-tune ({source}, length bucket {length_bucket(length)}): "
+        f"batch_size={tuned['batch_size']}, threads={tuned['threads']}, "
+        f"{tuned['residues_per_second']} decoded residues/s"
+    )
+
+    return Namespace(**{**vars(args), "batch_size": tuned["batch_size"]})
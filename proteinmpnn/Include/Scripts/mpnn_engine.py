@@ -0,0 +1,1167 @@
+"""
+ProteinMPNN design/score engine.
+
+Follows protein_mpnn_run.py from the ProteinMPNN submodule step by step so
+the outputs are identical, but keeps the loaded models in memory so a single
+process can serve several jobs. Runs inside the plugin conda environment.
+"""
+
+import time
+
+STARTED_AT = time.time()
+
+import contextlib  # noqa: E402
+import copy  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import random  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+from argparse import Namespace  # noqa: E402
+
+SCRIPTS_DIR = os.path.dirname(os.path.realpath(__file__))
+INCLUDE_DIR = os.path.dirname(SCRIPTS_DIR)
+MPNN_DIR = os.path.join(INCLUDE_DIR, "ProteinMPNN")
+
+for path in (MPNN_DIR, INCLUDE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+from protein_mpnn_utils import (  # noqa: E402
+    _scores,
+    _S_to_seq,
+    tied_featurize,
+    parse_fasta,
+    StructureDataset,
+    ProteinMPNN,
+)
+
+from mpnn_features import EncoderCache, FeatureCache  # noqa: E402
+
+from Helpers.cache import hash_file  # noqa: E402
+from Helpers.checkpoint import mark_done  # noqa: E402
+from Helpers.metrics import Metrics  # noqa: E402
+from Helpers.pssm import PssmSidecar, read_sidecar_reference  # noqa: E402
+from Helpers.sweep import (  # noqa: E402
+    load_variants,
+    point_file_name,
+    point_header,
+    point_tag,
+    sweep_grid,
+)
+
+IMPORT_S = round(time.time() - STARTED_AT, 4)
+
+METRICS_FILE = "engine_metrics.json"
+
+HIDDEN_DIM = 128
+NUM_LAYERS = 3
+ALPHABET = "ACDEFGHIKLMNPQRSTVWYX"
+
+# Same defaults as the argparser of protein_mpnn_run.py
+RUN_DEFAULTS = {
+    "suppress_print": 0,
+    "ca_only": False,
+    "path_to_model_weights": "",
+    "model_name": "v_48_020",
+    "use_soluble_model": False,
+    "seed": 0,
+    "save_score": 0,
+    "save_probs": 0,
+    "score_only": 0,
+    "path_to_fasta": "",
+    "conditional_probs_only": 0,
+    "conditional_probs_only_backbone": 0,
+    "unconditional_probs_only": 0,
+    "backbone_noise": 0.00,
+    "num_seq_per_target": 1,
+    "batch_size": 1,
+    "max_length": 200000,
+    "sampling_temp": "0.1",
+    "out_folder": "mpnn_output",
+    "pdb_path": "",
+    "pdb_path_chains": "",
+    "jsonl_path": "",
+    "chain_id_jsonl": "",
+    "fixed_positions_jsonl": "",
+    "omit_AAs": list("X"),
+    "bias_AA_jsonl": "",
+    "bias_by_res_jsonl": "",
+    "omit_AA_jsonl": "",
+    "pssm_jsonl": "",
+    "pssm_multi": 0.0,
+    "pssm_threshold": 0.0,
+    "pssm_log_odds_flag": 0,
+    "pssm_bias_flag": 0,
+    "tied_positions_jsonl": "",
+}
+
+# Plugin extensions
+PLUGIN_DEFAULTS = {
+    "bucket_batch_sizes": "",
+    "auto_tune": False,
+    "memory_budget": 0,
+    "tuning_cache": "",
+    "checkpoint": False,
+    "sweep_models": "",
+    "sweep_noise": "",
+    "feature_cache": False,
+    "plugin_cache_dir": "",
+    "plugin_cache_size": 0,
+    "reuse_encoder": False,
+    "constraint_variants": "",
+    "num_workers": 1,
+    "threads_per_worker": 0,
+    "precision": "fp32",
+    "precision_tolerance": 0,
+    "backend": "eager",
+    "pipeline": {},
+}
+
+DEFAULTS = {**RUN_DEFAULTS, **PLUGIN_DEFAULTS}
+
+
+def make_args(params: dict) -> Namespace:
+    """
+    Builds the protein_mpnn_run.py arguments from the block parameters.
+    """
+    args = dict(DEFAULTS)
+
+    for k, v in params.items():
+        if v is None or k not in DEFAULTS:
+            continue
+
+        default = DEFAULTS[k]
+        if isinstance(default, bool):
+            v = bool(v)
+        elif isinstance(default, int):
+            v = int(v)
+        elif isinstance(default, float):
+            v = float(v)
+        elif isinstance(default, list):
+            v = list("".join(v)) if isinstance(v, list) else list(str(v))
+        elif isinstance(default, dict):
+            v = dict(v)
+        else:
+            v = str(v)
+
+        args[k] = v
+
+    return Namespace(**args)
+
+
+def model_folder(args: Namespace) -> str:
+    """
+    Returns the folder holding the weights for the requested model flavour.
+    """
+    if args.path_to_model_weights:
+        return args.path_to_model_weights
+
+    if args.ca_only:
+        if args.use_soluble_model:
+            raise ValueError("CA-SolubleMPNN is not available yet")
+        return os.path.join(MPNN_DIR, "ca_model_weights")
+
+    if args.use_soluble_model:
+        return os.path.join(MPNN_DIR, "soluble_model_weights")
+
+    return os.path.join(MPNN_DIR, "vanilla_model_weights")
+
+
+class ModelCache:
+    """
+    Keeps the loaded ProteinMPNN models keyed by
+    (model_name, ca_only, use_soluble_model, weights folder, precision,
+    backend).
+    """
+
+    def __init__(self, device=None):
+        self.device = device or torch.device(
+            "cuda:0" if torch.cuda.is_available() else "cpu"
+        )
+        self.models = {}
+        self.loads = 0
+
+    def key(self, args: Namespace):
+        return (
+            args.model_name,
+            bool(args.ca_only),
+            bool(args.use_soluble_model),
+            model_folder(args),
+            args.precision,
+            args.backend,
+        )
+
+    @staticmethod
+    def build(args: Namespace, k_neighbors: int):
+        """
+        Builds a ProteinMPNN model with randomly initialized weights.
+        """
+        return ProteinMPNN(
+            ca_only=args.ca_only,
+            num_letters=21,
+            node_features=HIDDEN_DIM,
+            edge_features=HIDDEN_DIM,
+            hidden_dim=HIDDEN_DIM,
+            num_encoder_layers=NUM_LAYERS,
+            num_decoder_layers=NUM_LAYERS,
+            augment_eps=args.backbone_noise,
+            k_neighbors=k_neighbors,
+        )
+
+    def load(self, args: Namespace):
+        """
+        Loads the float32 model from its checkpoint.
+        """
+        checkpoint_path = os.path.join(model_folder(args), f"{args.model_name}.pt")
+        checkpoint = torch.load(checkpoint_path, map_location=self.device)
+        model = self.build(args, checkpoint["num_edges"])
+        model.to(self.device)
+        model.load_state_dict(checkpoint["model_state_dict"])
+        model.eval()
+
+        meta = {
+            "num_edges": checkpoint["num_edges"],
+            "noise_level": checkpoint["noise_level"],
+        }
+
+        return model, meta
+
+    def get(self, args: Namespace, check_features=None):
+        """
+        Returns (model, checkpoint metadata), loading the weights only once.
+        Reduced precision models are converted by Scripts/mpnn_precision.py,
+        and checked on the structure check_features() returns, and
+        TorchScript ones by Scripts/mpnn_export.py.
+        """
+        key = self.key(args)
+
+        # A warm reduced precision model loaded without a structure to check
+        unchecked = (
+            key in self.models
+            and check_features is not None
+            and args.precision != "fp32"
+            and self.models[key][1]["drift"] is None
+        )
+
+        if key not in self.models or unchecked:
+            checkpoint_path = os.path.join(key[3], f"{args.model_name}.pt")
+            if args.precision == "fp32":
+                model, meta = self.load(args)
+            else:
+                from mpnn_precision import load_converted
+
+                model, meta = load_converted(
+                    checkpoint_path,
+                    args.precision,
+                    lambda: self.load(args),
+                    self.device,
+                    args.plugin_cache_dir,
+                    check_features,
+                    args.precision_tolerance,
+                )
+
+            if args.backend == "torchscript":
+                from mpnn_export import to_torchscript
+
+                model = to_torchscript(
+                    model,
+                    meta,
+                    checkpoint_path,
+                    args.precision,
+                    self.device,
+                    args.plugin_cache_dir,
+                )
+            elif args.backend != "eager":
+                raise ValueError(f"Unknown backend '{args.backend}'")
+
+            self.models[key] = (model, meta)
+            self.loads += 1
+
+        model, meta = self.models[key]
+        model.features.augment_eps = args.backbone_noise
+
+        return model, meta
+
+
+def load_jsonl_dict(path: str, merge: bool = False):
+    """
+    Loads a helper dictionary the same way protein_mpnn_run.py does: the last
+    line wins, unless merge is set (used for the PSSM dictionary).
+    """
+    if not path or not os.path.isfile(path):
+        return None
+
+    result = {} if merge else None
+    with open(path, "r") as json_file:
+        for json_str in json_file:
+            if merge:
+                result.update(json.loads(json_str))
+            else:
+                result = json.loads(json_str)
+
+    return result
+
+
+# Optional dictionaries of a run: name -> (argument, merge lines)
+INPUT_DICTS = {
+    "chain_id_dict": ("chain_id_jsonl", False),
+    "fixed_positions_dict": ("fixed_positions_jsonl", False),
+    "pssm_dict": ("pssm_jsonl", True),
+    "omit_AA_dict": ("omit_AA_jsonl", False),
+    "bias_AA_dict": ("bias_AA_jsonl", False),
+    "tied_positions_dict": ("tied_positions_jsonl", False),
+    "bias_by_res_dict": ("bias_by_res_jsonl", False),
+}
+
+
+def load_inputs(args: Namespace, arguments: list = None):
+    """
+    Loads every optional dictionary given to the run, or only those of the
+    given arguments. A PSSM sidecar reference (Helpers/pssm.py) is opened
+    lazily instead.
+    """
+    print_all = args.suppress_print == 0
+
+    dicts = {}
+    for name, (arg, merge) in INPUT_DICTS.items():
+        if arguments is not None and arg not in arguments:
+            continue
+
+        path = getattr(args, arg)
+        sidecar = read_sidecar_reference(path) if name == "pssm_dict" else None
+        if sidecar:
+            dicts[name] = PssmSidecar(sidecar)
+        else:
+            dicts[name] = load_jsonl_dict(path, merge=merge)
+        if dicts[name] is None and print_all:
+            print(40 * "-")
+            print(f"{arg} is NOT loaded")
+
+    return dicts
+
+
+def build_pipeline(args: Namespace, verbose: bool = False, dump: bool = True):
+    """
+    Runs the in-memory input pipeline of the run (Helpers/pipeline.py) and
+    returns (records, dictionaries). With dump, the intermediate JSONLs are
+    written when the pipeline has a dump folder.
+    """
+    from Helpers.pipeline import build_inputs, dump_inputs
+
+    records, dicts = build_inputs(
+        args.pipeline,
+        ca_only=args.ca_only,
+        cache_dir=args.plugin_cache_dir,
+        cache_size=args.plugin_cache_size,
+        verbose=verbose,
+    )
+    if dump and args.pipeline.get("dump_folder"):
+        dump_inputs(records, dicts, args.pipeline["dump_folder"])
+
+    return records, dicts
+
+
+def pipeline_files(args: Namespace) -> Namespace:
+    """
+    Runs the input pipeline once and returns the arguments of a run that
+    reads its records and dictionaries from JSONL files instead, for the
+    parallel workers.
+    """
+    from Helpers.pipeline import dump_inputs
+
+    records, dicts = build_pipeline(args, args.suppress_print == 0, dump=False)
+    folder = args.pipeline.get("dump_folder") or os.path.join(
+        args.out_folder, "pipeline_inputs"
+    )
+    paths = dump_inputs(records, dicts, folder)
+
+    overrides = {"pipeline": {}, "jsonl_path": paths.pop("structures")}
+    for name, path in paths.items():
+        overrides[INPUT_DICTS[name][0]] = path
+
+    return Namespace(**{**vars(args), **overrides})
+
+
+def load_structures(args: Namespace, verbose: bool = False):
+    """
+    Returns (dictionaries, structures) of a run, read from the JSONL files or
+    built by the input pipeline.
+    """
+    if args.pipeline:
+        from Helpers.pipeline import filter_structures
+
+        records, dicts = build_pipeline(args, verbose)
+
+        return dicts, filter_structures(records, args.max_length, verbose)
+
+    dicts = load_inputs(args)
+    dataset = StructureDataset(
+        args.jsonl_path,
+        truncate=None,
+        max_length=args.max_length,
+        verbose=verbose,
+    )
+
+    return dicts, dataset
+
+
+def load_variant_inputs(args: Namespace, dicts: dict) -> dict:
+    """
+    Returns {variant name: (argument overrides, dictionaries)} for the
+    constraint variants of the run, and the run itself under None. Only the
+    dictionaries a variant overrides are loaded again.
+    """
+    variants = {None: ({}, dicts)}
+
+    for variant in load_variants(args.constraint_variants):
+        parsed = make_args(variant)
+        overrides = {k: getattr(parsed, k) for k in variant if k != "name"}
+        variant_args = Namespace(**{**vars(args), **overrides})
+        variant_dicts = {**dicts, **load_inputs(variant_args, list(overrides))}
+        variants[variant["name"]] = (overrides, variant_dicts)
+
+    return variants
+
+
+def git_hash() -> str:
+    try:
+        return (
+            subprocess.check_output(
+                f"git --git-dir {MPNN_DIR}/.git rev-parse HEAD",
+                shell=True,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except subprocess.CalledProcessError:
+        return "unknown"
+
+
+def format_float(value) -> str:
+    return np.format_float_positional(np.float32(value), unique=False, precision=4)
+
+
+def reorder_chains(seq, masked_chain_length_list, masked_list):
+    """
+    Sorts the designed chains alphabetically and joins them with '/'.
+    """
+    start = 0
+    end = 0
+    list_of_AAs = []
+    for mask_l in masked_chain_length_list:
+        end += mask_l
+        list_of_AAs.append(seq[start:end])
+        start = end
+
+    order = np.argsort(masked_list)
+    seq = "".join(list(np.array(list_of_AAs)[order]))
+
+    l0 = 0
+    for mc_length in list(np.array(masked_chain_length_list)[order])[:-1]:
+        l0 += mc_length
+        seq = seq[:l0] + "/" + seq[l0:]
+        l0 += 1
+
+    return seq
+
+
+def parse_buckets(value: str):
+    """
+    Parses "min_length:batch_size" pairs, e.g. "0:8 300:4 800:1".
+    """
+    buckets = []
+    for item in value.replace(",", " ").split():
+        min_length, batch_size = item.split(":")
+        buckets.append((int(min_length), int(batch_size)))
+
+    return sorted(buckets)
+
+
+def bucket_batch_size(args: Namespace, length: int) -> int:
+    """
+    Returns the batch size of the length bucket of a structure. It is the
+    largest divisor of num_seq_per_target not above the bucket batch size,
+    so every target still gets the same number of sequences.
+    """
+    batch_size = args.batch_size
+    for min_length, bucket_size in parse_buckets(args.bucket_batch_sizes):
+        if length >= min_length:
+            batch_size = bucket_size
+
+    batch_size = max(1, min(batch_size, args.num_seq_per_target))
+    while args.num_seq_per_target % batch_size:
+        batch_size -= 1
+
+    return batch_size
+
+
+def schedule(proteins, args: Namespace):
+    """
+    Yields (protein, args) in dataset order, each structure with the batch
+    size of its length bucket. A batch only holds copies of one structure,
+    so the processing order does not change the padding and is kept as in
+    protein_mpnn_run.py.
+    """
+    for protein in proteins:
+        if args.bucket_batch_sizes:
+            batch_size = bucket_batch_size(args, len(protein["seq"]))
+            if batch_size != args.batch_size:
+                yield protein, Namespace(**{**vars(args), "batch_size": batch_size})
+                continue
+
+        yield protein, args
+
+
+@contextlib.contextmanager
+def keep_num_threads():
+    """
+    Restores the torch thread count on exit. Auto-tune sets it for the whole
+    process, which outlives the run in a warm worker.
+    """
+    num_threads = torch.get_num_threads()
+    try:
+        yield
+    finally:
+        torch.set_num_threads(num_threads)
+
+
+def seed_generators(seed: int):
+    torch.manual_seed(seed)
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def seed_everything(args: Namespace) -> int:
+    if args.seed:
+        seed = args.seed
+    else:
+        seed = int(np.random.randint(0, high=999, size=1, dtype=int)[0])
+
+    seed_generators(seed)
+
+    return seed
+
+
+def replay_model_init(args: Namespace, meta: dict, seed: int):
+    """
+    Puts the random generators where protein_mpnn_run.py has them when it
+    starts sampling. It builds its model right after seeding, and the weight
+    initialization draws from the generator. A warm model is not built
+    again, so a throwaway one is.
+    """
+    seed_generators(seed)
+    ModelCache.build(args, meta["num_edges"])
+
+
+def prepare_folders(args: Namespace) -> str:
+    base_folder = args.out_folder
+    if base_folder[-1] != "/":
+        base_folder = base_folder + "/"
+
+    folders = ["seqs"]
+    if args.save_score:
+        folders.append("scores")
+    if args.score_only:
+        folders.append("score_only")
+    if args.conditional_probs_only:
+        folders.append("conditional_probs_only")
+    if args.unconditional_probs_only:
+        folders.append("unconditional_probs_only")
+    if args.save_probs:
+        folders.append("probs")
+
+    for folder in folders:
+        os.makedirs(base_folder + folder, exist_ok=True)
+
+    return base_folder
+
+
+def featurize(protein, args: Namespace, dicts: dict, device):
+    """
+    Runs tied_featurize on batch_size copies of the protein.
+    """
+    batch_clones = [copy.deepcopy(protein) for _ in range(args.batch_size)]
+
+    features = tied_featurize(
+        batch_clones,
+        device,
+        dicts["chain_id_dict"],
+        dicts["fixed_positions_dict"],
+        dicts["omit_AA_dict"],
+        dicts["tied_positions_dict"],
+        dicts["pssm_dict"],
+        dicts["bias_by_res_dict"],
+        ca_only=args.ca_only,
+    )
+
+    names = [
+        "X",
+        "S",
+        "mask",
+        "lengths",
+        "chain_M",
+        "chain_encoding_all",
+        "chain_list_list",
+        "visible_list_list",
+        "masked_list_list",
+        "masked_chain_length_list_list",
+        "chain_M_pos",
+        "omit_AA_mask",
+        "residue_idx",
+        "dihedral_mask",
+        "tied_pos_list_of_lists_list",
+        "pssm_coef",
+        "pssm_bias",
+        "pssm_log_odds_all",
+        "bias_by_res_all",
+        "tied_beta",
+    ]
+
+    return dict(zip(names, features))
+
+
+def score_structure(model, protein, f: dict, args: Namespace, base_folder: str):
+    """
+    The --score_only branch of protein_mpnn_run.py.
+    """
+    print_all = args.suppress_print == 0
+    alphabet_dict = dict(zip(ALPHABET, range(21)))
+    num_batches = args.num_seq_per_target // args.batch_size
+    name_ = protein["name"]
+    X, S, mask = f["X"], f["S"], f["mask"]
+    chain_M, chain_M_pos = f["chain_M"], f["chain_M_pos"]
+
+    loop_c = 0
+    if args.path_to_fasta:
+        fasta_names, fasta_seqs = parse_fasta(args.path_to_fasta, omit=["/"])
+        loop_c = len(fasta_seqs)
+
+    for fc in range(1 + loop_c):
+        if fc == 0:
+            structure_sequence_score_file = (
+                base_folder + "/score_only/" + name_ + "_pdb"
+            )
+        else:
+            structure_sequence_score_file = (
+                base_folder + "/score_only/" + name_ + f"_fasta_{fc}"
+            )
+
+        native_score_list = []
+        global_native_score_list = []
+        if fc > 0:
+            input_seq_length = len(fasta_seqs[fc - 1])
+            S_input = torch.tensor(
+                [alphabet_dict[AA] for AA in fasta_seqs[fc - 1]], device=X.device
+            )[None, :].repeat(X.shape[0], 1)
+            S[:, :input_seq_length] = S_input
+
+        for j in range(num_batches):
+            randn_1 = torch.randn(chain_M.shape, device=X.device)
+            log_probs = model(
+                X,
+                S,
+                mask,
+                chain_M * chain_M_pos,
+                f["residue_idx"],
+                f["chain_encoding_all"],
+                randn_1,
+            )
+            mask_for_loss = mask * chain_M * chain_M_pos
+            native_score_list.append(
+                _scores(S, log_probs, mask_for_loss).cpu().data.numpy()
+            )
+            global_native_score_list.append(
+                _scores(S, log_probs, mask).cpu().data.numpy()
+            )
+
+        native_score = np.concatenate(native_score_list, 0)
+        global_native_score = np.concatenate(global_native_score_list, 0)
+        ns_sample_size = native_score.shape[0]
+        seq_str = _S_to_seq(S[0,], chain_M[0,])
+        np.savez(
+            structure_sequence_score_file,
+            score=native_score,
+            global_score=global_native_score,
+            S=S[0,].cpu().numpy(),
+            seq_str=seq_str,
+        )
+
+        if print_all:
+            source = "from PDB" if fc == 0 else f"from FASTA {fasta_names[fc - 1]}"
+            print(
+                f"Score for {name_} {source}, mean: {format_float(native_score.mean())}, "
+                f"std: {format_float(native_score.std())}, sample size: {ns_sample_size},  "
+                f"global score, mean: {format_float(global_native_score.mean())}, "
+                f"std: {format_float(global_native_score.std())}, sample size: {ns_sample_size}"
+            )
+
+
+def probs_structure(model, protein, f: dict, args: Namespace, base_folder: str):
+    """
+    The --conditional_probs_only and --unconditional_probs_only branches.
+    """
+    print_all = args.suppress_print == 0
+    num_batches = args.num_seq_per_target // args.batch_size
+    name_ = protein["name"]
+    X, S, mask = f["X"], f["S"], f["mask"]
+    chain_M, chain_M_pos = f["chain_M"], f["chain_M_pos"]
+
+    log_p_list = []
+    if args.conditional_probs_only:
+        if print_all:
+            print(f"Calculating conditional probabilities for {name_}")
+        out_file = base_folder + "/conditional_probs_only/" + name_
+        for j in range(num_batches):
+            randn_1 = torch.randn(chain_M.shape, device=X.device)
+            log_p = model.conditional_probs(
+                X,
+                S,
+                mask,
+                chain_M * chain_M_pos,
+                f["residue_idx"],
+                f["chain_encoding_all"],
+                randn_1,
+                args.conditional_probs_only_backbone,
+            )
+            log_p_list.append(log_p.cpu().numpy())
+    else:
+        if print_all:
+            print(f"Calculating sequence unconditional probabilities for {name_}")
+        out_file = base_folder + "/unconditional_probs_only/" + name_
+        for j in range(num_batches):
+            log_p = model.unconditional_probs(
+                X, mask, f["residue_idx"], f["chain_encoding_all"]
+            )
+            log_p_list.append(log_p.cpu().numpy())
+
+    mask_out = (chain_M * chain_M_pos * mask)[0,].cpu().numpy()
+    np.savez(
+        out_file,
+        log_p=np.concatenate(log_p_list, 0),
+        S=S[0,].cpu().numpy(),
+        mask=mask[0,].cpu().numpy(),
+        design_mask=mask_out,
+    )
+
+
+def design_structure(
+    model,
+    protein,
+    f: dict,
+    args: Namespace,
+    dicts: dict,
+    base_folder: str,
+    seed,
+    revision: str,
+    point: dict = None,
+):
+    """
+    The default branch of protein_mpnn_run.py: samples num_seq_per_target
+    sequences per temperature and writes them to seqs/<name>.fa. For a sweep
+    grid point the files are named after the point and every header carries
+    it. revision is the git_hash() of the run, written to the native header.
+    Returns the number of generated sequences.
+    """
+    print_all = args.suppress_print == 0
+    num_batches = args.num_seq_per_target // args.batch_size
+    batch_copies = args.batch_size
+    temperatures = [float(item) for item in args.sampling_temp.split()]
+    omit_AAs_np = np.array([AA in args.omit_AAs for AA in ALPHABET]).astype(
+        np.float32
+    )
+    bias_AAs_np = np.zeros(len(ALPHABET))
+    if dicts["bias_AA_dict"]:
+        for n, AA in enumerate(ALPHABET):
+            if AA in list(dicts["bias_AA_dict"].keys()):
+                bias_AAs_np[n] = dicts["bias_AA_dict"][AA]
+
+    name_ = protein["name"]
+    X, S, mask = f["X"], f["S"], f["mask"]
+    chain_M, chain_M_pos = f["chain_M"], f["chain_M_pos"]
+    residue_idx, chain_encoding_all = f["residue_idx"], f["chain_encoding_all"]
+    pssm_log_odds_mask = (f["pssm_log_odds_all"] > args.pssm_threshold).float()
+
+    score_list = []
+    global_score_list = []
+    all_probs_list = []
+    all_log_probs_list = []
+    S_sample_list = []
+
+    randn_1 = torch.randn(chain_M.shape, device=X.device)
+    log_probs = model(
+        X, S, mask, chain_M * chain_M_pos, residue_idx, chain_encoding_all, randn_1
+    )
+    mask_for_loss = mask * chain_M * chain_M_pos
+    native_score = _scores(S, log_probs, mask_for_loss).cpu().data.numpy()
+    global_native_score = _scores(S, log_probs, mask).cpu().data.numpy()
+
+    file_name = point_file_name(name_, point)
+    header_fields = point_header(point)
+    ali_file = base_folder + "/seqs/" + file_name + ".fa"
+    score_file = base_folder + "/scores/" + file_name + ".npz"
+    probs_file = base_folder + "/probs/" + file_name + ".npz"
+
+    if print_all:
+        print(f"Generating sequences for: {name_}")
+
+    t0 = time.time()
+    with open(ali_file, "w") as fa:
+        for temp in temperatures:
+            for j in range(num_batches):
+                randn_2 = torch.randn(chain_M.shape, device=X.device)
+                sample_kwargs = dict(
+                    mask=mask,
+                    temperature=temp,
+                    omit_AAs_np=omit_AAs_np,
+                    bias_AAs_np=bias_AAs_np,
+                    chain_M_pos=chain_M_pos,
+                    omit_AA_mask=f["omit_AA_mask"],
+                    pssm_coef=f["pssm_coef"],
+                    pssm_bias=f["pssm_bias"],
+                    pssm_multi=args.pssm_multi,
+                    pssm_log_odds_flag=bool(args.pssm_log_odds_flag),
+                    pssm_log_odds_mask=pssm_log_odds_mask,
+                    pssm_bias_flag=bool(args.pssm_bias_flag),
+                    bias_by_res=f["bias_by_res_all"],
+                )
+                if dicts["tied_positions_dict"] is None:
+                    sample_dict = model.sample(
+                        X,
+                        randn_2,
+                        S,
+                        chain_M,
+                        chain_encoding_all,
+                        residue_idx,
+                        **sample_kwargs,
+                    )
+                else:
+                    sample_dict = model.tied_sample(
+                        X,
+                        randn_2,
+                        S,
+                        chain_M,
+                        chain_encoding_all,
+                        residue_idx,
+                        tied_pos=f["tied_pos_list_of_lists_list"][0],
+                        tied_beta=f["tied_beta"],
+                        **sample_kwargs,
+                    )
+                S_sample = sample_dict["S"]
+
+                log_probs = model(
+                    X,
+                    S_sample,
+                    mask,
+                    chain_M * chain_M_pos,
+                    residue_idx,
+                    chain_encoding_all,
+                    randn_2,
+                    use_input_decoding_order=True,
+                    decoding_order=sample_dict["decoding_order"],
+                )
+                scores = _scores(S_sample, log_probs, mask_for_loss).cpu().data.numpy()
+                global_scores = _scores(S_sample, log_probs, mask).cpu().data.numpy()
+
+                all_probs_list.append(sample_dict["probs"].cpu().data.numpy())
+                all_log_probs_list.append(log_probs.cpu().data.numpy())
+                S_sample_list.append(S_sample.cpu().data.numpy())
+
+                for b_ix in range(batch_copies):
+                    masked_chain_length_list = f["masked_chain_length_list_list"][b_ix]
+                    masked_list = f["masked_list_list"][b_ix]
+                    seq_recovery_rate = torch.sum(
+                        torch.sum(
+                            torch.nn.functional.one_hot(S[b_ix], 21)
+                            * torch.nn.functional.one_hot(S_sample[b_ix], 21),
+                            axis=-1,
+                        )
+                        * mask_for_loss[b_ix]
+                    ) / torch.sum(mask_for_loss[b_ix])
+                    seq = _S_to_seq(S_sample[b_ix], chain_M[b_ix])
+                    score = scores[b_ix]
+                    score_list.append(score)
+                    global_score = global_scores[b_ix]
+                    global_score_list.append(global_score)
+
+                    if b_ix == 0 and j == 0 and temp == temperatures[0]:
+                        native_seq = reorder_chains(
+                            _S_to_seq(S[b_ix], chain_M[b_ix]),
+                            masked_chain_length_list,
+                            masked_list,
+                        )
+                        masked_list_0 = f["masked_list_list"][0]
+                        visible_list_0 = f["visible_list_list"][0]
+                        print_masked_chains = [
+                            masked_list_0[i] for i in np.argsort(masked_list_0)
+                        ]
+                        print_visible_chains = [
+                            visible_list_0[i] for i in np.argsort(visible_list_0)
+                        ]
+                        print_model_name = (
+                            "CA_model_name" if args.ca_only else "model_name"
+                        )
+                        fa.write(
+                            ">{}, score={}, global_score={}, fixed_chains={}, designed_chains={}, {}={}, git_hash={}, seed={}{}\n{}\n".format(
+                                name_,
+                                format_float(native_score.mean()),
+                                format_float(global_native_score.mean()),
+                                print_visible_chains,
+                                print_masked_chains,
+                                print_model_name,
+                                args.model_name,
+                                revision,
+                                seed,
+                                header_fields,
+                                native_seq,
+                            )
+                        )
+
+                    seq = reorder_chains(seq, masked_chain_length_list, masked_list)
+                    sample_number = j * batch_copies + b_ix + 1
+                    fa.write(
+                        ">T={}, sample={}, score={}, global_score={}, seq_recovery={}{}\n{}\n".format(
+                            temp,
+                            sample_number,
+                            format_float(score),
+                            format_float(global_score),
+                            format_float(seq_recovery_rate.detach().cpu().numpy()),
+                            header_fields,
+                            seq,
+                        )
+                    )
+
+    if args.save_score:
+        np.savez(
+            score_file,
+            score=np.array(score_list, np.float32),
+            global_score=np.array(global_score_list, np.float32),
+        )
+
+    if args.save_probs:
+        np.savez(
+            probs_file,
+            probs=np.array(np.concatenate(all_probs_list), np.float32),
+            log_probs=np.array(np.concatenate(all_log_probs_list), np.float32),
+            S=np.array(np.concatenate(S_sample_list), np.int32),
+            mask=mask_for_loss.cpu().data.numpy(),
+            chain_order=f["chain_list_list"],
+        )
+
+    num_seqs = len(temperatures) * num_batches * batch_copies
+    if print_all:
+        dt = round(float(time.time() - t0), 4)
+        print(f"{num_seqs} sequences of length {X.shape[1]} generated in {dt} seconds")
+
+    return num_seqs
+
+
+def run(
+    args: Namespace,
+    cache: ModelCache,
+    one_shot: bool = False,
+    queue=None,
+    results=None,
+):
+    """
+    Runs a full protein_mpnn_run.py job with a (possibly warm) model cache.
+    The stage timings are written to <out_folder>/engine_metrics.json. With
+    checkpoint set, every finished structure is marked as done in
+    <out_folder>/checkpoint.json.
+
+    With num_workers above 1 the structures are run by parallel worker
+    processes (Scripts/mpnn_parallel.py). A worker takes its structures from
+    queue and reports the finished ones and its metrics to results instead.
+    """
+    metrics = Metrics()
+    if one_shot:
+        metrics.add(started_at=STARTED_AT)
+        metrics.add_stages({"import": {"wall_s": IMPORT_S}})
+    else:
+        metrics.add(started_at=time.time())
+
+    if args.num_workers > 1 and queue is None:
+        from mpnn_parallel import run_parallel
+
+        return run_parallel(args, metrics)
+
+    print_all = args.suppress_print == 0
+    seed = seed_everything(args)
+
+    with metrics.stage("pipeline" if args.pipeline else "load_inputs"):
+        dicts, dataset_valid = load_structures(args, verbose=print_all)
+
+    # Every (model, backbone noise, constraint variant) point of a sweep, a
+    # single one otherwise
+    grid = sweep_grid(vars(args))
+    if (len(grid) > 1 or args.constraint_variants) and (
+        args.score_only or args.conditional_probs_only or args.unconditional_probs_only
+    ):
+        raise ValueError(
+            "Sweeps and constraint variants are only supported when designing sequences"
+        )
+
+    with metrics.stage("load_inputs"):
+        variants = load_variant_inputs(args, dicts)
+
+    # Reduced precision models are checked once, on the first structure
+    check_features = None
+    if args.precision != "fp32" and len(dataset_valid):
+        check_args = Namespace(**{**vars(args), "batch_size": 1})
+
+        def check_features():
+            return featurize(dataset_valid[0], check_args, dicts, cache.device)
+
+    loads = cache.loads
+    with metrics.stage("model_load"):
+        models = [
+            cache.get(Namespace(**{**vars(args), **point}), check_features)
+            for point in grid
+        ]
+    model, meta = models[0]
+
+    # The models of a warm worker may still route through a previous cache
+    feature_cache = None
+    encoder_cache = None
+    for point_model, _ in models:
+        FeatureCache.uninstall(point_model)
+        EncoderCache.uninstall(point_model)
+    if args.feature_cache:
+        feature_cache = FeatureCache(args.plugin_cache_dir, args.plugin_cache_size)
+        for point, (point_model, _) in zip(grid, models):
+            point_args = Namespace(**{**vars(args), **point})
+            checkpoint_path = os.path.join(
+                model_folder(point_args), f"{point_args.model_name}.pt"
+            )
+            feature_cache.install(
+                point_model, hash_file(checkpoint_path, point_args.precision)
+            )
+    if args.reuse_encoder or len(variants) > 1:
+        encoder_cache = EncoderCache()
+        for point_model, _ in models:
+            encoder_cache.install(point_model)
+
+    if args.precision != "fp32":
+        # Drift from the float32 model of every point, as checked when the
+        # model was converted
+        metrics.add(
+            precision=args.precision,
+            precision_drift=[
+                {**point, **(point_meta["drift"] or {})}
+                for point, (_, point_meta) in zip(grid, models)
+            ],
+        )
+        if print_all:
+            for point, (_, point_meta) in zip(grid, models):
+                if point_meta["drift"] is not None:
+                    print(
+                        f"{args.precision} {point_tag(point) or args.model_name}: "
+                        f"log-prob drift {point_meta['drift']['log_prob_drift']:.4f}, "
+                        f"recovery drop {point_meta['drift']['recovery_drop']:.4f}"
+                    )
+
+    if print_all:
+        print(40 * "-")
+        if cache.loads == loads:
+            print(f"Reusing loaded model {args.model_name}")
+        print("Number of edges:", meta["num_edges"])
+        print(f"Training noise level: {meta['noise_level']}A")
+        if len(grid) > 1:
+            print(f"Sweeping {len(grid)} model, backbone noise and variant points")
+
+    base_folder = prepare_folders(args)
+    revision = git_hash()
+
+    # Whether the models were loaded now or are warm, and whatever the checks
+    # above drew
+    replay_model_init(args, meta, seed)
+
+    if queue is None:
+        jobs = schedule(dataset_valid, args)
+    else:
+        from mpnn_parallel import queued_jobs
+
+        jobs = queued_jobs(dataset_valid, args, queue)
+
+    structures = 0
+    sequences = 0
+    with torch.no_grad(), keep_num_threads():
+        for protein, job_args in jobs:
+            if encoder_cache is not None:
+                encoder_cache.set_structure(protein)
+
+            if job_args.auto_tune:
+                from mpnn_autotune import autotune
+
+                with metrics.stage("auto_tune"):
+                    job_args = autotune(model, protein, job_args, dicts, cache.device)
+
+            # The features are shared by every point of the grid with the same
+            # constraint variant
+            features = {}
+            with metrics.stage("featurize"):
+                for variant in dict.fromkeys(point.get("variant") for point in grid):
+                    features[variant] = featurize(
+                        protein, job_args, variants[variant][1], cache.device
+                    )
+            f = features.get(None)
+
+            with metrics.stage("sample"):
+                if job_args.score_only:
+                    score_structure(model, protein, f, job_args, base_folder)
+                elif (
+                    job_args.conditional_probs_only or job_args.unconditional_probs_only
+                ):
+                    probs_structure(model, protein, f, job_args, base_folder)
+                else:
+                    for point, (point_model, _) in zip(grid, models):
+                        overrides, point_dicts = variants[point.get("variant")]
+                        point_args = Namespace(
+                            **{**vars(job_args), **point, **overrides}
+                        )
+                        point_model.features.augment_eps = point_args.backbone_noise
+                        sequences += design_structure(
+                            point_model,
+                            protein,
+                            features[point.get("variant")],
+                            point_args,
+                            point_dicts,
+                            base_folder,
+                            job_args.seed or seed,
+                            revision,
+                            point,
+                        )
+
+            structures += 1
+            if results is not None:
+                results.put(("done", protein["name"]))
+            elif job_args.checkpoint:
+                mark_done(args.out_folder, protein["name"])
+
+    if feature_cache is not None:
+        metrics.add(**feature_cache.stats(), feature_cache_evicted=feature_cache.evict())
+    if encoder_cache is not None:
+        metrics.add(**encoder_cache.stats())
+
+    sample_s = metrics.data["stages"].get("sample", {}).get("wall_s", 0)
+    metrics.add(
+        structures=structures,
+        grid_points=len(grid),
+        sequences=sequences,
+        seqs_per_second=round(sequences / sample_s, 3) if sample_s else None,
+        threads_per_worker=torch.get_num_threads(),
+    )
+    if results is not None:
+        results.put(("metrics", metrics.data))
+    else:
+        metrics.save("engine", os.path.join(base_folder, METRICS_FILE))
+
+
+if __name__ == "__main__":
+    # One-shot execution: python mpnn_engine.py <params.json>
+    with open(sys.argv[1], "r") as params_file:
+        run(make_args(json.load(params_file)), ModelCache(), one_shot=True)
@@ -0,0 +1,335 @@
+"""
+TorchScript backend for mpnn_engine.
+
+The encoder layers and the decoder layers (called once per residue in the
+autoregressive sampling loop) are traced into TorchScript graphs, so their
+forward passes run without the Python module code. The sampling and scoring
+loops of ProteinMPNN, and the neighbor search, stay as they are, which keeps
+the outputs the same as the eager model for the same seed.
+
+The graphs are traced once per (checkpoint, precision, torch version) and
+kept in the plugin DiskCache (namespace 'graphs'). They can be exported for
+every model beforehand, compared with the eager model on a reference set and
+benchmarked:
+
+    python mpnn_export.py export
+    python mpnn_export.py check reference.jsonl --model_name v_48_020
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from argparse import Namespace
+
+import numpy as np
+import torch
+
+import mpnn_engine
+from Helpers.cache import DiskCache, hash_file, hash_key
+
+# Bump when the traced graphs change, to invalidate the cached ones
+GRAPH_VERSION = "1"
+
+NAMESPACE = "graphs"
+
+# Shapes the layers are traced with, and checked with afterwards
+TRACE_LENGTH = 64
+CHECK_LENGTH = 37
+CHECK_BATCH = 2
+
+MODEL_NAMES = ["v_48_002", "v_48_010", "v_48_020", "v_48_030"]
+
+
+class EncoderGraph(torch.nn.Module):
+    """
+    Calls a traced encoder layer with the arguments of EncLayer.forward.
+    """
+
+    def __init__(self, graph):
+        super().__init__()
+        self.graph = graph
+
+    def forward(self, h_V, h_E, E_idx, mask_V=None, mask_attend=None):
+        return self.graph(h_V, h_E, E_idx, mask_V, mask_attend)
+
+
+class DecoderGraph(torch.nn.Module):
+    """
+    Calls a traced decoder layer with the arguments of DecLayer.forward.
+    """
+
+    def __init__(self, graph):
+        super().__init__()
+        self.graph = graph
+
+    def forward(self, h_V, h_E, mask_V=None, mask_attend=None):
+        return self.graph(h_V, h_E, mask_V)
+
+
+def _encoder_inputs(batch: int, length: int, k: int):
+    hidden = mpnn_engine.HIDDEN_DIM
+    return (
+        torch.randn(batch, length, hidden),
+        torch.randn(batch, length, k, hidden),
+        torch.randint(0, length, (batch, length, k)),
+        torch.ones(batch, length),
+        torch.ones(batch, length, k),
+    )
+
+
+def _decoder_inputs(batch: int, length: int, k: int):
+    hidden = mpnn_engine.HIDDEN_DIM
+    return (
+        torch.randn(batch, length, hidden),
+        torch.randn(batch, length, k, 3 * hidden),
+        torch.ones(batch, length),
+    )
+
+
+def _trace(layer, inputs, check_inputs, device):
+    """
+    Traces a layer and checks it on inputs of another batch size and length.
+    """
+    inputs = tuple(t.to(device) for t in inputs)
+    check_inputs = tuple(t.to(device) for t in check_inputs)
+
+    graph = torch.jit.trace(layer, inputs, check_trace=False)
+
+    expected = layer(*check_inputs)
+    traced = graph(*check_inputs)
+    if not isinstance(expected, tuple):
+        expected, traced = (expected,), (traced,)
+    for a, b in zip(expected, traced):
+        if a.shape != b.shape or not torch.allclose(
+            a.float(), b.float(), rtol=1e-4, atol=1e-5
+        ):
+            raise RuntimeError(
+                f"The traced {type(layer).__name__} does not match the eager one"
+            )
+
+    return graph
+
+
+def _save(graph) -> bytes:
+    buffer = io.BytesIO()
+    torch.jit.save(graph, buffer)
+    return buffer.getvalue()
+
+
+def _load(data: bytes, device):
+    return torch.jit.load(io.BytesIO(data), map_location=device)
+
+
+def to_torchscript(
+    model, meta: dict, checkpoint_path: str, precision: str, device, cache_dir=""
+):
+    """
+    Replaces the encoder and decoder layers of a loaded model with their
+    TorchScript graphs, tracing them only if the plugin cache does not have
+    them. Returns the model.
+    """
+    disk = DiskCache(cache_dir, NAMESPACE) if cache_dir else None
+    base_key = hash_file(checkpoint_path, precision, GRAPH_VERSION, torch.__version__)
+    k = meta["num_edges"]
+
+    for name, inputs, wrapper in [
+        ("encoder_layers", _encoder_inputs, EncoderGraph),
+        ("decoder_layers", _decoder_inputs, DecoderGraph),
+    ]:
+        layers = getattr(model, name)
+        graphs = []
+        for i, layer in enumerate(layers):
+            key = hash_key(base_key, name, str(i))
+            data = disk.get(key) if disk is not None else None
+            graph = None
+            if data is not None:
+                try:
+                    graph = _load(data, device)
+                except RuntimeError:
+                    graph = None
+            if graph is None:
+                with torch.no_grad():
+                    graph = _trace(
+                        layer,
+                        inputs(1, TRACE_LENGTH, k),
+                        inputs(CHECK_BATCH, CHECK_LENGTH, k),
+                        device,
+                    )
+                if disk is not None:
+                    disk.put(key, _save(graph))
+            graphs.append(wrapper(graph))
+        setattr(model, name, torch.nn.ModuleList(graphs))
+
+    return model.eval()
+
+
+def export_all(args):
+    """
+    Traces the graphs of every model flavour into the plugin cache.
+    """
+    cache = mpnn_engine.ModelCache()
+    flavours = [(False, False), (False, True), (True, False)]
+    for ca_only, soluble in flavours:
+        for model_name in MODEL_NAMES:
+            run_args = mpnn_engine.make_args(
+                {
+                    "model_name": model_name,
+                    "ca_only": ca_only,
+                    "use_soluble_model": soluble,
+                    "precision": args.precision,
+                    "backend": "torchscript",
+                    "plugin_cache_dir": args.cache_dir,
+                }
+            )
+            checkpoint_path = os.path.join(
+                mpnn_engine.model_folder(run_args), f"{model_name}.pt"
+            )
+            if not os.path.isfile(checkpoint_path):
+                continue
+            cache.get(run_args)
+            print(f"Exported {checkpoint_path} ({args.precision})")
+
+
+def _sample(model, f: dict, seed: int):
+    """
+    One sampling pass and its rescoring with a fixed seed.
+    """
+    torch.manual_seed(seed)
+    chain_M = f["chain_M"]
+    randn = torch.randn(chain_M.shape, device=chain_M.device)
+    sample = model.sample(
+        f["X"],
+        randn,
+        f["S"],
+        chain_M,
+        f["chain_encoding_all"],
+        f["residue_idx"],
+        mask=f["mask"],
+        temperature=0.1,
+        omit_AAs_np=np.zeros(21, dtype=np.float32),
+        bias_AAs_np=np.zeros(21),
+        chain_M_pos=f["chain_M_pos"],
+        omit_AA_mask=f["omit_AA_mask"],
+        pssm_coef=f["pssm_coef"],
+        pssm_bias=f["pssm_bias"],
+        pssm_multi=0.0,
+        pssm_log_odds_flag=False,
+        pssm_log_odds_mask=(f["pssm_log_odds_all"] > 0.0).float(),
+        pssm_bias_flag=False,
+        bias_by_res=f["bias_by_res_all"],
+    )
+    log_probs = model(
+        f["X"],
+        sample["S"],
+        f["mask"],
+        chain_M * f["chain_M_pos"],
+        f["residue_idx"],
+        f["chain_encoding_all"],
+        randn,
+        use_input_decoding_order=True,
+        decoding_order=sample["decoding_order"],
+    )
+
+    return sample["S"], log_probs
+
+
+def check(args) -> int:
+    """
+    Samples every reference structure with the eager and the TorchScript
+    models from the same seeds, and reports whether the sequences match, the
+    largest log-prob difference and the time of each backend.
+    """
+    params = {
+        "jsonl_path": args.jsonl,
+        "model_name": args.model_name,
+        "ca_only": args.ca_only,
+        "use_soluble_model": args.use_soluble_model,
+        "batch_size": args.batch_size,
+        "precision": args.precision,
+        "plugin_cache_dir": args.cache_dir,
+    }
+    run_args = mpnn_engine.make_args(params)
+    cache = mpnn_engine.ModelCache()
+    eager, _ = cache.get(run_args)
+    graph, _ = cache.get(Namespace(**{**vars(run_args), "backend": "torchscript"}))
+
+    dicts = mpnn_engine.load_inputs(run_args)
+    dataset = mpnn_engine.StructureDataset(
+        args.jsonl, truncate=None, max_length=run_args.max_length, verbose=False
+    )
+
+    failed = 0
+    times = {"eager": 0.0, "torchscript": 0.0}
+    with torch.no_grad():
+        for protein in dataset:
+            f = mpnn_engine.featurize(protein, run_args, dicts, cache.device)
+            outputs = {}
+            for name, model in [("eager", eager), ("torchscript", graph)]:
+                t0 = time.perf_counter()
+                outputs[name] = [_sample(model, f, seed) for seed in args.seeds]
+                times[name] += time.perf_counter() - t0
+
+            same = all(
+                torch.equal(a[0], b[0])
+                for a, b in zip(outputs["eager"], outputs["torchscript"])
+            )
+            drift = max(
+                float((a[1] - b[1]).abs().max())
+                for a, b in zip(outputs["eager"], outputs["torchscript"])
+            )
+            ok = same and drift <= args.tolerance
+            failed += not ok
+            print(
+                f"{protein['name']}: sequences {'match' if same else 'DIFFER'}, "
+                f"max log-prob difference {drift:.2e} {'ok' if ok else 'FAILED'}"
+            )
+
+    print(
+        f"eager {times['eager']:.2f} s, torchscript {times['torchscript']:.2f} s, "
+        f"speedup {times['eager'] / max(times['torchscript'], 1e-9):.2f}"
+    )
+    print(f"{len(dataset) - failed} of {len(dataset)} structures equivalent")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    argparser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=os.path.expanduser("~/.proteinmpnn_horus/cache"),
+        help="Plugin cache folder",
+    )
+    argparser.add_argument(
+        "--precision", type=str, choices=["fp32", "bf16", "int8"], default="fp32"
+    )
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("export", help="Trace the graphs of every model")
+
+    check_parser = subparsers.add_parser(
+        "check", help="Compare and time the eager and TorchScript backends"
+    )
+    check_parser.add_argument("jsonl", type=str, help="Reference parsed chains JSONL")
+    check_parser.add_argument("--model_name", type=str, default="v_48_020")
+    check_parser.add_argument("--ca_only", action="store_true")
+    check_parser.add_argument("--use_soluble_model", action="store_true")
+    check_parser.add_argument("--batch_size", type=int, default=1)
+    check_parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    check_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-4,
+        help="Largest log-prob difference between the backends",
+    )
+
+    parsed = argparser.parse_args()
+    if parsed.command == "export":
+        export_all(parsed)
+    else:
+        sys.exit(check(parsed))
@@ -0,0 +1,273 @@
+"""
+Backbone feature and encoder caches for mpnn_engine.
+
+ProteinMPNN rebuilds the edge features of the backbone (an all-pairs
+distance matrix, a top-k neighbor search, RBF and positional encodings and
+the edge embedding) on every forward pass: once for the native score and
+twice per sampled batch. Without backbone noise they only depend on the
+inputs of the feature module (coordinates, mask, residue_idx and chain
+encoding) and its weights, so FeatureCache computes them once per backbone
+and model and keeps them:
+
+- in memory while the backbone is designed, for every forward pass. Mutants
+  and renamed copies of the backbone that follow it reuse them too.
+- on disk, as an uncompressed NPZ entry of the plugin DiskCache (namespace
+  'features') keyed by (backbone inputs, model weights, k neighbors). The
+  entries are memory-mapped when read and evicted least recently used first.
+
+The output of tied_featurize is not cached: besides the backbone it holds
+the sequence and every constraint tensor (designed chains, fixed and tied
+positions, omitted AAs, biases, PSSM), so it differs for every mutant and
+variant, and it is cheap next to the edge features.
+
+Neighbor indices are stored as int32. Edge features stay float32, so the
+sampled sequences are identical to an uncached run.
+
+The encoder output (node and edge embeddings) only depends on the backbone
+as well: fixed positions, omitted amino acids, biases, PSSM, tied positions
+and temperature are all applied by the decoder. EncoderCache runs the
+encoder layers once per structure and model, and every later forward pass of
+the structure (native score, sampling, rescoring, other constraint variants)
+reuses it. It is kept in memory only, for the structure being designed.
+"""
+
+import io
+import os
+
+import numpy as np
+import torch
+
+from Helpers.cache import DiskCache, hash_key
+from Helpers.pssm import open_npz
+
+# Bump when the stored features change, to invalidate the cached entries
+FEATURE_VERSION = "2"
+
+NAMESPACE = "features"
+
+
+def backbone_hash(X, mask, residue_idx, chain_labels) -> str:
+    """
+    Hash of the feature module inputs of the first copy in a batch. The
+    sequence is not an input, so mutants of a backbone share its hash.
+    """
+    return hash_key(
+        str(tuple(X.shape[1:])),
+        *(t[0].detach().cpu().numpy().tobytes() for t in (X, mask, residue_idx)),
+        chain_labels[0].detach().cpu().numpy().tobytes(),
+    )
+
+
+class FeatureCache:
+    """
+    Serves the edge features of the current backbone to the models it is
+    installed on.
+    """
+
+    def __init__(self, directory: str = None, max_mb: int = 0):
+        self.disk = None
+        if directory:
+            max_bytes = max_mb * 1024 * 1024 if max_mb else None
+            self.disk = DiskCache(directory, NAMESPACE, max_bytes=max_bytes)
+        self.backbone = None
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, key: str):
+        if self.disk is None:
+            return None
+
+        path = self.disk.path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            arrays = open_npz(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return [arrays[f"output_{i}"] for i in range(len(arrays))]
+
+    def _store(self, key: str, outputs):
+        if self.disk is None:
+            return
+
+        arrays = {}
+        for i, output in enumerate(outputs):
+            array = output[:1].cpu().numpy()
+            if np.issubdtype(array.dtype, np.integer):
+                array = array.astype(np.int32)
+            arrays[f"output_{i}"] = array
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        self.disk.put(key, buffer.getvalue())
+
+    def lookup(self, features, model_key: str, inputs: tuple, compute):
+        """
+        Returns the feature module outputs (E, E_idx) for a batch of copies of
+        a backbone, computing them only if they are not cached.
+        """
+        X = inputs[0]
+        backbone = backbone_hash(*inputs)
+        if backbone != self.backbone:
+            self.backbone = backbone
+            self.memory = {}
+        key = hash_key(backbone, model_key, str(features.top_k), FEATURE_VERSION)
+
+        cached = self.memory.get(key)
+        if cached is None:
+            arrays = self._load(key)
+            if arrays is None:
+                self.misses += 1
+                outputs = compute()
+                self._store(key, outputs)
+                self.memory[key] = [output[:1] for output in outputs]
+                return outputs
+            cached = [
+                torch.from_numpy(
+                    np.array(a, np.int64 if a.dtype.kind in "iu" else a.dtype)
+                ).to(X.device)
+                for a in arrays
+            ]
+            self.memory[key] = cached
+        self.hits += 1
+
+        return tuple(t.repeat(X.shape[0], *([1] * (t.dim() - 1))) for t in cached)
+
+    def install(self, model, model_key: str):
+        """
+        Routes the feature module of a model through the cache. model_key
+        identifies the weights of the model (checkpoint and precision). Passes
+        with backbone noise are not cached.
+        """
+        features = model.features
+        if getattr(features, "feature_cache", None) is self:
+            return
+
+        original = type(features).forward
+
+        def forward(*inputs):
+            def compute():
+                return original(features, *inputs)
+
+            if features.augment_eps > 0:
+                return compute()
+
+            return self.lookup(features, model_key, inputs, compute)
+
+        features.forward = forward
+        features.feature_cache = self
+
+    @staticmethod
+    def uninstall(model):
+        """
+        Restores the feature module of a model, e.g. when a warm worker runs a
+        job without the cache after one with it.
+        """
+        model.features.__dict__.pop("forward", None)
+        model.features.__dict__.pop("feature_cache", None)
+
+    def evict(self) -> int:
+        return self.disk.evict() if self.disk is not None else 0
+
+    def stats(self) -> dict:
+        return {"feature_cache_hits": self.hits, "feature_cache_misses": self.misses}
+
+
+class CachedEncoder(torch.nn.Module):
+    """
+    Stands in for the encoder layers of a model. ProteinMPNN loops over its
+    encoder layers, so this yields itself as a single layer that runs all of
+    them, or returns their cached output.
+    """
+
+    def __init__(self, layers, features, cache):
+        super().__init__()
+        self.layers = layers
+        # In a list, so the features are not registered as a submodule twice
+        self.features = [features]
+        self.cache = cache
+
+    def __iter__(self):
+        yield self
+
+    def __len__(self):
+        return 1
+
+    def encode(self, h_V, h_E, E_idx, mask, mask_attend):
+        for layer in self.layers:
+            h_V, h_E = layer(h_V, h_E, E_idx, mask, mask_attend)
+
+        return h_V, h_E
+
+    def forward(self, h_V, h_E, E_idx, mask, mask_attend):
+        if self.features[0].augment_eps > 0:
+            return self.encode(h_V, h_E, E_idx, mask, mask_attend)
+
+        return self.cache.lookup(self, h_V, h_E, E_idx, mask, mask_attend)
+
+
+class EncoderCache:
+    """
+    Keeps the encoder output of the current structure for every model it is
+    installed on.
+    """
+
+    def __init__(self):
+        self.structure = None
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def set_structure(self, protein: dict):
+        self.structure = protein["name"]
+        self.memory = {}
+
+    def lookup(self, encoder, h_V, h_E, E_idx, mask, mask_attend):
+        """
+        Returns the encoder output for a batch of copies of the current
+        structure, running the encoder only if it is not cached.
+        """
+        if self.structure is None:
+            return encoder.encode(h_V, h_E, E_idx, mask, mask_attend)
+
+        batch, length = h_V.shape[0], h_V.shape[1]
+
+        cached = self.memory.get(id(encoder))
+        if cached is None or cached[0].shape[1] != length:
+            self.misses += 1
+            h_V, h_E = encoder.encode(h_V, h_E, E_idx, mask, mask_attend)
+            self.memory[id(encoder)] = (h_V[:1], h_E[:1])
+            return h_V, h_E
+
+        self.hits += 1
+
+        return tuple(t.repeat(batch, *([1] * (t.dim() - 1))) for t in cached)
+
+    def install(self, model):
+        """
+        Routes the encoder of a model through the cache. Passes with backbone
+        noise, or before a structure is set, are not cached.
+        """
+        if isinstance(model.encoder_layers, CachedEncoder):
+            model.encoder_layers.cache = self
+            return
+
+        model.encoder_layers = CachedEncoder(
+            model.encoder_layers, model.features, self
+        )
+
+    @staticmethod
+    def uninstall(model):
+        """
+        Restores the encoder layers of a model, e.g. when a warm worker runs a
+        job without the cache after one with it.
+        """
+        if isinstance(model.encoder_layers, CachedEncoder):
+            model.encoder_layers = model.encoder_layers.layers
+
+    def stats(self) -> dict:
+        return {"encoder_cache_hits": self.hits, "encoder_cache_misses": self.misses}
@@ -0,0 +1,235 @@
+"""
+Structure-level parallel execution for mpnn_engine.
+
+Small targets do not keep many torch threads busy, so on wide CPU nodes it is
+faster to run several engine processes with a few threads each than a
+single one with all of them. run_parallel starts num_workers processes,
+each pinned to its own slice of the available cores with a fixed number of
+intra-op threads, and hands the structures out through a work queue, longest
+first, so the workers finish at about the same time. Every worker writes to
+the same output folder, which keeps the usual seqs/, scores/ and probs/
+layout.
+
+Each structure is seeded on its own (seed + its position in the input), so
+its sequences do not depend on the worker that runs it. The parent process
+updates the checkpoint and merges the stage timings of the workers.
+"""
+
+import multiprocessing
+import os
+import queue as queue_module
+import traceback
+from argparse import Namespace
+
+import numpy as np
+
+import mpnn_engine
+
+THREAD_VARIABLES = ["OMP_NUM_THREADS", "MKL_NUM_THREADS"]
+
+
+def available_cores() -> list:
+    """
+    Cores this process may run on, e.g. the cores of a Slurm allocation.
+    """
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def core_slices(num_workers: int, threads: int = 0) -> list:
+    """
+    Splits the available cores into one slice per worker. Without a thread
+    count every worker gets an equal share. When the slices do not fit, they
+    wrap around and share cores.
+    """
+    cores = available_cores()
+    threads = threads or max(1, len(cores) // num_workers)
+
+    return [
+        [cores[(i * threads + j) % len(cores)] for j in range(threads)]
+        for i in range(num_workers)
+    ]
+
+
+def queued_jobs(proteins, args: Namespace, queue):
+    """
+    Yields (protein, args) for the structure indices taken from the work
+    queue, until it hands out None. The random generators are seeded for
+    every structure and its args carry that seed.
+    """
+    proteins = list(proteins)
+
+    while True:
+        index = queue.get()
+        if index is None:
+            return
+
+        seed = args.seed + index
+        mpnn_engine.seed_everything(Namespace(seed=seed))
+
+        for protein, job_args in mpnn_engine.schedule([proteins[index]], args):
+            yield protein, Namespace(**{**vars(job_args), "seed": seed})
+
+
+def _worker(params: dict, cores: list, queue, results):
+    """
+    Entry point of a worker process.
+    """
+    import torch
+
+    try:
+        os.sched_setaffinity(0, cores)
+    except (AttributeError, OSError):
+        pass
+    torch.set_num_threads(len(cores))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    try:
+        mpnn_engine.run(
+            mpnn_engine.make_args(params),
+            mpnn_engine.ModelCache(),
+            queue=queue,
+            results=results,
+        )
+    except Exception:
+        results.put(("error", traceback.format_exc()))
+
+
+def merge_stages(stages_list: list) -> dict:
+    """
+    Adds up the stage timings of the workers. The peak memory values are the
+    largest ones of any worker.
+    """
+    merged = {}
+    for stages in stages_list:
+        for name, stage in stages.items():
+            total = merged.setdefault(name, {})
+            for key, value in stage.items():
+                if "peak" in key:
+                    total[key] = max(total.get(key, 0.0), value)
+                else:
+                    total[key] = round(total.get(key, 0.0) + value, 4)
+
+    return merged
+
+
+def run_parallel(args: Namespace, metrics):
+    """
+    Runs the structures of a job over num_workers processes and writes the
+    merged metrics to <out_folder>/engine_metrics.json.
+    """
+    from Helpers.checkpoint import mark_done
+
+    print_all = args.suppress_print == 0
+
+    # The workers get a fixed seed so every structure is reproducible
+    seed = args.seed or int(np.random.randint(1, high=999, size=1, dtype=int)[0])
+
+    with metrics.stage("load_inputs"):
+        # The workers get the pipeline inputs as files, built only once
+        if args.pipeline:
+            args = mpnn_engine.pipeline_files(args)
+        dataset_valid = mpnn_engine.StructureDataset(
+            args.jsonl_path,
+            truncate=None,
+            max_length=args.max_length,
+            verbose=False,
+        )
+    lengths = [len(protein["seq"]) for protein in dataset_valid]
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+
+    base_folder = mpnn_engine.prepare_folders(args)
+
+    num_workers = min(args.num_workers, max(1, len(order)))
+    slices = core_slices(num_workers, args.threads_per_worker)
+
+    if print_all:
+        print(40 * "-")
+        print(
+            f"Running {len(order)} structures on {num_workers} workers "
+            f"with {len(slices[0])} threads each, seed {seed}"
+        )
+
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    results = context.Queue()
+    for index in order:
+        queue.put(index)
+    for _ in range(num_workers):
+        queue.put(None)
+
+    params = {**vars(args), "seed": seed, "num_workers": 1}
+
+    workers = []
+    errors = []
+    worker_metrics = []
+    with metrics.stage("parallel"):
+        environ = {k: os.environ.get(k) for k in THREAD_VARIABLES}
+        try:
+            for cores in slices:
+                # Read by the OpenMP runtime when the worker imports torch
+                for k in THREAD_VARIABLES:
+                    os.environ[k] = str(len(cores))
+                worker = context.Process(
+                    target=_worker, args=(params, cores, queue, results)
+                )
+                worker.start()
+                workers.append(worker)
+        finally:
+            for k, v in environ.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+        finished = 0
+        while finished < len(workers):
+            try:
+                kind, value = results.get(timeout=1)
+            except queue_module.Empty:
+                if all(not w.is_alive() for w in workers) and results.empty():
+                    break
+                continue
+
+            if kind == "done":
+                if args.checkpoint:
+                    mark_done(args.out_folder, value)
+            elif kind == "metrics":
+                worker_metrics.append(value)
+                finished += 1
+            else:
+                errors.append(value)
+                finished += 1
+
+        for worker in workers:
+            worker.join()
+
+    if errors or len(worker_metrics) < len(workers):
+        failed = len(workers) - len(worker_metrics)
+        raise RuntimeError(
+            f"{failed} of {len(workers)} ProteinMPNN workers failed"
+            + ("".join("\n" + error for error in errors) if errors else "")
+        )
+
+    sequences = sum(data["sequences"] for data in worker_metrics)
+    parallel_s = metrics.data["stages"]["parallel"]["wall_s"]
+    metrics.add_stages(
+        merge_stages([data["stages"] for data in worker_metrics]), prefix="workers."
+    )
+    metrics.add(
+        structures=sum(data["structures"] for data in worker_metrics),
+        grid_points=worker_metrics[0]["grid_points"],
+        sequences=sequences,
+        seqs_per_second=round(sequences / parallel_s, 3) if parallel_s else None,
+        workers=len(workers),
+        threads_per_worker=len(slices[0]),
+    )
+    for key in ("precision", "precision_drift"):
+        if key in worker_metrics[0]:
+            metrics.add(**{key: worker_metrics[0][key]})
+    metrics.save("engine", os.path.join(base_folder, mpnn_engine.METRICS_FILE))
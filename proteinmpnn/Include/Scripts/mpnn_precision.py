@@ -0,0 +1,306 @@
+"""
+Reduced-precision CPU inference for mpnn_engine.
+
+Most of the ProteinMPNN compute is in its linear layers, so only those are
+converted; layer norms, softmaxes and the sampling stay in float32:
+
+- fp32: the checkpoint as is.
+- bf16: bfloat16 weights and matrix products, float32 in and out.
+- int8: dynamic int8 quantization (int8 weights, activations quantized on
+  the fly).
+
+A converted model is built once per checkpoint and kept in the plugin
+DiskCache (namespace 'precision'), so later runs load it directly.
+
+Every converted model is checked against the float32 one once, when it is
+converted: the per-position log-probabilities of the native sequence and the
+sequence recovery of the most likely residues must stay within a tolerance
+(by default 0.05 for bf16 and 0.2 for dynamic int8, which drifts 0.12 to
+0.16 on random backbones), otherwise the run fails. The drift is kept next to
+the converted model, so later runs check the cached drift against their
+tolerance without loading the float32 model. The same check can be run on a reference backbone set:
+
+    python mpnn_precision.py reference.jsonl --precision int8 --tolerance 0.2
+"""
+
+import argparse
+import copy
+import io
+import sys
+from argparse import Namespace
+
+import torch
+
+import mpnn_engine
+from Helpers.cache import DiskCache, hash_file
+
+PRECISIONS = ["fp32", "bf16", "int8"]
+
+# Bump when the conversion changes, to invalidate the cached models
+PRECISION_VERSION = "1"
+
+NAMESPACE = "precision"
+
+# Default largest mean absolute log-prob difference per designed position
+TOLERANCES = {"bf16": 0.05, "int8": 0.2}
+
+# Largest drop of the sequence recovery of the most likely residues
+RECOVERY_TOLERANCE = 0.05
+
+
+class BF16Linear(torch.nn.Module):
+    """
+    Linear layer with bfloat16 weights. Inputs and outputs keep their dtype.
+    """
+
+    def __init__(self, linear: torch.nn.Linear):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.weight = torch.nn.Parameter(
+            linear.weight.detach().to(torch.bfloat16), requires_grad=False
+        )
+        self.bias = None
+        if linear.bias is not None:
+            self.bias = torch.nn.Parameter(
+                linear.bias.detach().to(torch.bfloat16), requires_grad=False
+            )
+
+    def forward(self, x):
+        return torch.nn.functional.linear(
+            x.to(torch.bfloat16), self.weight, self.bias
+        ).to(x.dtype)
+
+
+def _to_bf16(module: torch.nn.Module):
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear):
+            setattr(module, name, BF16Linear(child))
+        else:
+            _to_bf16(child)
+
+
+def convert(model, precision: str):
+    """
+    Converts the linear layers of a float32 model in place and returns it.
+    """
+    if precision == "bf16":
+        _to_bf16(model)
+    elif precision == "int8":
+        try:
+            from torch.ao.quantization import quantize_dynamic
+        except ImportError:
+            from torch.quantization import quantize_dynamic
+
+        model = quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    elif precision != "fp32":
+        raise ValueError(f"Unknown precision '{precision}', use one of {PRECISIONS}")
+
+    return model.eval()
+
+
+def _torch_load(data: bytes, device):
+    buffer = io.BytesIO(data)
+    try:
+        return torch.load(buffer, map_location=device, weights_only=False)
+    except TypeError:
+        buffer.seek(0)
+        return torch.load(buffer, map_location=device)
+
+
+def load_converted(
+    checkpoint_path: str,
+    precision: str,
+    build,
+    device,
+    cache_dir="",
+    check_features=None,
+    tolerance: float = 0,
+):
+    """
+    Returns (model, meta) converted to the precision. build() loads the
+    float32 model and is only called when the plugin cache does not have the
+    converted one, or has not checked it yet.
+
+    check_features() returns the featurized structure the converted model is
+    checked on. The check runs once per converted model and its drift is
+    stored with it and returned as meta["drift"] (None when unchecked).
+    Raises when the drift, new or cached, is beyond the tolerances; a
+    tolerance of 0 uses the default of the precision.
+    """
+    disk = DiskCache(cache_dir, NAMESPACE) if cache_dir else None
+    key = None
+    entry = None
+    if disk is not None:
+        key = hash_file(
+            checkpoint_path, precision, PRECISION_VERSION, torch.__version__
+        )
+        data = disk.get(key)
+        if data is not None:
+            try:
+                entry = _torch_load(data, device)
+            except Exception:
+                entry = None
+
+    store = entry is None
+    reference = None
+    if entry is None:
+        model, meta = build()
+        if check_features is not None:
+            reference = copy.deepcopy(model)
+        entry = {"model": convert(model, precision), "meta": meta}
+
+    if entry.get("drift") is None and check_features is not None:
+        if reference is None:
+            reference, _ = build()
+        with torch.no_grad():
+            entry["drift"] = compare(reference, entry["model"], check_features())
+        store = True
+        del reference
+
+    if disk is not None and store:
+        buffer = io.BytesIO()
+        torch.save(entry, buffer)
+        disk.put(key, buffer.getvalue())
+
+    drift = entry.get("drift")
+    if drift is not None:
+        check_drift(drift, precision, tolerance)
+
+    return entry["model"].eval(), {**entry["meta"], "drift": drift}
+
+
+def _log_probs(model, f: dict):
+    """
+    Log-probabilities of the native sequence with a fixed decoding order.
+    """
+    chain_M = f["chain_M"] * f["chain_M_pos"]
+    randn = torch.arange(chain_M.shape[1], device=chain_M.device, dtype=torch.float32)
+    randn = randn[None].repeat(chain_M.shape[0], 1)
+
+    return model(
+        f["X"],
+        f["S"],
+        f["mask"],
+        chain_M,
+        f["residue_idx"],
+        f["chain_encoding_all"],
+        randn,
+    )
+
+
+def compare(reference, model, f: dict) -> dict:
+    """
+    Drift of a converted model from the float32 one on a featurized
+    structure: the mean absolute difference of the native log-probabilities
+    per designed position, and the drop of the recovery of the most likely
+    residues.
+    """
+    mask = (f["mask"] * f["chain_M"] * f["chain_M_pos"])[0]
+    positions = mask.sum().clamp(min=1)
+    S = f["S"][0]
+
+    def native(log_probs):
+        return log_probs[0].gather(-1, S[:, None])[:, 0]
+
+    def recovery(log_probs):
+        return float(((log_probs[0].argmax(-1) == S).float() * mask).sum() / positions)
+
+    # Both models are compared on the same, noiseless backbone
+    noise = (reference.features.augment_eps, model.features.augment_eps)
+    reference.features.augment_eps = model.features.augment_eps = 0.0
+    try:
+        log_probs = _log_probs(reference, f)
+        converted = _log_probs(model, f).float()
+    finally:
+        reference.features.augment_eps, model.features.augment_eps = noise
+
+    return {
+        "log_prob_drift": float(
+            ((native(converted) - native(log_probs)).abs() * mask).sum() / positions
+        ),
+        "recovery_drop": recovery(log_probs) - recovery(converted),
+    }
+
+
+def check_drift(drift: dict, precision: str, tolerance: float = 0):
+    """
+    Raises when the drift of a converted model is beyond the tolerances, the
+    default one of the precision when tolerance is 0.
+    """
+    tolerance = tolerance or TOLERANCES[precision]
+    if (
+        drift["log_prob_drift"] > tolerance
+        or drift["recovery_drop"] > RECOVERY_TOLERANCE
+    ):
+        raise RuntimeError(
+            f"{precision} inference drifts from fp32: mean log-prob difference "
+            f"{drift['log_prob_drift']:.4f} (tolerance {tolerance}), recovery drop "
+            f"{drift['recovery_drop']:.4f} (tolerance {RECOVERY_TOLERANCE}). "
+            "Use fp32 or raise the precision tolerance."
+        )
+
+
+def main(args):
+    params = {
+        "jsonl_path": args.jsonl,
+        "model_name": args.model_name,
+        "ca_only": args.ca_only,
+        "use_soluble_model": args.use_soluble_model,
+        "path_to_model_weights": args.path_to_model_weights,
+        "precision": args.precision,
+    }
+    run_args = mpnn_engine.make_args(params)
+    cache = mpnn_engine.ModelCache()
+    reference, _ = cache.get(Namespace(**{**vars(run_args), "precision": "fp32"}))
+    model, _ = cache.get(run_args)
+
+    dicts = mpnn_engine.load_inputs(run_args)
+    dataset = mpnn_engine.StructureDataset(
+        args.jsonl, truncate=None, max_length=run_args.max_length, verbose=False
+    )
+
+    tolerance = args.tolerance or TOLERANCES[args.precision]
+    failed = 0
+    with torch.no_grad():
+        for protein in dataset:
+            f = mpnn_engine.featurize(protein, run_args, dicts, cache.device)
+            drift = compare(reference, model, f)
+            ok = (
+                drift["log_prob_drift"] <= tolerance
+                and drift["recovery_drop"] <= RECOVERY_TOLERANCE
+            )
+            failed += not ok
+            print(
+                f"{protein['name']}: log-prob drift {drift['log_prob_drift']:.4f}, "
+                f"recovery drop {drift['recovery_drop']:.4f} "
+                f"{'ok' if ok else 'FAILED'}"
+            )
+
+    print(f"{len(dataset) - failed} of {len(dataset)} structures within tolerance")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    argparser.add_argument("jsonl", type=str, help="Reference parsed chains JSONL")
+    argparser.add_argument(
+        "--precision", type=str, choices=PRECISIONS[1:], default="bf16"
+    )
+    argparser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0,
+        help="Largest mean absolute log-prob difference per designed position, "
+        "0 for the default of the precision (bf16 0.05, int8 0.2)",
+    )
+    argparser.add_argument("--model_name", type=str, default="v_48_020")
+    argparser.add_argument("--ca_only", action="store_true")
+    argparser.add_argument("--use_soluble_model", action="store_true")
+    argparser.add_argument("--path_to_model_weights", type=str, default="")
+    sys.exit(main(argparser.parse_args()))
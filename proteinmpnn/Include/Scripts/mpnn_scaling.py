@@ -0,0 +1,113 @@
+"""
+Throughput scaling benchmark for the parallel mode of mpnn_engine.
+
+Runs the same job with an increasing number of worker processes and reports
+the sequences per second and the speedup over a single process:
+
+    python mpnn_scaling.py mpnn_params.json --workers 1 2 4 8 16 32
+
+The parameters file is the one written by the ProteinMPNN block (or any
+engine parameters). Every run writes to its own folder under --out_dir and
+the results are saved to <out_dir>/scaling.json.
+
+Only a single core machine has been measured so far, where more workers
+cannot be faster than one; the scaling on wide nodes is still to be checked
+with this script.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def run_point(params: dict, num_workers: int, threads: int, out_dir: str) -> dict:
+    """
+    Runs the engine once with num_workers processes and returns its metrics.
+    """
+    folder = os.path.join(out_dir, f"workers_{num_workers}")
+    os.makedirs(folder, exist_ok=True)
+
+    point = {
+        **params,
+        "out_folder": os.path.join(folder, "mpnn_output"),
+        "num_workers": num_workers,
+        "threads_per_worker": threads,
+        "checkpoint": False,
+        "suppress_print": 1,
+    }
+    params_file = os.path.join(folder, "mpnn_params.json")
+    with open(params_file, "w") as f:
+        json.dump(point, f)
+
+    started_at = time.time()
+    subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS_DIR, "mpnn_engine.py"), params_file],
+        check=True,
+    )
+    wall_s = round(time.time() - started_at, 4)
+
+    with open(os.path.join(point["out_folder"], "engine_metrics.json"), "r") as f:
+        engine = json.load(f)["engine"]
+
+    return {
+        "workers": num_workers,
+        "threads_per_worker": engine.get("threads_per_worker", threads),
+        "wall_s": wall_s,
+        "sequences": engine["sequences"],
+        "seqs_per_second": round(engine["sequences"] / wall_s, 3),
+    }
+
+
+def main(args):
+    with open(args.params, "r") as f:
+        params = json.load(f)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    points = []
+    for num_workers in args.workers:
+        point = run_point(params, num_workers, args.threads, args.out_dir)
+        point["speedup"] = round(
+            point["seqs_per_second"] / points[0]["seqs_per_second"]
+            if points
+            else 1.0,
+            2,
+        )
+        points.append(point)
+        print(
+            f"{point['workers']:>4} workers x {point['threads_per_worker']} threads: "
+            f"{point['seqs_per_second']} seqs/s, speedup {point['speedup']}",
+            flush=True,
+        )
+
+    with open(os.path.join(args.out_dir, "scaling.json"), "w") as f:
+        json.dump(points, f, indent=2)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    argparser.add_argument("params", type=str, help="Engine parameters JSON file")
+    argparser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Worker process counts to run",
+    )
+    argparser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Threads per worker, 0 to split the cores evenly",
+    )
+    argparser.add_argument(
+        "--out_dir", type=str, default="mpnn_scaling", help="Output folder"
+    )
+    main(argparser.parse_args())
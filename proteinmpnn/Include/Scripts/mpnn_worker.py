@@ -0,0 +1,82 @@
+"""
+Long-lived ProteinMPNN worker.
+
+Listens on a local Unix socket and runs design/score jobs with mpnn_engine,
+keeping the models loaded between jobs. Each request is a single JSON line:
+
+    {"action": "run", "cwd": "...", "params": {...}}
+    {"action": "ping"}
+    {"action": "shutdown"}
+
+and gets a single JSON line back with the captured stdout of the job.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import traceback
+
+import mpnn_engine
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        request = json.loads(line)
+        action = request.get("action", "run")
+        cache: mpnn_engine.ModelCache = self.server.cache
+
+        response = {"status": "ok", "model_loads": cache.loads}
+
+        if action == "run":
+            output = io.StringIO()
+            cwd = os.getcwd()
+            try:
+                os.chdir(request.get("cwd", cwd))
+                with contextlib.redirect_stdout(output):
+                    mpnn_engine.run(mpnn_engine.make_args(request["params"]), cache)
+            except Exception:
+                response["status"] = "error"
+                output.write(traceback.format_exc())
+            finally:
+                os.chdir(cwd)
+
+            response["output"] = output.getvalue()
+            response["model_loads"] = cache.loads
+        elif action == "shutdown":
+            threading.Thread(target=self.server.shutdown).start()
+
+        self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+def main(args):
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.socket)), exist_ok=True)
+
+    with socketserver.UnixStreamServer(args.socket, WorkerHandler) as server:
+        server.cache = mpnn_engine.ModelCache()
+        print(f"ProteinMPNN worker listening on {args.socket}", flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    argparser.add_argument(
+        "--socket", type=str, required=True, help="Path of the Unix socket to serve"
+    )
+    sys.exit(main(argparser.parse_args()))
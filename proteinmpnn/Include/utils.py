@@ -1,14 +1,303 @@
+import functools
+import json
+import os
+import socket
+import subprocess
+import time
+
 from HorusAPI import PluginBlock
 
-from Config.config import conda_environment, conda_run_config
+from Config.config import (
+    conda_environment,
+    conda_run_config,
+    direct_environment,
+    use_worker,
+    worker_socket,
+)
+
+# Resolved environments of this session: (conda run, env) -> environment
+_ENVIRONMENTS = {}
+
+# Set by every shell, not by the environment activation
+_SHELL_VARIABLES = {"_", "SHLVL", "PWD", "OLDPWD"}
+
+_RESOLVE_MARKER = "PROTEINMPNN_HORUS_ENV="
+
+
+def block_metrics(block: PluginBlock):
+    """
+    Returns the Metrics of the current block run, stored in block.extraData.
+    """
+    from Helpers.metrics import Metrics
+
+    if not isinstance(block.extraData.get("metrics"), dict):
+        block.extraData["metrics"] = {"stages": {}}
+
+    return Metrics(block.extraData["metrics"])
+
+
+def instrumented(stage: str, reset: bool = True):
+    """
+    Decorator for the block actions: times the action as a stage and saves the
+    block metrics to metrics.json. Use reset=False for the final action of a
+    SlurmBlock so the stages of the initial action are kept.
+    """
+
+    def decorator(action):
+        @functools.wraps(action)
+        def wrapper(block: PluginBlock):
+            if reset:
+                block.extraData["metrics"] = {"stages": {}}
+
+            metrics = block_metrics(block)
+            try:
+                with metrics.stage(stage):
+                    return action(block)
+            finally:
+                metrics.save(f"{block.id}_{block._placedID}")
+
+        return wrapper
+
+    return decorator
+
+
+def _environment_stamp(prefix: str):
+    """
+    Changes whenever packages are installed into or removed from the
+    environment.
+    """
+    try:
+        return os.stat(os.path.join(prefix, "conda-meta", "history")).st_mtime
+    except OSError:
+        return None
+
+
+def resolve_environment(block: PluginBlock):
+    """
+    Returns {"python", "prefix", "environ", "stamp"} for the plugin conda
+    environment: its interpreter and the variables set by its activation. It
+    is resolved with conda run once per session, and again when the
+    environment changes. Returns None if it cannot be resolved.
+    """
+    env: str = block.config[conda_environment.id]
+    conda_run: str = block.config[conda_run_config.id]
+    key = (conda_run, env)
+
+    resolved = _ENVIRONMENTS.get(key)
+    if (
+        resolved
+        and os.path.isfile(resolved["python"])
+        and _environment_stamp(resolved["prefix"]) == resolved["stamp"]
+    ):
+        return resolved
+
+    script = (
+        "import json, os, sys; "
+        f"print('{_RESOLVE_MARKER}' + json.dumps("
+        "{'python': sys.executable, 'prefix': sys.prefix, 'environ': dict(os.environ)}))"
+    )
+    try:
+        out = subprocess.run(
+            f'{conda_run} {env} python -c "{script}"',
+            shell=True,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
 
+    for line in out.splitlines():
+        if line.startswith(_RESOLVE_MARKER):
+            data = json.loads(line[len(_RESOLVE_MARKER) :])
+            break
+    else:
+        return None
 
-def execute_in_environment(block: PluginBlock, cmd: str):
+    resolved = {
+        "python": data["python"],
+        "prefix": data["prefix"],
+        "environ": {
+            k: v
+            for k, v in data["environ"].items()
+            if k not in _SHELL_VARIABLES and os.environ.get(k) != v
+        },
+        "stamp": _environment_stamp(data["prefix"]),
+    }
+    _ENVIRONMENTS[key] = resolved
+
+    return resolved
+
+
+def environment_command(block: PluginBlock, cmd: str):
     """
-    Gets the conda environment and executes the command in that environment.
+    Returns (command, environment variables) to run a command in the plugin
+    conda environment: the environment interpreter called directly, or the
+    conda run prefix when it is disabled or cannot be resolved (the variables
+    are None then).
     """
+    if block.config[direct_environment.id]:
+        resolved = resolve_environment(block)
+        if resolved is not None:
+            for python in ("python3 ", "python "):
+                if cmd.startswith(python):
+                    cmd = f"{resolved['python']} {cmd[len(python):]}"
+                    break
+            return cmd, {**os.environ, **resolved["environ"]}
 
     env: str = block.config[conda_environment.id]
     conda_run: str = block.config[conda_run_config.id]
 
-    return block.remote.command(f"{conda_run} {env} {cmd}")
+    return f"{conda_run} {env} {cmd}", None
+
+
+def _stream(cmd: str, environ: dict) -> str:
+    """
+    Runs a command, printing its output as it comes. Returns the output.
+    """
+    lines = []
+    with subprocess.Popen(
+        cmd,
+        shell=True,
+        env=environ,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+    ) as process:
+        for line in process.stdout:
+            print(line, end="", flush=True)
+            lines.append(line)
+
+    if process.returncode:
+        raise RuntimeError(f"Command failed with exit code {process.returncode}: {cmd}")
+
+    return "".join(lines)
+
+
+def execute_in_environment(block: PluginBlock, cmd: str, stage="environment"):
+    """
+    Executes the command in the plugin conda environment and prints its
+    output. Returns the output.
+    """
+    with block_metrics(block).stage(stage):
+        command, environ = environment_command(block, cmd)
+        if environ is not None:
+            return _stream(command, environ)
+
+        out = block.remote.command(command)
+
+    print(out)
+
+    return out
+
+
+def _worker_request(socket_path: str, request: dict, timeout=None):
+    """
+    Sends a single JSON request to the worker and returns its JSON response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + "\n").encode())
+
+        with sock.makefile("r") as response:
+            return json.loads(response.readline())
+
+
+def _worker_alive(socket_path: str):
+    try:
+        return _worker_request(socket_path, {"action": "ping"}, timeout=5)
+    except (OSError, ValueError):
+        return None
+
+
+def start_worker(block: PluginBlock, startup_timeout: float = 180):
+    """
+    Starts the ProteinMPNN worker inside the conda environment if it is not
+    running yet. Returns the socket path, or None if it did not come up.
+    """
+    socket_path = os.path.expanduser(block.config[worker_socket.id])
+
+    if _worker_alive(socket_path):
+        return socket_path
+
+    script_plugin_path = os.path.join(
+        block.pluginDir, "Include", "Scripts", "mpnn_worker.py"
+    )
+    command, environ = environment_command(
+        block, f"python {script_plugin_path} --socket {socket_path}"
+    )
+
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    log_path = os.path.join(os.path.dirname(socket_path), "worker.log")
+
+    print(f"Starting ProteinMPNN worker on {socket_path}")
+
+    with open(log_path, "a") as log:
+        subprocess.Popen(
+            command,
+            shell=True,
+            env=environ,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if _worker_alive(socket_path):
+            return socket_path
+        time.sleep(1)
+
+    print(f"The ProteinMPNN worker did not start. Check {log_path}")
+
+    return None
+
+
+def execute_in_worker(block: PluginBlock, params: dict):
+    """
+    Runs a ProteinMPNN job in the warm worker. Returns the job output, or None
+    if the worker is disabled or unavailable so the caller can fall back to the
+    one-shot execution.
+    """
+    if not block.config[use_worker.id]:
+        return None
+
+    socket_path = start_worker(block)
+    if socket_path is None:
+        return None
+
+    try:
+        with block_metrics(block).stage("worker"):
+            response = _worker_request(
+                socket_path,
+                {"action": "run", "cwd": os.getcwd(), "params": params},
+            )
+    except (OSError, ValueError) as e:
+        print(f"Could not reach the ProteinMPNN worker ({e}), running one-shot.")
+        return None
+
+    if response["status"] != "ok":
+        raise RuntimeError(f"ProteinMPNN worker failed:\n{response['output']}")
+
+    print(f"Models loaded by the worker so far: {response['model_loads']}")
+
+    return response["output"]
+
+
+def get_cache(block: PluginBlock, namespace: str):
+    """
+    Returns the plugin DiskCache for the given namespace, or None if the cache
+    folder is not configured.
+    """
+    from Config.config import cache_dir, cache_size
+    from Helpers.cache import DiskCache
+
+    directory = block.config[cache_dir.id]
+    if not directory:
+        return None
+
+    return DiskCache(
+        directory, namespace, max_bytes=block.config[cache_size.id] * 1024 * 1024
+    )
@@ -0,0 +1,83 @@
+"""
+Throughput of batch sizes per length bucket, with a random checkpoint:
+
+    python -m tests.bench_buckets --lengths 100 300 600 --buckets "0:16 250:8 500:4"
+
+Designs the same random backbones with a single batch size and with the
+batch size of every length bucket, in one process, and reports the
+sequences per second of the sampling stage. Needs torch and the ProteinMPNN
+submodule. A batch of 16 copies of a 1000-residue chain needs more than 6 GB.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from tests import conftest  # noqa: F401, sets the import paths
+from tests.structures import random_record, write_jsonl
+
+
+def main(args):
+    import torch
+
+    import mpnn_engine
+    from tests.stubs import random_checkpoint
+
+    torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        random_checkpoint(tmp)
+        records = [
+            random_record(f"target_{length}_{i}", {"A": length}, seed=i)
+            for length in args.lengths
+            for i in range(args.per_length)
+        ]
+        write_jsonl(os.path.join(tmp, "parsed_pdbs.jsonl"), records)
+
+        params = {
+            "jsonl_path": os.path.join(tmp, "parsed_pdbs.jsonl"),
+            "path_to_model_weights": tmp,
+            "num_seq_per_target": args.num_seq,
+            "batch_size": args.batch_size,
+            "seed": 37,
+            "suppress_print": 1,
+        }
+        cache = mpnn_engine.ModelCache(torch.device(args.device))
+
+        for name, extra in [
+            ("batch_size", {}),
+            ("buckets", {"bucket_batch_sizes": args.buckets}),
+        ]:
+            out_folder = os.path.join(tmp, name)
+            mpnn_engine.run(
+                mpnn_engine.make_args(
+                    {**params, **extra, "out_folder": out_folder}
+                ),
+                cache,
+            )
+            with open(os.path.join(out_folder, mpnn_engine.METRICS_FILE)) as f:
+                data = json.load(f)["engine"]
+            print(
+                json.dumps(
+                    {
+                        "mode": name,
+                        "sequences": data["sequences"],
+                        "sample_s": data["stages"]["sample"]["wall_s"],
+                        "seqs_per_second": data["seqs_per_second"],
+                    }
+                ),
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--lengths", type=int, nargs="+", default=[100, 300, 600])
+    argparser.add_argument("--per_length", type=int, default=1)
+    argparser.add_argument("--num_seq", type=int, default=16)
+    argparser.add_argument("--batch_size", type=int, default=16)
+    argparser.add_argument("--buckets", type=str, default="0:16 250:8 500:4")
+    argparser.add_argument("--threads", type=int, default=4)
+    argparser.add_argument("--device", type=str, default="cpu")
+    main(argparser.parse_args())
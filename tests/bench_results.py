@@ -0,0 +1,115 @@
+"""
+Time and peak memory of writing the results tables from seqs/*.fa:
+
+    python -m tests.bench_results --sequences 1000000
+
+Writes synthetic FASTA files with the headers of protein_mpnn_run.py, then
+runs every writer in a fresh process and reports its wall time and peak RSS.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from tests import conftest  # noqa: F401, sets the import paths
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+
+NATIVE_HEADER = (
+    ">{name}, score=1.5432, global_score=1.5432, fixed_chains=['B'], "
+    "designed_chains=['A'], model_name=v_48_020, git_hash=unknown, seed=37"
+)
+SAMPLE_HEADER = (
+    ">T=0.1, sample={sample}, score=0.{sample:04d}, global_score=1.0001, "
+    "seq_recovery=0.4100"
+)
+
+
+def write_fasta_files(folder: str, files: int, per_file: int, length: int):
+    """
+    Writes files FASTA files of per_file sampled sequences each (plus the
+    native one).
+    """
+    os.makedirs(folder, exist_ok=True)
+    seq = (ALPHABET * (length // len(ALPHABET) + 1))[:length]
+
+    for i in range(files):
+        with open(os.path.join(folder, f"target_{i:06d}.fa"), "w") as f:
+            f.write(NATIVE_HEADER.format(name=f"target_{i:06d}") + "\n" + seq + "\n")
+            for sample in range(1, per_file + 1):
+                f.write(SAMPLE_HEADER.format(sample=sample) + "\n" + seq + "\n")
+
+
+def write(mode: str, seqs_folder: str, out_dir: str) -> int:
+    from Helpers.results import ColumnarResultsWriter, iter_results, write_results_csv
+
+    csv_file = os.path.join(out_dir, "results.csv")
+    if mode == "list":
+        # Every entry in memory before writing, as parse_results used to
+        return write_results_csv(csv_file, list(iter_results(seqs_folder)))
+    if mode == "csv":
+        return write_results_csv(csv_file, iter_results(seqs_folder))
+
+    columnar = ColumnarResultsWriter(os.path.join(out_dir, "results.npz"))
+    rows = write_results_csv(csv_file, columnar.tee(iter_results(seqs_folder)))
+    columnar.close()
+
+    return rows
+
+
+def measure(mode: str, seqs_folder: str, out_dir: str) -> dict:
+    """
+    Runs one writer in a fresh process.
+    """
+    output = subprocess.run(
+        [sys.executable, "-m", "tests.bench_results", "--run", mode, seqs_folder],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "BENCH_OUT_DIR": out_dir},
+    )
+
+    return json.loads(output.stdout)
+
+
+def main(args):
+    if args.run:
+        mode, seqs_folder = args.run
+        started_at = time.time()
+        rows = write(mode, seqs_folder, os.environ["BENCH_OUT_DIR"])
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            json.dumps(
+                {
+                    "mode": mode,
+                    "rows": rows,
+                    "wall_s": round(time.time() - started_at, 2),
+                    "peak_rss_mb": round(peak, 1),
+                }
+            )
+        )
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seqs_folder = os.path.join(tmp, "seqs")
+        files = max(1, args.sequences // args.per_file)
+        write_fasta_files(seqs_folder, files, args.per_file, args.length)
+
+        for mode in args.modes:
+            print(json.dumps(measure(mode, seqs_folder, tmp)), flush=True)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--sequences", type=int, default=1000000)
+    argparser.add_argument("--per_file", type=int, default=1000)
+    argparser.add_argument("--length", type=int, default=100)
+    argparser.add_argument("--modes", nargs="+", default=["list", "csv", "csv+npz"])
+    argparser.add_argument("--run", nargs=2, help=argparse.SUPPRESS)
+    main(argparser.parse_args())
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INCLUDE_DIR = os.path.join(ROOT, "proteinmpnn", "Include")
+SCRIPTS_DIR = os.path.join(INCLUDE_DIR, "Scripts")
+MPNN_DIR = os.path.join(INCLUDE_DIR, "ProteinMPNN")
+
+for path in (SCRIPTS_DIR, INCLUDE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# The ProteinMPNN submodule (upstream code and weights)
+UPSTREAM = os.path.isfile(os.path.join(MPNN_DIR, "protein_mpnn_utils.py"))
+
+requires_upstream = pytest.mark.skipif(
+    not UPSTREAM, reason="the ProteinMPNN submodule is not checked out"
+)
+
+
+@pytest.fixture
+def engine():
+    """
+    Scripts/mpnn_engine.py. Without the ProteinMPNN submodule the upstream
+    module is replaced by tests/stubs.py, so only tests that stub the model
+    can use it then.
+    """
+    pytest.importorskip("torch")
+
+    if not UPSTREAM and "protein_mpnn_utils" not in sys.modules:
+        from tests.stubs import stub_mpnn_utils
+
+        sys.modules["protein_mpnn_utils"] = stub_mpnn_utils()
+
+    import mpnn_engine
+
+    return mpnn_engine
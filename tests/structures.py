@@ -0,0 +1,82 @@
+"""
+Random backbones in the parsed JSONL format, for runs with random weights,
+and small PDB files for the parser.
+"""
+
+import json
+
+import numpy as np
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+
+ATOM = "{record:<6s}{serial:5d}  {atom:<3s} {resname} {chain}{resnum:4d}{icode}   {x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00           {element}\n"
+
+# Backbone atoms around every CA, roughly where they sit in a residue
+ATOM_OFFSETS = {
+    "N": (-1.2, 0.8, 0.0),
+    "CA": (0.0, 0.0, 0.0),
+    "C": (1.2, 0.8, 0.0),
+    "O": (1.3, 2.0, 0.3),
+}
+
+
+def random_record(name: str, lengths: dict, seed: int = 0) -> dict:
+    """
+    Returns a parsed record with one random walk chain of CA atoms (3.8 A
+    steps) per {chain: length}.
+    """
+    rng = np.random.default_rng(seed)
+    record = {"name": name, "num_of_chains": len(lengths), "seq": ""}
+
+    start = np.zeros(3)
+    for chain, length in lengths.items():
+        steps = rng.normal(size=(length, 3))
+        steps = 3.8 * steps / np.linalg.norm(steps, axis=1, keepdims=True)
+        ca = start + np.cumsum(steps, axis=0)
+        start = ca[-1] + 10.0
+
+        seq = "".join(rng.choice(list(ALPHABET), length))
+        record[f"seq_chain_{chain}"] = seq
+        record[f"coords_chain_{chain}"] = {
+            f"{atom}_chain_{chain}": (ca + np.array(offset)).round(3).tolist()
+            for atom, offset in ATOM_OFFSETS.items()
+        }
+        record["seq"] += seq
+
+    return record
+
+
+def write_jsonl(path, records: list):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def write_pdb(path, residues):
+    """
+    residues: [(chain, residue number, insertion code, residue name)], plus
+    optionally the atoms of the residue and the record type (ATOM or HETATM).
+    """
+    lines = []
+    serial = 0
+    for i, (chain, resnum, icode, resname, *rest) in enumerate(residues):
+        atoms = rest[0] if rest else ["N", "CA", "C", "O"]
+        record = rest[1] if len(rest) > 1 else "ATOM"
+        for j, atom in enumerate(atoms):
+            serial += 1
+            lines.append(
+                ATOM.format(
+                    record=record,
+                    serial=serial,
+                    atom=atom,
+                    resname=resname,
+                    chain=chain,
+                    resnum=resnum,
+                    icode=icode,
+                    x=3.8 * i + j,
+                    y=0.0,
+                    z=0.0,
+                    element=atom[0],
+                )
+            )
+    path.write_text("".join(lines) + "END\n")
@@ -0,0 +1,84 @@
+"""
+Stand-ins for the ProteinMPNN model and checkpoints, for the tests that do
+not need real weights.
+"""
+
+import json
+import os
+import types
+
+import torch
+
+# What torch.load returns for a ProteinMPNN checkpoint, without the weights
+CHECKPOINT = {"num_edges": 48, "noise_level": 0.2, "model_state_dict": {}}
+
+
+class StubFeatures(torch.nn.Module):
+    def __init__(self, augment_eps: float, top_k: int):
+        super().__init__()
+        self.augment_eps = augment_eps
+        self.top_k = top_k
+
+
+class StubProteinMPNN(torch.nn.Module):
+    """
+    Has the attributes mpnn_engine touches on a loaded model, and no
+    parameters.
+    """
+
+    def __init__(self, augment_eps=0.0, k_neighbors=48, **kwargs):
+        super().__init__()
+        self.features = StubFeatures(augment_eps, k_neighbors)
+        self.encoder_layers = torch.nn.ModuleList()
+
+
+class StubDataset(list):
+    def __init__(self, jsonl_file, verbose=True, truncate=None, max_length=100):
+        with open(jsonl_file) as f:
+            super().__init__(json.loads(line) for line in f if line.strip())
+
+
+def _not_stubbed(*args, **kwargs):
+    raise NotImplementedError("not available without the ProteinMPNN submodule")
+
+
+def stub_mpnn_utils() -> types.ModuleType:
+    """
+    protein_mpnn_utils with the stub model, for runs that design nothing.
+    """
+    module = types.ModuleType("protein_mpnn_utils")
+    module.ProteinMPNN = StubProteinMPNN
+    module.StructureDataset = StubDataset
+    module._scores = _not_stubbed
+    module._S_to_seq = _not_stubbed
+    module.tied_featurize = _not_stubbed
+    module.parse_fasta = _not_stubbed
+
+    return module
+
+
+def random_checkpoint(folder, model_name: str = "v_48_020", ca_only=False, seed=0):
+    """
+    Saves a ProteinMPNN checkpoint with randomly initialized weights, as
+    <folder>/<model_name>.pt. Needs the ProteinMPNN submodule.
+    """
+    from protein_mpnn_utils import ProteinMPNN
+
+    torch.manual_seed(seed)
+    model = ProteinMPNN(
+        ca_only=ca_only,
+        num_letters=21,
+        node_features=128,
+        edge_features=128,
+        hidden_dim=128,
+        num_encoder_layers=3,
+        num_decoder_layers=3,
+        k_neighbors=48,
+    )
+    path = os.path.join(folder, f"{model_name}.pt")
+    torch.save(
+        {"num_edges": 48, "noise_level": 0.2, "model_state_dict": model.state_dict()},
+        path,
+    )
+
+    return path
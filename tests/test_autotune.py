@@ -0,0 +1,76 @@
+import json
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+
+@pytest.fixture
+def autotune(engine):
+    import mpnn_autotune
+
+    return mpnn_autotune
+
+
+def test_save_cache_with_concurrent_writers(autotune, tmp_path):
+    path = str(tmp_path / "autotune.json")
+    errors = []
+
+    def write(worker: int):
+        try:
+            for i in range(20):
+                autotune._save_cache(path, {f"{worker}": i})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    with open(path) as f:
+        assert list(json.load(f).values()) == [19]
+    assert [p.name for p in tmp_path.iterdir()] == ["autotune.json"]
+
+
+def test_probe_features_decode_a_fixed_number_of_steps(autotune):
+    f = {"mask": torch.ones(2, 100), "X": torch.zeros(2, 100, 4, 3)}
+
+    probe = autotune._probe_features(f, 32)
+
+    assert probe["mask"].sum(1).tolist() == [32.0, 32.0]
+    assert f["mask"].sum() == 200
+    assert probe["X"] is f["X"]
+
+
+def test_autotune_is_cached_and_threads_are_restored(
+    engine, autotune, monkeypatch, tmp_path
+):
+    def time_sample(model, protein, args, dicts, device):
+        return float(args.batch_size * torch.get_num_threads())
+
+    monkeypatch.setattr(autotune, "_time_sample", time_sample)
+    monkeypatch.setattr(autotune, "thread_candidates", lambda: [1, 2])
+    args = engine.make_args(
+        {
+            "num_seq_per_target": 4,
+            "auto_tune": True,
+            "tuning_cache": str(tmp_path / "autotune.json"),
+        }
+    )
+    protein = {"name": "target", "seq": "A" * 100}
+
+    num_threads = torch.get_num_threads()
+    with engine.keep_num_threads():
+        tuned = autotune.autotune(None, protein, args, {}, torch.device("cpu"))
+        assert torch.get_num_threads() == 2
+    assert torch.get_num_threads() == num_threads
+    assert tuned.batch_size == 4
+
+    # The second target of the same length bucket does not time anything
+    monkeypatch.setattr(autotune, "_time_sample", None)
+    tuned = autotune.autotune(None, protein, args, {}, torch.device("cpu"))
+    assert tuned.batch_size == 4
@@ -0,0 +1,133 @@
+import json
+
+import numpy as np
+import pytest
+
+from Helpers.bias import ALPHABET, BiasRules, build_bias_by_res_dict
+from tests.structures import random_record
+
+W, G = ALPHABET.index("W"), ALPHABET.index("G")
+
+
+@pytest.fixture
+def records():
+    first = random_record("first", {"A": 4, "B": 3}, seed=1)
+    first["resnums_chain_A"] = "51,52,52A,53"
+    first["resnums_chain_B"] = "1,2,3"
+    # Without the numbering, residue IDs are positions
+    second = random_record("second", {"A": 4, "B": 3}, seed=2)
+
+    return [first, second]
+
+
+def zeros() -> dict:
+    return {
+        name: {"A": np.zeros((4, 21)), "B": np.zeros((3, 21))}
+        for name in ("first", "second")
+    }
+
+
+def assert_bias(tmp_path, records, expected: dict, **options):
+    output_path = str(tmp_path / "bias_by_res.jsonl")
+    assert build_bias_by_res_dict(records, output_path, **options) == len(records)
+
+    with open(output_path) as f:
+        bias = json.loads(f.readline())
+
+    assert {name: list(chains) for name, chains in bias.items()} == {
+        name: list(chains) for name, chains in expected.items()
+    }
+    for name in expected:
+        for chain in expected[name]:
+            assert np.allclose(bias[name][chain], expected[name][chain]), (name, chain)
+
+
+def test_rule_table(tmp_path, records):
+    (tmp_path / "rules.csv").write_text(
+        "chain,residue,aa,bias,name\n"
+        "A,52A,W,2.0,first\n"
+        "A,*,G,-1.5,\n"
+        "A,*,G,-0.5,second\n"
+        "B,2,w,1.0,\n"
+        "A,4,W,3.0,second\n"
+    )
+    rules = BiasRules.from_table(str(tmp_path / "rules.csv"))
+
+    expected = zeros()
+    expected["first"]["A"][2, W] = 2.0
+    expected["first"]["A"][:, G] = -1.5
+    expected["second"]["A"][:, G] = -2.0
+    expected["second"]["A"][3, W] = 3.0
+    for name in expected:
+        expected[name]["B"][1, W] = 1.0
+
+    assert_bias(tmp_path, records, expected, rules=rules)
+
+
+def test_matrix_table(tmp_path, records):
+    header = "\t".join(["name", "chain", "residue", *ALPHABET])
+    rows = [
+        ["first", "A", "53", *(["0.5"] * 21)],
+        ["", "B", "*", *([""] * 18 + ["1.0", "", ""])],
+    ]
+    (tmp_path / "matrix.tsv").write_text(
+        "\n".join([header] + ["\t".join(row) for row in rows]) + "\n"
+    )
+    rules = BiasRules.from_table(str(tmp_path / "matrix.tsv"))
+
+    expected = zeros()
+    expected["first"]["A"][3] = 0.5
+    for name in expected:
+        expected[name]["B"][:, ALPHABET.index("W")] = 1.0
+
+    assert_bias(tmp_path, records, expected, rules=rules)
+
+
+def test_arrays_and_rules_add_up(tmp_path, records):
+    rng = np.random.default_rng(0)
+    every = rng.random((4, 21)).round(2)
+    first = rng.random((4, 21)).round(2)
+    np.savez(tmp_path / "bias.npz", **{"A": every, "first/A": first})
+    (tmp_path / "rules.csv").write_text("chain,residue,aa,bias\nA,*,G,1.0\n")
+
+    expected = zeros()
+    expected["first"]["A"] = every + first
+    expected["second"]["A"] = every.copy()
+    for name in expected:
+        expected[name]["A"][:, G] += 1.0
+
+    assert_bias(
+        tmp_path,
+        records,
+        expected,
+        rules=BiasRules.from_table(str(tmp_path / "rules.csv")),
+        arrays_path=str(tmp_path / "bias.npz"),
+    )
+
+    np.savez(tmp_path / "wrong.npz", B=np.zeros((4, 21)))
+    with pytest.raises(Exception, match="has shape"):
+        build_bias_by_res_dict(
+            records,
+            str(tmp_path / "out.jsonl"),
+            arrays_path=str(tmp_path / "wrong.npz"),
+        )
+
+
+def test_chains_outside_the_chain_list_get_zeros(tmp_path, records):
+    (tmp_path / "rules.csv").write_text(
+        "chain,residue,aa,bias\nA,*,G,1.0\nB,*,G,1.0\n"
+    )
+    rules = BiasRules.from_table(str(tmp_path / "rules.csv"))
+
+    expected = zeros()
+    for name in expected:
+        expected[name]["A"][:, G] = 1.0
+
+    assert_bias(tmp_path, records, expected, rules=rules, chain_list=["A"])
+
+
+def test_tables_need_the_bias_columns(tmp_path):
+    (tmp_path / "rules.csv").write_text("chain,residue,bias\nA,1,1.0\n")
+
+    with pytest.raises(Exception, match="needs either"):
+        BiasRules.from_table(str(tmp_path / "rules.csv"))
@@ -0,0 +1,56 @@
+import os
+import tracemalloc
+
+from Helpers import cache
+from Helpers.cache import DiskCache, hash_file, hash_key
+from Helpers.shards import parameters_hash
+
+
+def test_hash_file_matches_hash_key(tmp_path, monkeypatch):
+    path = tmp_path / "input.jsonl"
+    data = os.urandom(10000)
+    path.write_bytes(data)
+
+    # Chunk boundaries inside the file
+    monkeypatch.setattr(cache, "HASH_CHUNK_SIZE", 4096)
+
+    assert hash_file(str(path)) == hash_key(data)
+    assert hash_file(str(path), "ca_only", "1") == hash_key(data, "ca_only", "1")
+    assert hash_file(str(path), "1") != hash_file(str(path), "2")
+
+
+def test_hash_file_reads_in_chunks(tmp_path):
+    path = tmp_path / "checkpoint.pt"
+    with open(path, "wb") as f:
+        for _ in range(32):
+            f.write(os.urandom(1024 * 1024))
+
+    tracemalloc.start()
+    try:
+        hash_file(str(path))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert peak < 4 * cache.HASH_CHUNK_SIZE
+
+
+def test_parameters_hash_follows_the_input_files(tmp_path):
+    path = tmp_path / "fixed_positions.jsonl"
+    path.write_text('{"a": 1}\n')
+    params = {"fixed_positions_jsonl": str(path), "seed": 37}
+
+    before = parameters_hash(params)
+    assert parameters_hash(params) == before
+
+    path.write_text('{"a": 2}\n')
+    assert parameters_hash(params) != before
+
+
+def test_disk_cache_round_trip(tmp_path):
+    disk = DiskCache(str(tmp_path), "parsed_pdbs")
+    key = hash_key("structure")
+
+    assert disk.get(key) is None
+    disk.put(key, b"record")
+    assert disk.get(key) == b"record"
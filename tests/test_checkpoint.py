@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from Helpers.checkpoint import (
+    finish,
+    load_checkpoint,
+    mark_done,
+    output_files,
+    prepare_resume,
+    remove_outputs,
+)
+from tests.structures import random_record, write_jsonl
+
+PARAMS = {"num_seq_per_target": 2, "batch_size": 1, "sampling_temp": "0.1"}
+
+
+def write_outputs(out_folder, name: str, params: dict = PARAMS, complete=True):
+    for file in output_files(name, params):
+        path = out_folder / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        records = 3 if complete else 1
+        path.write_text("".join(f">{name} {i}\nACDE\n" for i in range(records)))
+
+
+def outputs(out_folder) -> list:
+    return sorted(
+        f"{sub}/{file}"
+        for sub in os.listdir(out_folder)
+        if os.path.isdir(out_folder / sub)
+        for file in os.listdir(out_folder / sub)
+    )
+
+
+def write_input(tmp_path, names, seeds=None) -> str:
+    seeds = seeds or {}
+    records = [random_record(n, {"A": 20}, seed=seeds.get(n, 0)) for n in names]
+    write_jsonl(tmp_path / "parsed_pdbs.jsonl", records)
+
+    return str(tmp_path / "parsed_pdbs.jsonl")
+
+
+def test_resume_after_an_interrupted_run(tmp_path):
+    out_folder = tmp_path / "mpnn_output"
+    jsonl_path = write_input(tmp_path, ["first", "second", "third"])
+
+    assert prepare_resume(str(out_folder), jsonl_path, PARAMS, "p1") == [
+        "first",
+        "second",
+        "third",
+    ]
+
+    # Interrupted while writing the third structure; the second one finished
+    # without updating the checkpoint
+    write_outputs(out_folder, "first")
+    mark_done(str(out_folder), "first")
+    write_outputs(out_folder, "second")
+    write_outputs(out_folder, "third", complete=False)
+
+    assert prepare_resume(str(out_folder), jsonl_path, PARAMS, "p1") == ["third"]
+    assert outputs(out_folder) == ["seqs/first.fa", "seqs/second.fa"]
+
+    write_outputs(out_folder, "third")
+    assert finish(str(out_folder), PARAMS) == []
+    assert sorted(load_checkpoint(str(out_folder))["completed"]) == [
+        "first",
+        "second",
+        "third",
+    ]
+    assert prepare_resume(str(out_folder), jsonl_path, PARAMS, "p1") == []
+
+
+def test_changed_inputs_only_rerun_those_structures(tmp_path):
+    out_folder = tmp_path / "mpnn_output"
+    jsonl_path = write_input(tmp_path, ["first", "second", "third"])
+    prepare_resume(str(out_folder), jsonl_path, PARAMS, "p1")
+    for name in ("first", "second", "third"):
+        write_outputs(out_folder, name)
+    finish(str(out_folder), PARAMS)
+
+    # second changes, third leaves the input
+    jsonl_path = write_input(tmp_path, ["first", "second"], seeds={"second": 1})
+
+    assert prepare_resume(str(out_folder), jsonl_path, PARAMS, "p1") == ["second"]
+    assert outputs(out_folder) == ["seqs/first.fa"]
+
+
+def test_changed_parameters_start_over(tmp_path):
+    out_folder = tmp_path / "mpnn_output"
+    jsonl_path = write_input(tmp_path, ["first", "second"])
+    prepare_resume(str(out_folder), jsonl_path, PARAMS, "p1")
+    write_outputs(out_folder, "first")
+    finish(str(out_folder), PARAMS)
+
+    assert prepare_resume(str(out_folder), jsonl_path, PARAMS, "p2") == [
+        "first",
+        "second",
+    ]
+    assert outputs(out_folder) == []
+
+
+@pytest.mark.parametrize("sweep", ["", "0.0 0.1"])
+def test_remove_outputs_keeps_structures_with_the_same_prefix(tmp_path, sweep):
+    out_folder = tmp_path / "mpnn_output"
+    params = {**PARAMS, "sweep_noise": sweep, "save_score": 1}
+    for name in ("1abc", "1abc.v2", "1abc_fasta_1"):
+        write_outputs(out_folder, name, params)
+
+    remove_outputs(str(out_folder), "1abc", params)
+
+    assert outputs(out_folder) == sorted(
+        output_files("1abc.v2", params) + output_files("1abc_fasta_1", params)
+    )
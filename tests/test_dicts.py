@@ -0,0 +1,127 @@
+"""
+The native dictionaries of Helpers/dicts.py against the helper scripts of the
+ProteinMPNN submodule, on the same parsed records.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from Helpers.dicts import (
+    assign_fixed_chains,
+    make_bias_AA,
+    make_fixed_positions_dict,
+    make_tied_positions_dict,
+    write_dict,
+)
+from tests.conftest import MPNN_DIR, requires_upstream
+from tests.structures import random_record, write_jsonl
+
+pytestmark = requires_upstream
+
+HELPER_SCRIPTS = os.path.join(MPNN_DIR, "helper_scripts")
+
+
+def run_script(tmp_path, script: str, **options) -> str:
+    """
+    Runs a helper script on options (--name value, True for flags) and
+    returns its output file.
+    """
+    output_path = tmp_path / f"{script}.upstream.jsonl"
+    command = [sys.executable, os.path.join(HELPER_SCRIPTS, f"{script}.py")]
+    for name, value in {**options, "output_path": output_path}.items():
+        command.append(f"--{name}")
+        if value is not True:
+            command.append(str(value))
+    subprocess.run(command, check=True, capture_output=True)
+
+    return output_path.read_text()
+
+
+def native(tmp_path, script: str, my_dict: dict) -> str:
+    output_path = tmp_path / f"{script}.native.jsonl"
+    write_dict(str(output_path), my_dict)
+
+    return output_path.read_text()
+
+
+@pytest.fixture
+def records(tmp_path):
+    records = [
+        random_record("monomer", {"A": 31}, seed=1),
+        random_record("dimer", {"A": 40, "B": 40}, seed=2),
+        random_record("complex", {"B": 25, "C": 52, "A": 18}, seed=3),
+    ]
+    write_jsonl(tmp_path / "parsed_pdbs.jsonl", records)
+
+    return records
+
+
+@pytest.mark.parametrize("chains", [["A"], ["A", "B"], ["C", "B"], []])
+def test_assign_fixed_chains(tmp_path, records, chains):
+    expected = run_script(
+        tmp_path,
+        "assign_fixed_chains",
+        input_path=tmp_path / "parsed_pdbs.jsonl",
+        chain_list=" ".join(chains),
+    )
+
+    my_dict = assign_fixed_chains(records, chains)
+
+    assert native(tmp_path, "assign_fixed_chains", my_dict) == expected
+
+
+@pytest.mark.parametrize("specify_non_fixed", [False, True])
+def test_make_fixed_positions_dict(tmp_path, records, specify_non_fixed):
+    chains = ["A", "B"]
+    positions = [[1, 2, 5, 17], [3, 10]]
+    options = {
+        "input_path": tmp_path / "parsed_pdbs.jsonl",
+        "chain_list": " ".join(chains),
+        "position_list": ", ".join(" ".join(map(str, p)) for p in positions),
+    }
+    if specify_non_fixed:
+        options["specify_non_fixed"] = True
+    expected = run_script(tmp_path, "make_fixed_positions_dict", **options)
+
+    my_dict = make_fixed_positions_dict(
+        records, chains, positions, specify_non_fixed=specify_non_fixed
+    )
+
+    assert native(tmp_path, "make_fixed_positions_dict", my_dict) == expected
+
+
+@pytest.mark.parametrize("homooligomer", [False, True])
+def test_make_tied_positions_dict(tmp_path, records, homooligomer):
+    chains = ["A", "B"]
+    positions = [[1, 2, 3, 9], [4, 5, 6, 12]]
+    expected = run_script(
+        tmp_path,
+        "make_tied_positions_dict",
+        input_path=tmp_path / "parsed_pdbs.jsonl",
+        chain_list=" ".join(chains),
+        position_list=", ".join(" ".join(map(str, p)) for p in positions),
+        homooligomer=int(homooligomer),
+    )
+
+    my_dict = make_tied_positions_dict(
+        records, chains, positions, homooligomer=homooligomer
+    )
+
+    assert native(tmp_path, "make_tied_positions_dict", my_dict) == expected
+
+
+def test_make_bias_AA(tmp_path):
+    AA_list, bias_list = ["A", "G", "W"], ["-0.01", "0.02", "1.5"]
+    expected = run_script(
+        tmp_path,
+        "make_bias_AA",
+        AA_list=" ".join(AA_list),
+        bias_list=" ".join(bias_list),
+    )
+
+    my_dict = make_bias_AA(AA_list, bias_list)
+
+    assert native(tmp_path, "make_bias_AA", my_dict) == expected
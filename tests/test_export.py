@@ -0,0 +1,67 @@
+import pytest
+
+from tests.conftest import requires_upstream
+from tests.structures import random_record, write_jsonl
+
+pytestmark = requires_upstream
+
+torch = pytest.importorskip("torch")
+
+
+def test_torchscript_samples_like_eager(engine, tmp_path):
+    from mpnn_export import _sample
+
+    args = engine.make_args(
+        {"batch_size": 2, "plugin_cache_dir": str(tmp_path / "cache")}
+    )
+    cache = engine.ModelCache(torch.device("cpu"))
+    eager, _ = cache.get(args)
+    graph, _ = cache.get(engine.Namespace(**{**vars(args), "backend": "torchscript"}))
+    assert graph is not eager
+
+    dicts = engine.load_inputs(args)
+    with torch.no_grad():
+        for seed, lengths in enumerate([{"A": 50}, {"A": 33, "B": 71}]):
+            protein = random_record(f"s{seed}", lengths, seed=seed)
+            f = engine.featurize(protein, args, dicts, cache.device)
+            for sample_seed in (1, 37):
+                S, log_probs = _sample(eager, f, sample_seed)
+                traced_S, traced_log_probs = _sample(graph, f, sample_seed)
+
+                assert torch.equal(S, traced_S)
+                assert torch.allclose(log_probs, traced_log_probs, atol=1e-4)
+
+
+def test_torchscript_runs_write_the_same_fasta(engine, tmp_path):
+    write_jsonl(
+        tmp_path / "parsed_pdbs.jsonl",
+        [
+            random_record("first", {"A": 30, "B": 30}, seed=1),
+            random_record("second", {"A": 57}, seed=2),
+        ],
+    )
+    params = {
+        "jsonl_path": str(tmp_path / "parsed_pdbs.jsonl"),
+        "num_seq_per_target": 4,
+        "batch_size": 2,
+        "sampling_temp": "0.1 0.3",
+        "seed": 37,
+        "suppress_print": 1,
+        "plugin_cache_dir": str(tmp_path / "cache"),
+    }
+
+    fasta = {}
+    for backend in ("eager", "torchscript"):
+        out_folder = tmp_path / backend
+        engine.run(
+            engine.make_args(
+                {**params, "backend": backend, "out_folder": str(out_folder)}
+            ),
+            engine.ModelCache(torch.device("cpu")),
+        )
+        fasta[backend] = {
+            name: (out_folder / "seqs" / f"{name}.fa").read_text()
+            for name in ("first", "second")
+        }
+
+    assert fasta["eager"] == fasta["torchscript"]
@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+from tests.conftest import requires_upstream
+from tests.structures import random_record, write_jsonl
+
+pytestmark = requires_upstream
+
+torch = pytest.importorskip("torch")
+
+
+def mutant(record: dict, position: int, aa: str) -> dict:
+    seq = record["seq_chain_A"]
+    seq = seq[:position] + aa + seq[position + 1 :]
+
+    return {**record, "name": f"{record['name']}_mut", "seq_chain_A": seq, "seq": seq}
+
+
+def log_probs(model, f: dict):
+    randn = torch.arange(f["X"].shape[1], dtype=torch.float32)[None]
+    randn = randn.repeat(f["X"].shape[0], 1)
+
+    return model(
+        f["X"],
+        f["S"],
+        f["mask"],
+        f["chain_M"] * f["chain_M_pos"],
+        f["residue_idx"],
+        f["chain_encoding_all"],
+        randn,
+    )
+
+
+def load(engine, tmp_path):
+    from tests.stubs import random_checkpoint
+
+    random_checkpoint(tmp_path)
+    args = engine.make_args({"path_to_model_weights": str(tmp_path), "batch_size": 2})
+    model, _ = engine.ModelCache(torch.device("cpu")).get(args)
+
+    return model, args
+
+
+def test_mutants_reuse_the_edge_features(engine, tmp_path):
+    from mpnn_features import FeatureCache
+
+    model, args = load(engine, tmp_path)
+    native = random_record("native", {"A": 40}, seed=3)
+    dicts = engine.load_inputs(args)
+    f_native = engine.featurize(native, args, dicts, torch.device("cpu"))
+    f_mutant = engine.featurize(mutant(native, 5, "W"), args, dicts, "cpu")
+
+    with torch.no_grad():
+        expected = [log_probs(model, f) for f in (f_native, f_mutant)]
+
+        cache = FeatureCache()
+        cache.install(model, "weights")
+        cached = [log_probs(model, f) for f in (f_native, f_mutant)]
+        FeatureCache.uninstall(model)
+
+    for a, b in zip(expected, cached):
+        assert torch.equal(a, b)
+    assert cache.stats() == {"feature_cache_hits": 1, "feature_cache_misses": 1}
+
+
+def test_edge_features_are_kept_on_disk(engine, tmp_path):
+    from mpnn_features import NAMESPACE, FeatureCache
+
+    model, args = load(engine, tmp_path)
+    f = engine.featurize(
+        random_record("native", {"A": 40, "B": 25}, seed=4),
+        args,
+        engine.load_inputs(args),
+        torch.device("cpu"),
+    )
+
+    runs = []
+    with torch.no_grad():
+        expected = log_probs(model, f)
+        for _ in range(2):
+            cache = FeatureCache(str(tmp_path / "cache"))
+            cache.install(model, "weights")
+            assert torch.equal(log_probs(model, f), expected)
+            FeatureCache.uninstall(model)
+            runs.append(cache.stats())
+
+    assert runs == [
+        {"feature_cache_hits": 0, "feature_cache_misses": 1},
+        {"feature_cache_hits": 1, "feature_cache_misses": 0},
+    ]
+    entries = [files for _, _, files in os.walk(tmp_path / "cache" / NAMESPACE)]
+    assert sum(map(len, entries)) == 1
+
+
+def test_design_is_the_same_with_the_feature_cache(engine, tmp_path):
+    from tests.stubs import random_checkpoint
+
+    random_checkpoint(tmp_path)
+    write_jsonl(
+        tmp_path / "parsed_pdbs.jsonl",
+        [random_record("first", {"A": 30}, seed=1)],
+    )
+    params = {
+        "jsonl_path": str(tmp_path / "parsed_pdbs.jsonl"),
+        "path_to_model_weights": str(tmp_path),
+        "num_seq_per_target": 4,
+        "batch_size": 2,
+        "seed": 37,
+        "suppress_print": 1,
+        "plugin_cache_dir": str(tmp_path / "cache"),
+    }
+
+    fasta = []
+    for out_folder, feature_cache in (("plain", False), ("cold", True), ("warm", True)):
+        engine.run(
+            engine.make_args(
+                {
+                    **params,
+                    "out_folder": str(tmp_path / out_folder),
+                    "feature_cache": feature_cache,
+                }
+            ),
+            engine.ModelCache(torch.device("cpu")),
+        )
+        with open(tmp_path / out_folder / "seqs" / "first.fa") as f:
+            fasta.append(f.read())
+
+    assert fasta[0] == fasta[1] == fasta[2]
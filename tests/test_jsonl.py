@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from Helpers.jsonl import ParsedChains
+
+
+def write_records(path, names):
+    with open(path, "w") as f:
+        for name in names:
+            f.write(json.dumps({"name": name, "seq": "AC"}) + "\n")
+
+
+def test_index_and_random_access(tmp_path):
+    path = tmp_path / "parsed_pdbs.jsonl"
+    write_records(path, ["first", "second", "third"])
+
+    structures = ParsedChains(str(path))
+
+    assert structures.names() == ["first", "second", "third"]
+    assert structures["second"]["name"] == "second"
+    assert [r["name"] for r in structures] == ["first", "second", "third"]
+    assert (tmp_path / "parsed_pdbs.jsonl.idx").is_file()
+
+    # From the index file
+    assert ParsedChains(str(path)).get("third")["name"] == "third"
+    assert ParsedChains(str(path)).get("fourth") is None
+
+
+def test_duplicated_names_are_an_error(tmp_path):
+    path = tmp_path / "parsed_pdbs.jsonl"
+    write_records(path, ["first", "second", "first"])
+
+    with pytest.raises(ValueError, match="'first'.*lines 1 and 3"):
+        len(ParsedChains(str(path)))
+
+
+def test_index_is_rebuilt_when_the_file_changes(tmp_path):
+    path = tmp_path / "parsed_pdbs.jsonl"
+    write_records(path, ["first"])
+    assert len(ParsedChains(str(path))) == 1
+
+    write_records(path, ["first", "second", "second"])
+
+    with pytest.raises(ValueError):
+        ParsedChains(str(path)).names()
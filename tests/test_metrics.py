@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pytest
+
+from Helpers.metrics import Metrics, resource
+
+pytestmark = pytest.mark.skipif(resource is None, reason="needs the resource module")
+
+
+def allocate(mb: int):
+    # Written to, so the pages count towards the RSS
+    return np.ones(mb * 1024 * 1024, dtype=np.uint8)
+
+
+def test_stage_memory_is_relative_to_its_start():
+    metrics = Metrics()
+    # Enough to raise the peak of the test process, whatever ran before
+    start_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+    with metrics.stage("large"):
+        data = allocate(start_peak + 100)
+        del data
+    with metrics.stage("small"):
+        data = allocate(20)
+        del data
+
+    large, small = metrics.data["stages"]["large"], metrics.data["stages"]["small"]
+    assert large["peak_rss_growth_mb"] >= 90
+    # Below the peak the large stage left behind
+    assert small["peak_rss_growth_mb"] < 5
+    assert small["process_peak_rss_mb"] >= large["peak_rss_growth_mb"]
+
+
+def test_repeated_stages_add_up(tmp_path):
+    metrics = Metrics()
+
+    for _ in range(3):
+        with metrics.stage("featurize"):
+            pass
+    metrics.add(sequences=3)
+    metrics.save("engine", str(tmp_path / "metrics.json"))
+
+    with open(tmp_path / "metrics.json") as f:
+        data = json.load(f)["engine"]
+    assert data["sequences"] == 3
+    assert set(data["stages"]["featurize"]) == {
+        "wall_s",
+        "cpu_s",
+        "children_cpu_s",
+        "peak_rss_growth_mb",
+        "children_peak_rss_growth_mb",
+        "process_peak_rss_mb",
+        "children_peak_rss_mb",
+    }
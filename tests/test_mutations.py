@@ -0,0 +1,93 @@
+import pytest
+
+from Helpers.dicts import make_fixed_positions_dict
+from Helpers.mutations import (
+    add_mutated_positions,
+    mutated_records,
+    parse_mutations,
+    read_mutation_sets,
+)
+
+TABLE = [("variant", "mutations"), ("v1", "A:2:W A:52A:L"), ("v2", "B:1:K;A:2:G")]
+
+
+def record(name: str = "target") -> dict:
+    return {
+        "name": name,
+        "seq_chain_A": "ACDEF",
+        "seq_chain_B": "GHI",
+        "seq": "ACDEFGHI",
+        "resnums_chain_A": "1,2,52,52A,53",
+        "resnums_chain_B": "1,2,3",
+    }
+
+
+@pytest.mark.parametrize("delimiter", [",", "\t"])
+def test_read_mutation_sets(tmp_path, delimiter):
+    path = tmp_path / "variants.csv"
+    path.write_text("\n".join(delimiter.join(row) for row in TABLE) + "\n\n")
+
+    assert read_mutation_sets(str(path)) == [
+        ("v1", [("A", "2", "W"), ("A", "52A", "L")]),
+        ("v2", [("B", "1", "K"), ("A", "2", "G")]),
+    ]
+
+
+def test_mutation_sets_need_both_columns(tmp_path):
+    path = tmp_path / "variants.csv"
+    path.write_text("name,mutations\nv1,A:2:W\n")
+
+    with pytest.raises(Exception, match="'variant' and 'mutations'"):
+        read_mutation_sets(str(path))
+
+
+def test_parse_mutations():
+    assert parse_mutations("A:45:W+B:12a:Y") == [("A", "45", "W"), ("B", "12a", "Y")]
+    with pytest.raises(Exception, match="expected chain:residue:AA"):
+        parse_mutations("A45W")
+
+
+def test_three_letter_names():
+    pytest.importorskip("Bio")
+
+    assert parse_mutations("A:45:trp") == [("A", "45", "W")]
+
+
+def test_mutated_records():
+    written = {}
+    records = list(
+        mutated_records(
+            [record()],
+            [("B", "3", "W")],
+            [("v1", [("A", "2", "W"), ("A", "52A", "L")]), ("v2", [("A", "2", "G")])],
+            written,
+        )
+    )
+
+    sequences = [(r["seq_chain_A"], r["seq_chain_B"], r["seq"]) for r in records]
+    assert [r["name"] for r in records] == ["target_v1", "target_v2"]
+    assert sequences == [("AWDLF", "GHW", "AWDLFGHW"), ("AGDEF", "GHW", "AGDEFGHW")]
+    assert written == {
+        "target": [
+            ("target_v1", [("B", 3, "W"), ("A", 2, "W"), ("A", 4, "L")]),
+            ("target_v2", [("B", 3, "W"), ("A", 2, "G")]),
+        ]
+    }
+    # The coordinates and numbering are shared with the input record
+    assert records[0]["resnums_chain_A"] == record()["resnums_chain_A"]
+
+    with pytest.raises(Exception, match="Residue 54 not found"):
+        list(mutated_records([record()], [("A", "54", "W")]))
+
+
+def test_mutated_positions_are_fixed():
+    written = {}
+    records = mutated_records(
+        [record()], [("A", "53", "W")], [("v1", [("B", "1", "K")])], written
+    )
+    records = list(records)
+    fixed_positions = make_fixed_positions_dict(records, ["A"], [["1", "53"]])
+
+    add_mutated_positions(fixed_positions, written)
+
+    assert fixed_positions == {"target_v1": {"A": [1, 5], "B": [1]}}
@@ -0,0 +1,76 @@
+import pytest
+
+from Helpers.numbering import Numbering, first_label, shared_positions
+from Helpers.parse_pdbs import parse_pdb
+from tests.structures import write_pdb
+
+
+def test_gaps_and_insertion_codes(tmp_path):
+    write_pdb(
+        tmp_path / "first.pdb",
+        [
+            ("A", 10, " ", "ALA"),
+            ("A", 11, " ", "GLY"),
+            ("A", 11, "A", "SER"),
+            ("A", 13, " ", "TRP"),
+        ],
+    )
+
+    record = parse_pdb(str(tmp_path / "first.pdb"))
+
+    # The gap is filled with '-' and has no residue ID
+    assert record["seq_chain_A"] == "AGS-W"
+    assert record["resnums_chain_A"] == "10,11,11A,,13"
+    numbering = Numbering(record)
+    assert numbering.positions("A", ["10", "11A", 13]) == [1, 3, 5]
+    with pytest.raises(Exception, match="Residue 12 not found"):
+        numbering.position("A", "12")
+
+
+def test_insertion_codes_are_case_sensitive(tmp_path):
+    write_pdb(
+        tmp_path / "first.pdb",
+        [
+            ("A", 52, " ", "ALA"),
+            ("A", 52, "A", "GLY"),
+            ("A", 52, "a", "SER"),
+            ("A", 53, " ", "TRP"),
+        ],
+    )
+
+    record = parse_pdb(str(tmp_path / "first.pdb"))
+
+    # Upper case codes sort first, as in parse_multiple_chains.py
+    assert record["seq_chain_A"] == "AGSW"
+    assert record["resnums_chain_A"] == "52,52A,52a,53"
+    numbering = Numbering(record)
+    assert numbering.positions("A", ["52a", " 52A", 53.0]) == [3, 2, 4]
+
+
+def test_records_without_numbering_take_positions():
+    numbering = Numbering({"name": "upstream", "seq_chain_A": "AAAA"})
+
+    assert numbering.position("A", "3") == 3
+    with pytest.raises(Exception, match="needs the PDB numbering"):
+        numbering.position("A", "3A")
+
+
+def test_first_label_accepts_numbers_and_labels():
+    assert first_label(None, 52.0) == "52"
+    assert first_label("", 52) == "52"
+    assert first_label(" 52a ", 52) == "52a"
+    with pytest.raises(Exception):
+        first_label(None, "")
+
+
+def test_shared_positions():
+    def record(name, labels):
+        return {"name": name, "resnums_chain_A": ",".join(labels)}
+
+    same = [record("a", ["5", "6", "6A", "7"]), record("b", ["5", "6", "6A", "7"])]
+    assert shared_positions(same, ["A"], [["6A", "7"]]) == [[3, 4]]
+
+    shifted = same + [record("c", ["6", "6A", "7"])]
+    assert shared_positions(shifted, ["A"], [["6A"]]) is None
+
+    assert shared_positions(same, ["A"], [["8"]]) is None
@@ -0,0 +1,148 @@
+"""
+The engine against protein_mpnn_run.py of the ProteinMPNN submodule, on a
+random checkpoint and random backbones.
+"""
+
+import ast
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from tests.conftest import MPNN_DIR, requires_upstream
+from tests.structures import random_record, write_jsonl
+
+pytestmark = requires_upstream
+
+RUN_SCRIPT = os.path.join(MPNN_DIR, "protein_mpnn_run.py")
+
+
+def upstream_defaults() -> dict:
+    """
+    Reads the defaults of the protein_mpnn_run.py argparser.
+    """
+    with open(RUN_SCRIPT) as f:
+        tree = ast.parse(f.read())
+
+    defaults = {}
+    for node in ast.walk(tree):
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "add_argument"
+        ):
+            continue
+        name = node.args[0].value.lstrip("-")
+        keywords = {k.arg: k.value for k in node.keywords}
+        default = None
+        if "default" in keywords:
+            expression = ast.Expression(keywords["default"])
+            default = eval(compile(expression, RUN_SCRIPT, "eval"), {"list": list})
+        # argparse runs string defaults through the type, like type=list
+        if isinstance(default, str) and "type" in keywords:
+            default = {"str": str, "int": int, "float": float, "list": list}[
+                keywords["type"].id
+            ](default)
+        defaults[name] = default
+
+    return defaults
+
+
+def test_defaults_match_the_argparser(engine):
+    expected = upstream_defaults()
+    assert set(engine.RUN_DEFAULTS) == set(expected)
+    for name, default in engine.RUN_DEFAULTS.items():
+        if expected[name] is None:
+            # Unset upstream, the block always passes an output folder
+            assert not default or name == "out_folder", name
+        else:
+            assert default == expected[name], name
+    assert not set(engine.RUN_DEFAULTS) & set(engine.PLUGIN_DEFAULTS)
+
+
+def write_inputs(folder, tied: bool) -> dict:
+    records = [
+        random_record("first", {"A": 30, "B": 30}, seed=1),
+        random_record("second", {"A": 42, "B": 42}, seed=2),
+    ]
+    write_jsonl(folder / "parsed_pdbs.jsonl", records)
+    params = {"jsonl_path": str(folder / "parsed_pdbs.jsonl")}
+
+    if tied:
+        tied_positions = {
+            r["name"]: [{"A": [i], "B": [i]} for i in range(1, 11)] for r in records
+        }
+        write_jsonl(folder / "tied_positions.jsonl", [tied_positions])
+        params["tied_positions_jsonl"] = str(folder / "tied_positions.jsonl")
+    else:
+        chain_ids = {r["name"]: [["A"], ["B"]] for r in records}
+        write_jsonl(folder / "assigned_chains.jsonl", [chain_ids])
+        params["chain_id_jsonl"] = str(folder / "assigned_chains.jsonl")
+
+    return params
+
+
+def run_upstream(folder, params: dict):
+    command = [sys.executable, RUN_SCRIPT]
+    for k, v in params.items():
+        command += [f"--{k}", str(v)]
+
+    subprocess.run(
+        command,
+        cwd=folder,
+        env={**os.environ, "CUDA_VISIBLE_DEVICES": ""},
+        check=True,
+        capture_output=True,
+    )
+
+
+def outputs(out_folder) -> dict:
+    result = {}
+    for folder in ("seqs", "scores"):
+        for file_name in sorted(os.listdir(os.path.join(out_folder, folder))):
+            path = os.path.join(out_folder, folder, file_name)
+            if file_name.endswith(".npz"):
+                with np.load(path) as data:
+                    result[file_name] = {k: data[k].tolist() for k in data.files}
+            else:
+                with open(path) as f:
+                    result[file_name] = f.read()
+
+    return result
+
+
+@pytest.mark.parametrize("tied", [False, True])
+def test_fasta_matches_protein_mpnn_run(engine, tmp_path, tied):
+    import torch
+
+    from tests.stubs import random_checkpoint
+
+    random_checkpoint(tmp_path)
+    params = {
+        **write_inputs(tmp_path, tied),
+        "path_to_model_weights": str(tmp_path),
+        "num_seq_per_target": 4,
+        "batch_size": 2,
+        "sampling_temp": "0.1 0.3",
+        "seed": 37,
+        "save_score": 1,
+    }
+
+    run_upstream(tmp_path, {**params, "out_folder": str(tmp_path / "upstream")})
+    expected = outputs(tmp_path / "upstream")
+
+    # A cold and a warm run of the same cache
+    cache = engine.ModelCache(torch.device("cpu"))
+    for out_folder in ("cold", "warm"):
+        engine.run(
+            engine.make_args({**params, "out_folder": str(tmp_path / out_folder)}),
+            cache,
+        )
+        assert outputs(tmp_path / out_folder) == expected
+    assert cache.loads == 1
+
+    with open(tmp_path / "warm" / engine.METRICS_FILE) as f:
+        assert json.load(f)["engine"]["sequences"] == 2 * 2 * 4
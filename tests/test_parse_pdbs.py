@@ -0,0 +1,191 @@
+"""
+The native parser against parse_multiple_chains.py of the ProteinMPNN
+submodule.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from Helpers.numbering import RESNUM_PREFIX
+from Helpers.parse_pdbs import new_summary, parse_multiple_chains, parse_structures
+from tests.conftest import MPNN_DIR, requires_upstream
+from tests.structures import write_pdb
+
+PARSE_SCRIPT = os.path.join(MPNN_DIR, "helper_scripts", "parse_multiple_chains.py")
+
+BACKBONE = ["N", "CA", "C", "O"]
+
+BROKEN = "ATOM      1  CA  ALA A   1      not a number  \nEND\n"
+
+
+def write_structures(folder):
+    folder.mkdir()
+    write_pdb(
+        folder / "insertions.pdb",
+        [
+            ("A", 10, " ", "ALA"),
+            ("A", 11, " ", "GLY"),
+            ("A", 11, "A", "SER"),
+            ("A", 11, "B", "THR"),
+            ("A", 14, " ", "TRP"),
+            ("B", 1, " ", "LYS"),
+            ("B", 2, " ", "GLU"),
+        ],
+    )
+    write_pdb(
+        folder / "selenomet.pdb",
+        [
+            ("A", 1, " ", "MET"),
+            ("A", 2, " ", "MSE", BACKBONE, "HETATM"),
+            ("A", 3, " ", "HOH", ["O"], "HETATM"),
+            ("A", 3, " ", "LEU"),
+        ],
+    )
+    write_pdb(
+        folder / "missing_atoms.pdb",
+        [
+            ("C", 5, " ", "VAL", ["N", "CA"]),
+            ("C", 6, " ", "ILE", ["CA"]),
+            ("C", 7, " ", "UNK"),
+            ("a", 1, " ", "ASP", ["CA", "C", "O"]),
+        ],
+    )
+    for i in range(5):
+        write_pdb(
+            folder / f"chain_{i}.pdb",
+            [("A", n, " ", "ALA") for n in range(1, 4 + i)],
+        )
+
+
+def native_records(path) -> dict:
+    """
+    Native records by name without the numbering, as JSON text (the missing
+    atoms are NaN).
+    """
+    records = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            for key in [k for k in record if k.startswith(RESNUM_PREFIX)]:
+                del record[key]
+            records[record["name"]] = json.dumps(record)
+
+    return records
+
+
+@requires_upstream
+@pytest.mark.parametrize("ca_only", [False, True])
+def test_records_match_parse_multiple_chains(tmp_path, ca_only):
+    write_structures(tmp_path / "pdbs")
+
+    command = [
+        sys.executable,
+        PARSE_SCRIPT,
+        "--input_path",
+        str(tmp_path / "pdbs"),
+        "--output_path",
+        str(tmp_path / "upstream.jsonl"),
+    ]
+    subprocess.run(command + ["--ca_only"] * ca_only, check=True)
+    with open(tmp_path / "upstream.jsonl") as f:
+        expected = {json.loads(line)["name"]: line.rstrip("\n") for line in f}
+
+    summary = parse_multiple_chains(
+        str(tmp_path / "pdbs"), str(tmp_path / "native.jsonl"), ca_only
+    )
+
+    assert summary["parsed"] == len(expected) == 8
+    assert native_records(tmp_path / "native.jsonl") == expected
+
+
+def test_insertion_codes_and_selenomethionine(tmp_path):
+    write_structures(tmp_path / "pdbs")
+
+    records = {
+        json.loads(record)["name"]: json.loads(record)
+        for record in parse_structures(str(tmp_path / "pdbs"))
+    }
+
+    assert records["insertions"]["seq_chain_A"] == "AGST--W"
+    assert records["insertions"][RESNUM_PREFIX + "A"] == "10,11,11A,11B,,,14"
+    assert records["selenomet"]["seq_chain_A"] == "MML"
+    coords = records["missing_atoms"]["coords_chain_C"]
+    assert coords["CA_chain_C"][1] == [3.8, 0.0, 0.0]
+    assert all(x != x for x in coords["C_chain_C"][0])
+
+
+def test_malformed_files_are_skipped(tmp_path):
+    write_structures(tmp_path / "pdbs")
+    (tmp_path / "pdbs" / "broken.pdb").write_text(BROKEN)
+
+    summary = parse_multiple_chains(
+        str(tmp_path / "pdbs"), str(tmp_path / "parsed.jsonl")
+    )
+
+    assert summary["parsed"] == 8
+    assert [os.path.basename(path) for path, _ in summary["failed"]] == ["broken.pdb"]
+    assert summary["failed"][0][1].startswith("ValueError")
+    assert "broken" not in native_records(tmp_path / "parsed.jsonl")
+
+
+def test_workers_keep_the_file_order(tmp_path):
+    write_structures(tmp_path / "pdbs")
+    (tmp_path / "pdbs" / "broken.pdb").write_text(BROKEN)
+
+    outputs = []
+    for num_workers in (1, 3):
+        summary = new_summary()
+        records = parse_structures(
+            str(tmp_path / "pdbs"), num_workers=num_workers, summary=summary
+        )
+        outputs.append(list(records))
+        assert len(summary["failed"]) == 1
+
+    assert outputs[0] == outputs[1]
+    assert [json.loads(record)["name"] for record in outputs[0]] == [
+        "chain_0",
+        "chain_1",
+        "chain_2",
+        "chain_3",
+        "chain_4",
+        "insertions",
+        "missing_atoms",
+        "selenomet",
+    ]
+
+
+def cached_parse(folder, cache, ca_only: bool = False):
+    summary = new_summary()
+    records = parse_structures(str(folder), ca_only, cache=cache, summary=summary)
+    records = list(records)
+
+    return records, (summary["cache_hits"], summary["cache_misses"])
+
+
+def test_parsed_records_are_cached(tmp_path, monkeypatch):
+    from Helpers import parse_pdbs
+    from Helpers.cache import DiskCache
+
+    write_structures(tmp_path / "pdbs")
+    cache = DiskCache(str(tmp_path / "cache"), "parsed_pdbs")
+
+    records, counts = cached_parse(tmp_path / "pdbs", cache)
+    assert counts == (0, 8)
+
+    # The second parse reads every record from the cache
+    monkeypatch.setattr(parse_pdbs, "parse_pdb", None)
+    assert cached_parse(tmp_path / "pdbs", cache) == (records, (8, 0))
+    monkeypatch.undo()
+
+    # ca_only and the parser version are part of the key
+    assert cached_parse(tmp_path / "pdbs", cache, ca_only=True)[1] == (0, 8)
+    monkeypatch.setattr(parse_pdbs, "PARSER_VERSION", "test")
+    assert cached_parse(tmp_path / "pdbs", cache) == (records, (0, 8))
+
+    # So is the content of the file
+    write_pdb(tmp_path / "pdbs" / "chain_0.pdb", [("B", 1, " ", "GLY")])
+    assert cached_parse(tmp_path / "pdbs", cache)[1] == (7, 1)
@@ -0,0 +1,165 @@
+"""
+The in-memory input pipeline against the helper blocks run one after the
+other: parse_multiple_chains, assign_fixed_chains, make_fixed_positions,
+make_tied_positions and make_bias, each writing its JSONL.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from Helpers.dicts import (
+    assign_fixed_chains,
+    make_bias_AA,
+    make_fixed_positions_dict,
+    make_tied_positions_dict,
+    write_dict,
+)
+from Helpers.jsonl import ParsedChains
+from Helpers.parse_pdbs import parse_multiple_chains
+from tests.conftest import requires_upstream
+from tests.structures import write_pdb
+
+RESIDUES = ["ALA", "GLY", "TRP", "LYS", "SER", "ASP", "LEU", "PHE"]
+
+SPEC = {
+    "designed_chains": ["A", "B"],
+    "fixed_positions": {"A": ["1", "2A"]},
+    "tied_chains": ["A", "B"],
+    "tied_positions": [["4", "5"], ["4", "5"]],
+    "AA_list": ["W", "C"],
+    "bias_list": [1.5, -2.0],
+}
+
+
+def write_pdbs(folder):
+    folder.mkdir()
+    for i, name in enumerate(("first", "second")):
+        rng = np.random.default_rng(i)
+        residues = []
+        for chain in ("A", "B"):
+            # The same numbering in both chains, with an insertion
+            numbering = [(1, ""), (2, ""), (2, "A"), (3, ""), (4, ""), (5, "")]
+            numbering += [(n, "") for n in range(6, 12 + 2 * i)]
+            residues += [
+                (chain, resnum, icode, rng.choice(RESIDUES))
+                for resnum, icode in numbering
+            ]
+        write_pdb(folder / f"{name}.pdb", residues)
+
+
+def step_by_step(tmp_path) -> dict:
+    """
+    Writes the JSONLs of the helper blocks, the way their native paths do.
+    Returns the engine parameters that read them.
+    """
+    parsed = str(tmp_path / "parsed_pdbs.jsonl")
+    summary = parse_multiple_chains(str(tmp_path / "pdbs"), parsed)
+    assert summary["parsed"] == 2
+
+    files = {
+        "chain_id_jsonl": assign_fixed_chains(
+            ParsedChains(parsed), SPEC["designed_chains"]
+        ),
+        "fixed_positions_jsonl": make_fixed_positions_dict(
+            ParsedChains(parsed),
+            list(SPEC["fixed_positions"]),
+            list(SPEC["fixed_positions"].values()),
+        ),
+        "tied_positions_jsonl": make_tied_positions_dict(
+            ParsedChains(parsed), SPEC["tied_chains"], SPEC["tied_positions"]
+        ),
+        "bias_AA_jsonl": make_bias_AA(SPEC["AA_list"], SPEC["bias_list"]),
+    }
+
+    params = {"jsonl_path": parsed}
+    for arg, my_dict in files.items():
+        params[arg] = str(tmp_path / f"{arg[:-6]}.jsonl")
+        write_dict(params[arg], my_dict)
+
+    return params
+
+
+def read_outputs(out_folder) -> dict:
+    result = {}
+    for file_name in sorted(os.listdir(os.path.join(out_folder, "seqs"))):
+        with open(os.path.join(out_folder, "seqs", file_name)) as f:
+            result[file_name] = f.read()
+
+    return result
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    write_pdbs(tmp_path / "pdbs")
+    spec = {
+        **SPEC,
+        "pdb_path": str(tmp_path / "pdbs"),
+        "dump_folder": str(tmp_path / "pipeline_inputs"),
+    }
+
+    return spec, step_by_step(tmp_path)
+
+
+def test_pipeline_builds_the_block_inputs(engine, inputs):
+    spec, params = inputs
+
+    dicts, structures = engine.load_structures(engine.make_args({"pipeline": spec}))
+    expected_dicts, expected = engine.load_structures(engine.make_args(params))
+
+    assert list(structures) == list(expected)
+    for name, value in expected_dicts.items():
+        # The blocks read their dictionaries back from JSON
+        assert json.loads(json.dumps(dicts[name])) == value, name
+
+    # The dumped JSONLs are the ones of the blocks
+    dumped = {
+        "chain_id_jsonl": "assigned_chains.jsonl",
+        "fixed_positions_jsonl": "fixed_positions.jsonl",
+        "tied_positions_jsonl": "tied_positions.jsonl",
+        "bias_AA_jsonl": "bias_pdbs.jsonl",
+    }
+    assert sorted(os.listdir(spec["dump_folder"])) == sorted(
+        ["parsed_pdbs.jsonl", *dumped.values()]
+    )
+    for arg, file_name in dumped.items():
+        with open(os.path.join(spec["dump_folder"], file_name)) as f:
+            dumped_dict = f.read()
+        with open(params[arg]) as f:
+            assert dumped_dict == f.read(), arg
+
+
+@requires_upstream
+def test_pipeline_designs_like_the_blocks(engine, inputs, tmp_path):
+    import torch
+
+    from tests.stubs import random_checkpoint
+
+    spec, params = inputs
+    random_checkpoint(tmp_path)
+    design = {
+        "path_to_model_weights": str(tmp_path),
+        "num_seq_per_target": 2,
+        "sampling_temp": "0.1",
+        "seed": 37,
+    }
+
+    cache = engine.ModelCache(torch.device("cpu"))
+    engine.run(
+        engine.make_args(
+            {**design, **params, "out_folder": str(tmp_path / "blocks")}
+        ),
+        cache,
+    )
+    engine.run(
+        engine.make_args(
+            {**design, "pipeline": spec, "out_folder": str(tmp_path / "pipeline")}
+        ),
+        cache,
+    )
+
+    expected = read_outputs(tmp_path / "blocks")
+    assert sorted(expected) == ["first.fa", "second.fa"]
+    assert read_outputs(tmp_path / "pipeline") == expected
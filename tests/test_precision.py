@@ -0,0 +1,124 @@
+import copy
+import json
+import os
+
+import pytest
+
+from tests.conftest import MPNN_DIR, requires_upstream
+from tests.structures import random_record, write_jsonl
+
+pytestmark = requires_upstream
+
+torch = pytest.importorskip("torch")
+
+WEIGHTS = os.path.join(MPNN_DIR, "vanilla_model_weights")
+
+
+def featurized(engine, args):
+    return engine.featurize(
+        random_record("reference", {"A": 60, "B": 45}, seed=7),
+        engine.Namespace(**{**vars(args), "batch_size": 1}),
+        engine.load_inputs(args),
+        torch.device("cpu"),
+    )
+
+
+def test_fp32_has_no_drift(engine):
+    from mpnn_precision import compare
+
+    args = engine.make_args({})
+    model, _ = engine.ModelCache(torch.device("cpu")).get(args)
+
+    with torch.no_grad():
+        drift = compare(model, copy.deepcopy(model), featurized(engine, args))
+
+    assert drift == {"log_prob_drift": 0.0, "recovery_drop": 0.0}
+
+
+# bf16 drifts around 0.006 on the random backbones, dynamic int8 0.12 to 0.16
+@pytest.mark.parametrize("precision", ["bf16", "int8"])
+def test_the_default_tolerance_passes(engine, precision):
+    from mpnn_precision import RECOVERY_TOLERANCE, TOLERANCES, compare
+
+    args = engine.make_args({"precision": precision})
+    assert args.precision_tolerance == 0
+
+    # The check of the converted model uses the default of the precision
+    f = featurized(engine, args)
+    cache = engine.ModelCache(torch.device("cpu"))
+    model, meta = cache.get(args, check_features=lambda: f)
+    reference, _ = cache.get(engine.Namespace(**{**vars(args), "precision": "fp32"}))
+
+    with torch.no_grad():
+        drift = compare(reference, model, f)
+
+    assert drift == meta["drift"]
+    assert 0 < drift["log_prob_drift"] <= TOLERANCES[precision]
+    assert drift["recovery_drop"] <= RECOVERY_TOLERANCE
+
+
+def test_the_check_runs_once_per_converted_model(engine, tmp_path):
+    from mpnn_precision import load_converted
+
+    args = engine.make_args({})
+    cache = engine.ModelCache(torch.device("cpu"))
+    checkpoint_path = os.path.join(WEIGHTS, f"{args.model_name}.pt")
+    f = featurized(engine, args)
+    calls = {"build": 0, "check": 0}
+
+    def build():
+        calls["build"] += 1
+        return cache.load(args)
+
+    def check_features():
+        calls["check"] += 1
+        return f
+
+    loads = []
+    for _ in range(2):
+        model, meta = load_converted(
+            checkpoint_path, "bf16", build, cache.device, str(tmp_path), check_features
+        )
+        loads.append(dict(calls))
+
+    assert loads == [{"build": 1, "check": 1}, {"build": 1, "check": 1}]
+    assert meta["drift"]["log_prob_drift"] > 0
+
+    # A cached drift beyond the tolerance fails without loading fp32
+    with pytest.raises(RuntimeError, match="drifts from fp32"):
+        load_converted(
+            checkpoint_path, "bf16", build, cache.device, str(tmp_path), None, 1e-6
+        )
+    assert calls == {"build": 1, "check": 1}
+
+
+def test_runs_record_the_drift_of_every_point(engine, tmp_path):
+    from mpnn_precision import TOLERANCES
+
+    write_jsonl(
+        tmp_path / "parsed_pdbs.jsonl",
+        [random_record("first", {"A": 30}, seed=1)],
+    )
+    params = {
+        "jsonl_path": str(tmp_path / "parsed_pdbs.jsonl"),
+        "sweep_models": "v_48_010 v_48_020",
+        "precision": "bf16",
+        "plugin_cache_dir": str(tmp_path / "cache"),
+        "seed": 37,
+        "suppress_print": 1,
+    }
+
+    drifts = []
+    cache = engine.ModelCache(torch.device("cpu"))
+    for out_folder in ("cold", "warm"):
+        engine.run(
+            engine.make_args({**params, "out_folder": str(tmp_path / out_folder)}),
+            cache,
+        )
+        with open(tmp_path / out_folder / engine.METRICS_FILE) as f:
+            drifts.append(json.load(f)["engine"]["precision_drift"])
+
+    assert drifts[0] == drifts[1]
+    assert [point["model_name"] for point in drifts[0]] == ["v_48_010", "v_48_020"]
+    for point in drifts[0]:
+        assert 0 < point["log_prob_drift"] <= TOLERANCES["bf16"]
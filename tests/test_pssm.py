@@ -0,0 +1,89 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from Helpers.pssm import PssmSidecar, build_pssm_dict, open_npz, read_sidecar_reference
+
+resource = pytest.importorskip("resource")
+
+
+def write_pssms(folder, count: int, length: int = 5) -> list:
+    records = []
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        name = f"target_{i}"
+        np.savez(
+            folder / f"{name}.npz",
+            A_coef=rng.random(length),
+            A_bias=rng.random((length, 21)),
+            A_odds=rng.random((length, 21)),
+        )
+        records.append({"name": name, "seq_chain_A": "A" * length})
+
+    return records
+
+
+def test_open_npz_views(tmp_path):
+    path = str(tmp_path / "arrays.npz")
+    np.savez(
+        path,
+        matrix=np.arange(12.0).reshape(3, 4),
+        fortran=np.asfortranarray(np.arange(6).reshape(2, 3)),
+        scalar=np.array(5),
+    )
+    np.savez_compressed(str(tmp_path / "compressed.npz"), matrix=np.ones(3))
+
+    arrays = open_npz(path)
+
+    assert arrays["matrix"].tolist() == np.arange(12.0).reshape(3, 4).tolist()
+    assert arrays["fortran"].tolist() == [[0, 1, 2], [3, 4, 5]]
+    assert arrays["scalar"] == 5
+    assert not arrays["matrix"].flags.writeable
+    assert open_npz(str(tmp_path / "compressed.npz"))["matrix"].tolist() == [1, 1, 1]
+
+
+def test_sidecar_with_more_arrays_than_open_files(tmp_path):
+    (tmp_path / "pssms").mkdir()
+    open_files = 32
+    if os.path.isdir("/proc/self/fd"):
+        open_files = len(os.listdir("/proc/self/fd"))
+    limit = open_files + 32
+    # Three arrays per structure, well above the limit
+    records = write_pssms(tmp_path / "pssms", limit)
+    output_path = str(tmp_path / "pssm.jsonl")
+    build_pssm_dict(records, str(tmp_path / "pssms"), output_path, sidecar=True)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(limit, hard), hard))
+    try:
+        pssm = PssmSidecar(read_sidecar_reference(output_path))
+        # Every array stays referenced, so none of them can be released
+        loaded = [pssm[name] for name in pssm]
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    assert len(loaded) == len(records) and 3 * len(records) > limit
+    with np.load(tmp_path / "pssms" / "target_7.npz") as source:
+        expected = source["A_bias"].astype(np.float16).astype(np.float32)
+    assert np.array_equal(loaded[7]["A"]["pssm_bias"], expected)
+    assert loaded[7]["A"]["pssm_coef"].dtype == np.float32
+
+    with open(output_path) as f:
+        assert "hash" in json.loads(f.readline())
+
+
+@pytest.mark.parametrize("sidecar", [False, True])
+def test_unreadable_pssms_fail_the_build(tmp_path, sidecar):
+    (tmp_path / "pssms").mkdir()
+    records = write_pssms(tmp_path / "pssms", 3)
+    (tmp_path / "pssms" / "target_1.npz").write_bytes(b"not a zip file")
+    records.append({"name": "missing", "seq_chain_A": "AAAAA"})
+    output_path = str(tmp_path / "pssm.jsonl")
+
+    with pytest.raises(Exception, match="target_1 .*missing"):
+        build_pssm_dict(records, str(tmp_path / "pssms"), output_path, sidecar)
+
+    # Nothing a use_pssm run could pick up without them
+    assert sorted(os.listdir(tmp_path)) == ["pssms"]
@@ -0,0 +1,117 @@
+import csv
+import math
+import tracemalloc
+
+from Helpers.results import (
+    ColumnarResultsWriter,
+    ResultsTable,
+    iter_fasta_entries,
+    iter_results,
+    write_results_csv,
+)
+from tests.bench_results import write_fasta_files
+
+
+def test_fasta_entries(tmp_path):
+    write_fasta_files(str(tmp_path), 1, 2, 10)
+
+    native, first, second = iter_fasta_entries(str(tmp_path / "target_000000.fa"))
+
+    assert native["model"] == "target_000000"
+    assert native["sample"] == "-"
+    assert native["fixed_chains"] == "['B']"
+    assert native["seed"] == "37"
+    assert first["sample"] == "1"
+    assert second["score"] == "0.0002"
+    assert second["sequence"] == "ACDEFGHIKL"
+
+
+def test_csv_rows(tmp_path):
+    write_fasta_files(str(tmp_path / "seqs"), 3, 4, 10)
+
+    rows = write_results_csv(
+        str(tmp_path / "results.csv"), iter_results(str(tmp_path / "seqs"))
+    )
+
+    with open(tmp_path / "results.csv") as f:
+        table = list(csv.DictReader(f))
+    assert rows == len(table) == 3 * 5
+    assert [r["sample"] for r in table[:5]] == ["-", "1", "2", "3", "4"]
+
+
+def peak_memory(function) -> int:
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_csv_memory_does_not_grow_with_the_sequences(tmp_path):
+    peaks = []
+    for files in (4, 40):
+        folder = str(tmp_path / f"seqs_{files}")
+        write_fasta_files(folder, files, 500, 100)
+        peaks.append(
+            peak_memory(
+                lambda: write_results_csv(
+                    str(tmp_path / "results.csv"), iter_results(folder)
+                )
+            )
+        )
+
+    assert peaks[1] < 2 * peaks[0]
+
+
+def write_table(path, seqs_folder, row_group_size=ColumnarResultsWriter.ROW_GROUP_SIZE):
+    columnar = ColumnarResultsWriter(str(path), row_group_size)
+    rows = write_results_csv(
+        str(path) + ".csv", columnar.tee(iter_results(str(seqs_folder)))
+    )
+    columnar.close()
+
+    return rows
+
+
+def test_columnar_row_groups(tmp_path):
+    write_fasta_files(str(tmp_path / "seqs"), 3, 4, 10)
+
+    rows = write_table(tmp_path / "results.npz", tmp_path / "seqs", row_group_size=4)
+
+    table = ResultsTable(str(tmp_path / "results.npz"))
+    assert len(table) == rows == 15
+    assert table.row_groups == 4
+    assert list(table.row_group("sample", 3)) == [2, 3, 4]
+    assert list(table["model"][:6]) == ["target_000000"] * 5 + ["target_000001"]
+    assert list(table["native"]).count(True) == 3
+    assert math.isnan(table["T"][0])
+    assert table["sequence"][1] == b"ACDEFGHIKL"
+    assert set(table.columns) >= {"sequence", "score", "model", "variant"}
+
+    best = table.select(table.where(native=False, score=(None, 0.0002)), ["sample"])
+    assert list(best["sample"]) == [1, 2] * 3
+
+
+def test_columnar_empty_table(tmp_path):
+    (tmp_path / "seqs").mkdir()
+
+    assert write_table(tmp_path / "results.npz", tmp_path / "seqs") == 0
+
+    table = ResultsTable(str(tmp_path / "results.npz"))
+    assert len(table) == 0
+    assert len(table["score"]) == 0
+
+
+def test_columnar_memory_does_not_grow_with_the_sequences(tmp_path):
+    peaks = []
+    for files in (4, 40):
+        folder = tmp_path / f"seqs_{files}"
+        write_fasta_files(str(folder), files, 500, 100)
+        peaks.append(
+            peak_memory(
+                lambda: write_table(tmp_path / "results.npz", folder, 1000)
+            )
+        )
+
+    assert peaks[1] < 2 * peaks[0]
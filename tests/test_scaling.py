@@ -0,0 +1,49 @@
+import json
+from argparse import Namespace
+
+import pytest
+
+from tests.conftest import requires_upstream
+from tests.structures import random_record, write_jsonl
+
+pytestmark = requires_upstream
+
+
+def test_scaling_runs_every_worker_count(tmp_path):
+    pytest.importorskip("torch")
+
+    import mpnn_scaling
+
+    from tests.stubs import random_checkpoint
+
+    random_checkpoint(tmp_path)
+    records = [random_record(f"s{i}", {"A": 30 + 4 * i}, seed=i) for i in range(6)]
+    write_jsonl(tmp_path / "parsed_pdbs.jsonl", records)
+    params = {
+        "jsonl_path": str(tmp_path / "parsed_pdbs.jsonl"),
+        "path_to_model_weights": str(tmp_path),
+        "num_seq_per_target": 2,
+        "seed": 37,
+    }
+    (tmp_path / "mpnn_params.json").write_text(json.dumps(params))
+
+    out_dir = tmp_path / "scaling"
+    mpnn_scaling.main(
+        Namespace(
+            params=str(tmp_path / "mpnn_params.json"),
+            workers=[1, 2],
+            threads=1,
+            out_dir=str(out_dir),
+        )
+    )
+
+    with open(out_dir / "scaling.json") as f:
+        points = json.load(f)
+    assert [point["workers"] for point in points] == [1, 2]
+    assert [point["sequences"] for point in points] == [6 * 2, 6 * 2]
+    # A single process keeps the torch default
+    assert points[0]["threads_per_worker"] >= 1
+    assert points[1]["threads_per_worker"] == 1
+    assert points[0]["speedup"] == 1.0
+    for point in points:
+        assert point["seqs_per_second"] > 0
@@ -0,0 +1,34 @@
+from argparse import Namespace
+
+
+def test_parse_buckets(engine):
+    assert engine.parse_buckets("800:1, 0:8 300:4") == [(0, 8), (300, 4), (800, 1)]
+
+
+def test_bucket_batch_size_divides_the_sequences(engine):
+    args = engine.make_args(
+        {
+            "num_seq_per_target": 8,
+            "batch_size": 8,
+            "bucket_batch_sizes": "0:8 300:3 800:1",
+        }
+    )
+
+    assert engine.bucket_batch_size(args, 100) == 8
+    # 3 does not divide 8
+    assert engine.bucket_batch_size(args, 400) == 2
+    assert engine.bucket_batch_size(args, 900) == 1
+
+
+def test_schedule_keeps_the_dataset_order(engine):
+    proteins = [{"name": name, "seq": "A" * n} for name, n in [("a", 50), ("b", 500)]]
+    args = engine.make_args(
+        {"num_seq_per_target": 4, "batch_size": 4, "bucket_batch_sizes": "300:2"}
+    )
+
+    jobs = list(engine.schedule(proteins, args))
+
+    assert [p["name"] for p, _ in jobs] == ["a", "b"]
+    assert [a.batch_size for _, a in jobs] == [4, 2]
+    assert jobs[0][1] is args
+    assert isinstance(jobs[1][1], Namespace)
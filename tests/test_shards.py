@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+
+from Helpers.jsonl import ParsedChains
+from Helpers.shards import (
+    DONE,
+    array_script,
+    assign_shards,
+    is_done,
+    merge_shards,
+    prepare_shards,
+    shard_inputs,
+)
+from tests.structures import random_record, write_jsonl
+
+LENGTHS = [120, 30, 95, 60, 60, 15, 80, 45]
+
+
+def write_input(folder) -> dict:
+    folder.mkdir(parents=True, exist_ok=True)
+    records = [
+        random_record(f"s{i}", {"A": n}, seed=i) for i, n in enumerate(LENGTHS)
+    ]
+    write_jsonl(folder / "parsed_pdbs.jsonl", records)
+    fixed = {record["name"]: {"A": [1, 2]} for record in records}
+    (folder / "fixed_positions.jsonl").write_text(json.dumps(fixed) + "\n")
+    (folder / "bias_AA.jsonl").write_text('{"A": -0.1}\n')
+
+    return {
+        "jsonl_path": str(folder / "parsed_pdbs.jsonl"),
+        "fixed_positions_jsonl": str(folder / "fixed_positions.jsonl"),
+        "bias_AA_jsonl": str(folder / "bias_AA.jsonl"),
+    }
+
+
+def test_assign_shards_balances_the_residues(tmp_path):
+    inputs = write_input(tmp_path)
+
+    assignment = assign_shards(ParsedChains(inputs["jsonl_path"]), 3)
+
+    totals = [0] * 3
+    for shard, length in zip(assignment, LENGTHS):
+        totals[shard] += length
+    # Longest first to the lightest shard: 120 45 | 95 60 15 | 80 60 30
+    assert sorted(totals) == [165, 170, 170]
+    assert sum(totals) == sum(LENGTHS)
+
+
+def test_prepare_shards_slices_and_reuses(tmp_path):
+    inputs = write_input(tmp_path / "inputs")
+    shards_folder = str(tmp_path / "my flow" / "mpnn_shards")
+
+    folders = prepare_shards(shards_folder, inputs, 3, "p1")
+
+    names = []
+    for folder in folders:
+        shard = shard_inputs(folder, inputs)
+        shard_names = ParsedChains(shard["jsonl_path"]).names()
+        with open(shard["fixed_positions_jsonl"]) as f:
+            assert list(json.load(f)) == shard_names
+        # Dictionaries that are not keyed by structure are shared
+        assert shard["bias_AA_jsonl"] == inputs["bias_AA_jsonl"]
+        names += shard_names
+    assert sorted(names) == sorted(f"s{i}" for i in range(len(LENGTHS)))
+
+    # The manifest keeps the finished shards of the same parameters
+    open(os.path.join(folders[1], DONE), "w").close()
+    assert prepare_shards(shards_folder, inputs, 3, "p1") == folders
+    assert [is_done(folder) for folder in folders] == [False, True, False]
+
+    # New parameters or a new shard count start over
+    assert len(prepare_shards(shards_folder, inputs, 2, "p1")) == 2
+    folders = prepare_shards(shards_folder, inputs, 3, "p2")
+    assert not any(is_done(folder) for folder in folders)
+
+
+def test_array_script_runs_in_folders_with_spaces(tmp_path):
+    folders = [str(tmp_path / "my flow" / f"shard {i}") for i in range(2)]
+    for folder in folders:
+        os.makedirs(folder)
+    script_path = tmp_path / "my flow" / "array.sh"
+    script_path.write_text(array_script(folders, ["echo 0 > out", "echo 1 > out"]))
+
+    for task in ("1", "0"):
+        subprocess.run(
+            ["bash", str(script_path)],
+            env={**os.environ, "SLURM_ARRAY_TASK_ID": task},
+            check=True,
+        )
+
+    for i, folder in enumerate(folders):
+        assert is_done(folder)
+        with open(os.path.join(folder, "out")) as f:
+            assert f.read() == f"{i}\n"
+
+    # A failed command leaves the shard without its marker
+    script_path.write_text(array_script(folders, ["false", "true"]))
+    result = subprocess.run(
+        ["bash", str(script_path)], env={**os.environ, "SLURM_ARRAY_TASK_ID": "0"}
+    )
+    assert result.returncode != 0
+    assert not is_done(folders[0])
+
+
+def test_merge_shards(tmp_path):
+    folders = [str(tmp_path / f"shard_{i}") for i in range(2)]
+    for i, folder in enumerate(folders):
+        for sub in ("seqs", "scores"):
+            os.makedirs(os.path.join(folder, "mpnn_output", sub))
+            with open(os.path.join(folder, "mpnn_output", sub, f"s{i}.fa"), "w") as f:
+                f.write(f">s{i}\n")
+    os.makedirs(os.path.join(folders[0], "mpnn_output", "other"))
+
+    out_folder = tmp_path / "mpnn_output"
+    assert merge_shards(folders, str(out_folder)) == 4
+
+    assert sorted(os.listdir(out_folder)) == ["scores", "seqs"]
+    assert sorted(os.listdir(out_folder / "seqs")) == ["s0.fa", "s1.fa"]
+    assert (out_folder / "scores" / "s1.fa").read_text() == ">s1\n"
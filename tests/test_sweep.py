@@ -0,0 +1,50 @@
+import os
+
+from tests.conftest import requires_upstream
+from tests.structures import random_record, write_jsonl
+
+pytestmark = requires_upstream
+
+
+def test_sweep_reads_the_git_hash_once(engine, monkeypatch, tmp_path):
+    import torch
+
+    from tests.stubs import random_checkpoint
+
+    calls = []
+
+    def git_hash():
+        calls.append(1)
+        return "abc123"
+
+    monkeypatch.setattr(engine, "git_hash", git_hash)
+
+    random_checkpoint(tmp_path)
+    records = [
+        random_record("first", {"A": 30}, seed=1),
+        random_record("second", {"A": 42}, seed=2),
+    ]
+    write_jsonl(tmp_path / "parsed_pdbs.jsonl", records)
+
+    out_folder = tmp_path / "mpnn_output"
+    engine.run(
+        engine.make_args(
+            {
+                "jsonl_path": str(tmp_path / "parsed_pdbs.jsonl"),
+                "path_to_model_weights": str(tmp_path),
+                "out_folder": str(out_folder),
+                "sweep_noise": "0.0 0.1",
+                "num_seq_per_target": 2,
+                "seed": 37,
+                "suppress_print": 1,
+            }
+        ),
+        engine.ModelCache(torch.device("cpu")),
+    )
+
+    assert len(calls) == 1
+    fasta_files = sorted(os.listdir(out_folder / "seqs"))
+    assert len(fasta_files) == 2 * 2
+    for file_name in fasta_files:
+        with open(out_folder / "seqs" / file_name) as f:
+            assert "git_hash=abc123" in f.readline()
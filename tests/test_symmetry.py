@@ -0,0 +1,155 @@
+import random
+import time
+
+import pytest
+
+from Helpers.symmetry import (
+    banded_alignment,
+    equivalence_classes,
+    make_symmetric_tied_positions_dict,
+    single_gap_alignment,
+    ungapped_alignment,
+)
+from tests.structures import random_record
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def random_sequence(length: int, seed: int) -> str:
+    rng = random.Random(seed)
+
+    return "".join(rng.choice(AMINO_ACIDS) for _ in range(length))
+
+
+def point_mutant(seq: str, positions) -> str:
+    seq = list(seq)
+    for position in positions:
+        seq[position] = "W" if seq[position] != "W" else "A"
+
+    return "".join(seq)
+
+
+def assert_aligned(seq: str, other: str, mapping: dict):
+    # Every position of other maps in order onto the same residue of seq
+    assert list(mapping) == list(range(len(other)))
+    assert list(mapping.values()) == sorted(mapping.values())
+    assert all(seq[mapping[j]] == other[j] for j in mapping)
+
+
+def test_alignments_of_a_truncated_copy():
+    seq = random_sequence(80, seed=1)
+
+    for align in (ungapped_alignment, banded_alignment):
+        identical, mapping = align(seq, seq[5:75])
+        assert identical == 70
+        assert mapping == {j: j + 5 for j in range(70)}
+
+    # A single truncation is a single gap
+    assert single_gap_alignment(seq, seq[:70]) == (70, {j: j for j in range(70)})
+
+
+def test_alignments_around_a_missing_loop():
+    seq = random_sequence(80, seed=2)
+    deleted = seq[:30] + seq[36:]
+
+    identical, mapping = single_gap_alignment(seq, deleted)
+    assert identical == 74
+    assert_aligned(seq, deleted, mapping)
+    assert banded_alignment(seq, deleted) == (identical, mapping)
+
+    # The other way around maps the positions of the longer sequence
+    identical, mapping = single_gap_alignment(deleted, seq)
+    assert identical == 74
+    assert len(mapping) == 74
+    assert all(deleted[i] == seq[j] for j, i in mapping.items())
+
+
+def test_banded_alignment_with_two_gaps():
+    seq = random_sequence(120, seed=3)
+    deleted = seq[5:70] + seq[75:]
+
+    identical, mapping = banded_alignment(seq, deleted)
+
+    assert identical == len(deleted)
+    assert_aligned(seq, deleted, mapping)
+    # Neither alignment without the band finds it
+    assert ungapped_alignment(seq, deleted)[0] < identical
+    assert single_gap_alignment(seq, deleted)[0] < identical
+
+
+def test_equivalence_classes():
+    seq = random_sequence(100, seed=4)
+    sequences = {
+        "A": seq,
+        "B": seq,
+        "C": point_mutant(seq, [10, 50]),
+        "D": seq[:40] + seq[45:],
+        "E": random_sequence(100, seed=5),
+        "F": seq[3:],
+    }
+
+    classes = equivalence_classes(sequences)
+
+    assert [(reference, sorted(members)) for reference, members in classes] == [
+        ("A", ["A", "B", "C", "D", "F"]),
+        ("E", ["E"]),
+    ]
+    members = classes[0][1]
+    assert members["B"] == members["C"] == {i: i for i in range(100)}
+    assert members["F"] == {j: j + 3 for j in range(97)}
+    assert members["D"] == {j: j if j < 40 else j + 5 for j in range(95)}
+
+
+def test_unrelated_chains_below_the_identity_stay_apart():
+    seq = random_sequence(100, seed=6)
+    mutant = point_mutant(seq, range(0, 100, 5))
+
+    assert len(equivalence_classes({"A": seq, "B": mutant}, 0.9)) == 2
+    assert len(equivalence_classes({"A": seq, "B": mutant}, 0.8)) == 1
+
+
+def test_fixed_chains_are_not_tied():
+    record = random_record("trimer", {"A": 40, "B": 40, "C": 40}, seed=7)
+    record["seq_chain_B"] = record["seq_chain_C"] = record["seq_chain_A"]
+
+    tied_dict = make_symmetric_tied_positions_dict(
+        [record], [], chain_id_dict={"trimer": (["A", "B"], ["C"])}
+    )
+
+    assert tied_dict["trimer"] == [{"A": [i], "B": [i]} for i in range(1, 41)]
+
+    # Without the assigned chains every chain is tied
+    tied = make_symmetric_tied_positions_dict([record], [])["trimer"]
+    assert tied[0] == {"A": [1], "B": [1], "C": [1]}
+
+
+def mutated(seq: str, rng) -> str:
+    return point_mutant(seq, rng.sample(range(len(seq)), 3))
+
+
+def truncated(seq: str, rng) -> str:
+    return mutated(seq, rng)[rng.randrange(10) : len(seq) - rng.randrange(10)]
+
+
+def missing_loop(seq: str, rng) -> str:
+    # Terminal truncation and a loop: two gaps, so the band is aligned
+    seq = truncated(seq, rng)
+    start = rng.randrange(100, 400)
+
+    return seq[:start] + seq[start + rng.randrange(1, 8) :]
+
+
+@pytest.mark.parametrize("variant", [mutated, truncated, missing_loop])
+def test_large_assemblies_are_grouped_quickly(variant):
+    base = random_sequence(500, seed=8)
+    rng = random.Random(9)
+    sequences = {f"c{i}": variant(base, rng) for i in range(180)}
+
+    start = time.perf_counter()
+    classes = equivalence_classes(sequences)
+    elapsed = time.perf_counter() - start
+
+    assert len(classes) == 1
+    assert len(classes[0][1]) == 180
+    # About 0.01 to 0.2 s; aligning every pair took 1.6 to 2.4 s
+    assert elapsed < 1.0
@@ -0,0 +1,149 @@
+"""
+Environment resolution and command execution of Include/utils.py. They need
+the Horus runtime (HorusAPI), the conda environment is a plain venv behind a
+'conda run' script.
+"""
+
+import os
+import sys
+import venv
+
+import pytest
+
+pytest.importorskip("HorusAPI")
+
+import utils  # noqa: E402
+from Config.config import (  # noqa: E402
+    conda_environment,
+    conda_run_config,
+    direct_environment,
+)
+
+# Stands in for 'conda run -p': logs the call, then runs the command with the
+# environment first in PATH
+CONDA_RUN = """#!/bin/sh
+echo "$@" >> "{log}"
+prefix="$1"
+shift
+{body}
+"""
+
+
+class Remote:
+    def __init__(self):
+        self.commands = []
+
+    def command(self, cmd: str) -> str:
+        self.commands.append(cmd)
+        return "remote output"
+
+
+class Block:
+    def __init__(self, config: dict):
+        self.config = config
+        self.extraData = {}
+        self.remote = Remote()
+
+
+@pytest.fixture
+def environment(tmp_path, monkeypatch):
+    """
+    Returns a block whose conda environment is a venv with a conda-meta
+    history, and the log of the conda run calls.
+    """
+    monkeypatch.setattr(utils, "_ENVIRONMENTS", {})
+
+    prefix = tmp_path / "env"
+    venv.create(prefix, with_pip=False, symlinks=True)
+    (prefix / "conda-meta").mkdir()
+    (prefix / "conda-meta" / "history").write_text("==> 2026-01-01 <==\n")
+
+    log = tmp_path / "conda_run.log"
+    conda_run = tmp_path / "conda_run"
+    conda_run.write_text(
+        CONDA_RUN.format(log=log, body='PATH="$prefix/bin:$PATH" exec "$@"')
+    )
+    conda_run.chmod(0o755)
+
+    block = Block(
+        {
+            conda_environment.id: str(prefix),
+            conda_run_config.id: str(conda_run),
+            direct_environment.id: True,
+        }
+    )
+
+    return block, log
+
+
+def calls(log) -> int:
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+
+def test_resolved_environment_is_cached_until_it_changes(environment):
+    block, log = environment
+    prefix = block.config[conda_environment.id]
+
+    resolved = utils.resolve_environment(block)
+    assert os.path.realpath(resolved["prefix"]) == os.path.realpath(prefix)
+    assert resolved["python"].startswith(resolved["prefix"])
+    assert utils.resolve_environment(block) == resolved
+    assert calls(log) == 1
+
+    # Installing packages touches the conda-meta history
+    history = os.path.join(prefix, "conda-meta", "history")
+    os.utime(history, (resolved["stamp"] + 10, resolved["stamp"] + 10))
+    assert utils.resolve_environment(block)["stamp"] == resolved["stamp"] + 10
+    assert calls(log) == 2
+
+    command, environ = utils.environment_command(block, "python3 script.py")
+    assert command == f"{resolved['python']} script.py"
+    assert environ["PATH"].startswith(os.path.join(prefix, "bin"))
+    assert calls(log) == 2
+
+
+def test_falls_back_to_conda_run(environment):
+    block, log = environment
+    conda_run = block.config[conda_run_config.id]
+    with open(conda_run, "w") as f:
+        f.write(CONDA_RUN.format(log=log, body="exit 1"))
+
+    assert utils.resolve_environment(block) is None
+
+    out = utils.execute_in_environment(block, "python3 script.py")
+
+    prefix = block.config[conda_environment.id]
+    assert out == "remote output"
+    assert block.remote.commands == [f"{conda_run} {prefix} python3 script.py"]
+
+    # Also when the direct call is disabled
+    block.config[direct_environment.id] = False
+    assert utils.environment_command(block, "python3 script.py") == (
+        f"{conda_run} {prefix} python3 script.py",
+        None,
+    )
+
+
+def test_commands_stream_their_output(environment, capsys):
+    block, _ = environment
+
+    out = utils.execute_in_environment(
+        block, 'python3 -c "import sys; print(sys.prefix)"'
+    )
+
+    assert os.path.realpath(out.strip()) == os.path.realpath(
+        block.config[conda_environment.id]
+    )
+    assert capsys.readouterr().out == out
+    assert block.remote.commands == []
+    assert "environment" in block.extraData["metrics"]["stages"]
+
+
+def test_stream_raises_on_failure(capsys):
+    assert utils._stream("echo first; echo second", dict(os.environ)) == (
+        "first\nsecond\n"
+    )
+
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        utils._stream(f"{sys.executable} -c 'print(1)'; exit 3", dict(os.environ))
+    assert capsys.readouterr().out == "first\nsecond\n1\n"
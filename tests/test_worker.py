@@ -0,0 +1,59 @@
+import json
+import socket
+import socketserver
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from tests.stubs import CHECKPOINT, StubProteinMPNN  # noqa: E402
+
+
+def request(path: str, message: dict) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall((json.dumps(message) + "\n").encode())
+        with client.makefile("r") as f:
+            return json.loads(f.readline())
+
+
+def test_worker_loads_the_model_once(engine, monkeypatch, tmp_path):
+    import mpnn_worker
+
+    loaded = []
+
+    def load(path, map_location=None, **kwargs):
+        loaded.append(path)
+        return CHECKPOINT
+
+    monkeypatch.setattr(engine.torch, "load", load)
+    monkeypatch.setattr(engine, "ProteinMPNN", StubProteinMPNN)
+
+    jsonl_path = tmp_path / "parsed_pdbs.jsonl"
+    jsonl_path.write_text("")
+    params = {
+        "jsonl_path": str(jsonl_path),
+        "path_to_model_weights": str(tmp_path),
+        "out_folder": str(tmp_path / "mpnn_output"),
+        "seed": 37,
+        "suppress_print": 1,
+    }
+
+    socket_path = str(tmp_path / "worker.sock")
+    server = socketserver.UnixStreamServer(socket_path, mpnn_worker.WorkerHandler)
+    server.cache = engine.ModelCache(torch.device("cpu"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        message = {"action": "run", "cwd": str(tmp_path), "params": params}
+        responses = [request(socket_path, message) for _ in range(2)]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for response in responses:
+        assert response["status"] == "ok", response["output"]
+    assert responses[0]["model_loads"] == 1
+    assert responses[1]["model_loads"] == 1
+    assert len(loaded) == 1